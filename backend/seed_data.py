@@ -47,6 +47,10 @@ def seed_database():
     db.prescriptions.delete_many({})
     db.ratings.delete_many({})
     db.notifications.delete_many({})
+    # Derived counters are rebuilt lazily from the seeded raw data
+    db.doctor_stats.delete_many({})
+    db.doctor_patients.delete_many({})
+    db.daily_appointment_rollups.delete_many({})
 
     logger.info("Seeding database...")
 
@@ -1880,17 +1884,23 @@ def seed_database():
     logger.info("\n📊 Calculating doctor ratings from reviews...")
     for doctor in doctors:
         doctor_ratings = [r for r in ratings if r["doctor_id"] == doctor["_id"]]
+        histogram = {str(score): 0 for score in range(1, 6)}
+        for r in doctor_ratings:
+            histogram[str(r["score"])] += 1
+        rating_sum = sum(r["score"] for r in doctor_ratings)
+        rating_count = len(doctor_ratings)
+        avg_rating = rating_sum / rating_count if rating_count else 0
+        db.doctors.update_one(
+            {"_id": doctor["_id"]},
+            {"$set": {
+                "rating": round(avg_rating, 1),
+                "rating_count": rating_count,
+                "review_count": rating_count,
+                "rating_sum": rating_sum,
+                "rating_histogram": histogram
+            }}
+        )
         if doctor_ratings:
-            avg_rating = sum(r["score"] for r in doctor_ratings) / len(doctor_ratings)
-            rating_count = len(doctor_ratings)
-            db.doctors.update_one(
-                {"_id": doctor["_id"]},
-                {"$set": {
-                    "rating": round(avg_rating, 1),
-                    "rating_count": rating_count,
-                    "review_count": rating_count
-                }}
-            )
             logger.info(f"   {doctor['name']}: {round(avg_rating, 1)} stars ({rating_count} reviews)")
         else:
             logger.info(f"   {doctor['name']}: No reviews yet")
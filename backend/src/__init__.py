@@ -83,6 +83,14 @@ def create_app(config_class=Config):
     # Initialize database
     init_db(app)
 
+    from .invalidation import init_invalidation
+
+    init_invalidation(app)
+
+    from .commands import register_commands
+
+    register_commands(app)
+
     @app.route("/api/health")
     def health_check():
         return {"status": "operational"}, 200
@@ -122,4 +130,9 @@ def create_app(config_class=Config):
     app.register_blueprint(video_calls_bp, url_prefix="/api/video-calls")
     app.register_blueprint(events_bp, url_prefix="/api/events")
 
+    if app.config.get("PUBLIC_STATS_PREWARM") and not app.testing:
+        from .routes.analytics import prewarm_public_stats
+
+        prewarm_public_stats(app)
+
     return app
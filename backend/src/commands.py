@@ -0,0 +1,64 @@
+"""Flask CLI maintenance commands (run with ``flask --app app <command>``)."""
+import click
+
+from .models.appointment_rollup import AppointmentRollup
+from .models.doctor_stats import DoctorStats
+from .models.rating import Rating
+from .database import get_db, PRESCRIPTIONS_COLLECTION
+from .services.report_service import refresh_prescription_summary
+
+
+def register_commands(app):
+    """Attach maintenance commands to the Flask CLI."""
+
+    @app.cli.command("rebuild-doctor-stats")
+    @click.option("--doctor-id", default=None, help="Rebuild a single doctor only.")
+    def rebuild_doctor_stats(doctor_id):
+        """Recompute doctor_stats and doctor_patients from raw collections."""
+        if doctor_id:
+            DoctorStats.rebuild(doctor_id)
+            click.echo(f"Rebuilt stats for doctor {doctor_id}")
+            return
+        count = DoctorStats.rebuild_all()
+        click.echo(f"Rebuilt stats for {count} doctor(s)")
+
+    @app.cli.command("rebuild-appointment-rollups")
+    @click.option("--doctor-id", default=None, help="Rebuild a single doctor only.")
+    def rebuild_appointment_rollups(doctor_id):
+        """Recompute daily_appointment_rollups from raw appointments."""
+        if doctor_id:
+            days = AppointmentRollup.rebuild(doctor_id)
+            click.echo(f"Rebuilt {days} daily rollup(s) for doctor {doctor_id}")
+            return
+        count = AppointmentRollup.rebuild_all()
+        click.echo(f"Rebuilt daily rollups for {count} doctor(s)")
+
+    @app.cli.command("rebuild-rating-aggregates")
+    @click.option("--doctor-id", default=None, help="Rebuild a single doctor only.")
+    def rebuild_rating_aggregates(doctor_id):
+        """Recompute rating sum/count/histogram on doctor documents from raw ratings."""
+        if doctor_id:
+            aggregates = Rating.rebuild_doctor_aggregates(doctor_id)
+            click.echo(
+                f"Rebuilt ratings for doctor {doctor_id}: "
+                f"{aggregates['rating']} ({aggregates['rating_count']} ratings)"
+            )
+            return
+        count = Rating.rebuild_all_doctor_aggregates()
+        click.echo(f"Rebuilt rating aggregates for {count} doctor(s)")
+
+    @app.cli.command("generate-prescription-summaries")
+    def generate_prescription_summaries():
+        """Generate stored AI summaries that are missing or outdated.
+
+        Whether a summary is outdated depends on the current patient and doctor
+        names, so every prescription is checked; current ones are skipped
+        without a model call.
+        """
+        cursor = get_db()[PRESCRIPTIONS_COLLECTION].find({}, {"_id": 1})
+        checked = failed = 0
+        for prescription in cursor:
+            checked += 1
+            if refresh_prescription_summary(prescription["_id"]) is None:
+                failed += 1
+        click.echo(f"Checked {checked} prescription(s); {failed} summary(ies) failed")
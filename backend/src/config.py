@@ -59,6 +59,13 @@ class Config:
     AUTH_RATE_LIMIT_MAX_BUCKETS = int(
         os.environ.get("AUTH_RATE_LIMIT_MAX_BUCKETS", "5000")
     )
+    # Password hashing runs in a process pool (0 = inline); hashes made with
+    # another method are upgraded on the next successful login.
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_TIMEOUT_SECONDS = float(os.environ.get("PASSWORD_HASH_TIMEOUT_SECONDS", "10"))
+    # "memory" limits per worker; "mongo" shares counters across workers.
+    AUTH_RATE_LIMIT_BACKEND = os.environ.get("AUTH_RATE_LIMIT_BACKEND", "memory")
     TRUST_PROXY_HEADERS = _is_truthy(os.environ.get("TRUST_PROXY_HEADERS"))
 
     # Chatbot protections
@@ -85,10 +92,74 @@ class Config:
     )
 
     # Analytics/report performance controls
+    # Cached dashboards are evicted by write events (see src/invalidation.py),
+    # so TTLs only bound staleness from writes that bypass the models.
+    # "mongo" also broadcasts events to other workers via a change stream.
+    INVALIDATION_BACKEND = os.environ.get("INVALIDATION_BACKEND", "local")
     DOCTOR_ANALYTICS_CACHE_TTL_SECONDS = int(
-        os.environ.get("DOCTOR_ANALYTICS_CACHE_TTL_SECONDS", "60")
+        os.environ.get("DOCTOR_ANALYTICS_CACHE_TTL_SECONDS", "3600")
+    )
+    PATIENT_ANALYTICS_CACHE_TTL_SECONDS = int(
+        os.environ.get("PATIENT_ANALYTICS_CACHE_TTL_SECONDS", "3600")
+    )
+    PUBLIC_STATS_PREWARM = _is_truthy(os.environ.get("PUBLIC_STATS_PREWARM", "true"))
+    ADMIN_STATS_CACHE_TTL_SECONDS = int(
+        os.environ.get("ADMIN_STATS_CACHE_TTL_SECONDS", "60")
     )
     REPORTS_ENABLE_AI_SUMMARY = _is_truthy(os.environ.get("REPORTS_ENABLE_AI_SUMMARY"))
+    # Summaries are generated in the background when a prescription is created.
+    REPORTS_SUMMARY_WORKERS = int(os.environ.get("REPORTS_SUMMARY_WORKERS", "2"))
+    # At most this many summaries queued at once; further regenerations wait for a later download.
+    REPORTS_SUMMARY_MAX_PENDING = int(os.environ.get("REPORTS_SUMMARY_MAX_PENDING", "32"))
+    REPORTS_LLM_TIMEOUT_SECONDS = float(os.environ.get("REPORTS_LLM_TIMEOUT_SECONDS", "20"))
+    REPORTS_LLM_MAX_RETRIES = int(os.environ.get("REPORTS_LLM_MAX_RETRIES", "1"))
+    # PDF rendering runs in a process pool; 0 workers renders on the request thread.
+    REPORTS_RENDER_WORKERS = int(os.environ.get("REPORTS_RENDER_WORKERS", "2"))
+    REPORTS_RENDER_TIMEOUT_SECONDS = int(
+        os.environ.get("REPORTS_RENDER_TIMEOUT_SECONDS", "30")
+    )
+    REPORTS_JOB_TTL_SECONDS = int(os.environ.get("REPORTS_JOB_TTL_SECONDS", "600"))
+    REPORTS_BUNDLE_TIMEOUT_SECONDS = int(
+        os.environ.get("REPORTS_BUNDLE_TIMEOUT_SECONDS", "300")
+    )
+    # Content-addressed PDF cache; defaults to <tmp>/medicare-report-cache.
+    REPORTS_CACHE_DIR = os.environ.get("REPORTS_CACHE_DIR", "")
+    REPORTS_CACHE_MAX_BYTES = int(
+        os.environ.get("REPORTS_CACHE_MAX_BYTES", str(256 * 1024 * 1024))
+    )
     CHATBOT_DOCTORS_CONTEXT_CACHE_TTL_SECONDS = int(
-        os.environ.get("CHATBOT_DOCTORS_CONTEXT_CACHE_TTL_SECONDS", "120")
+        os.environ.get("CHATBOT_DOCTORS_CONTEXT_CACHE_TTL_SECONDS", "21600")
+    )
+    CHATBOT_DOCTORS_TOP_K = int(os.environ.get("CHATBOT_DOCTORS_TOP_K", "8"))
+    # Routing questions the local triage is this confident about skip the LLM.
+    CHATBOT_TRIAGE_ENABLED = _is_truthy(os.environ.get("CHATBOT_TRIAGE_ENABLED", "true"))
+    CHATBOT_TRIAGE_THRESHOLD = float(os.environ.get("CHATBOT_TRIAGE_THRESHOLD", "0.7"))
+    # Answers to first-turn messages are reused for the same normalized question.
+    CHATBOT_RESPONSE_CACHE_ENABLED = _is_truthy(
+        os.environ.get("CHATBOT_RESPONSE_CACHE_ENABLED", "true")
+    )
+    CHATBOT_RESPONSE_CACHE_TTL_SECONDS = int(
+        os.environ.get("CHATBOT_RESPONSE_CACHE_TTL_SECONDS", "3600")
+    )
+    # Chat model provider: "gemini", or "fake" for offline load tests.
+    LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "gemini")
+    LLM_GEMINI_MODEL = os.environ.get("LLM_GEMINI_MODEL", "gemini-2.5-flash")
+    # Fake provider: log-normal time to first token, per-token delay, failure rate.
+    LLM_FAKE_LATENCY_MEDIAN_MS = float(os.environ.get("LLM_FAKE_LATENCY_MEDIAN_MS", "600"))
+    LLM_FAKE_LATENCY_SIGMA = float(os.environ.get("LLM_FAKE_LATENCY_SIGMA", "0.4"))
+    LLM_FAKE_TOKEN_DELAY_MS = float(os.environ.get("LLM_FAKE_TOKEN_DELAY_MS", "15"))
+    LLM_FAKE_REPLY_TOKENS = int(os.environ.get("LLM_FAKE_REPLY_TOKENS", "60"))
+    LLM_FAKE_FAILURE_RATE = float(os.environ.get("LLM_FAKE_FAILURE_RATE", "0"))
+    LLM_FAKE_SEED = int(os.environ.get("LLM_FAKE_SEED", "0"))
+    # Bulkhead for model calls: a bounded pool plus a short wait queue; calls
+    # beyond that are rejected with 503 and Retry-After.
+    LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "4"))
+    LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", "16"))
+    LLM_CALL_TIMEOUT_SECONDS = float(os.environ.get("LLM_CALL_TIMEOUT_SECONDS", "30"))
+    LLM_RETRY_AFTER_SECONDS = int(os.environ.get("LLM_RETRY_AFTER_SECONDS", "5"))
+    # Prompt history: last N turns verbatim plus a rolling summary of older ones.
+    CHATBOT_CONTEXT_TURNS = int(os.environ.get("CHATBOT_CONTEXT_TURNS", "6"))
+    CHATBOT_CONTEXT_TOKEN_BUDGET = int(os.environ.get("CHATBOT_CONTEXT_TOKEN_BUDGET", "3000"))
+    CHATBOT_SUMMARY_BATCH_MESSAGES = int(
+        os.environ.get("CHATBOT_SUMMARY_BATCH_MESSAGES", "10")
     )
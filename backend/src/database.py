@@ -1,4 +1,5 @@
-from pymongo import MongoClient, ASCENDING
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
 from flask import current_app, g
 import logging
 
@@ -55,6 +56,26 @@ def close_mongo_client(e=None):  # noqa: ARG001
         client.close()
 
 
+def replace_all(collection, scope, key_field, documents):
+    """Make the documents matching ``scope`` exactly ``documents``.
+
+    Each document is upserted by ``scope`` plus its ``key_field`` value, then
+    documents in scope with any other key are deleted. Unlike delete-then-insert,
+    concurrent callers cannot collide on a unique index and readers never see
+    the scope empty.
+    """
+    for document in documents:
+        query = {**scope, key_field: document[key_field]}
+        try:
+            collection.replace_one(query, document, upsert=True)
+        except DuplicateKeyError:
+            # A concurrent upsert inserted the same key first; now it matches.
+            collection.replace_one(query, document, upsert=True)
+    collection.delete_many(
+        {**scope, key_field: {"$nin": [document[key_field] for document in documents]}}
+    )
+
+
 def init_db(app):
     """Initialize database connection with Flask app."""
     app.teardown_appcontext(close_db)
@@ -109,9 +130,36 @@ def _create_indexes(db):
     db[APPOINTMENTS_COLLECTION].create_index(
         [("patient_id", ASCENDING), ("doctor_id", ASCENDING), ("status", ASCENDING)]
     )
+    # Per-day lookups (slot availability, rollup rebuilds)
+    db[APPOINTMENTS_COLLECTION].create_index(
+        [("doctor_id", ASCENDING), ("date", ASCENDING)]
+    )
+
+    # Doctor stats: one document per doctor keyed by _id; pair collection tracks
+    # unique patients so the dashboard never has to $addToSet over appointments.
+    db[DOCTOR_PATIENTS_COLLECTION].create_index(
+        [("doctor_id", ASCENDING), ("patient_id", ASCENDING)], unique=True
+    )
+
+    # Daily appointment rollups for analytics charts
+    db[DAILY_APPOINTMENT_ROLLUPS_COLLECTION].create_index(
+        [("doctor_id", ASCENDING), ("date", ASCENDING)], unique=True
+    )
+
+    # Cross-process cache invalidation events reach other workers through the
+    # change stream as they are written; the documents are kept for an hour
+    # only so recent events can be inspected.
+    db[CACHE_INVALIDATIONS_COLLECTION].create_index(
+        [("created_at", ASCENDING)],
+        expireAfterSeconds=60 * 60,
+        name="cache_invalidations_ttl_1h",
+    )
 
     # Medical records indexes
     db[MEDICAL_RECORDS_COLLECTION].create_index([("patient_id", ASCENDING)])
+    db[MEDICAL_RECORDS_COLLECTION].create_index(
+        [("patient_id", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)]
+    )
 
     # Prescriptions indexes
     db[PRESCRIPTIONS_COLLECTION].create_index([("patient_id", ASCENDING)])
@@ -137,21 +185,47 @@ def _create_indexes(db):
 
     # Chat history indexes
     db[CHAT_HISTORY_COLLECTION].create_index([("user_id", ASCENDING)])
+    # Newest bucket first for appends, context windows and history pages
+    db[CHAT_HISTORY_BUCKETS_COLLECTION].create_index(
+        [("user_id", ASCENDING), ("seq", DESCENDING)]
+    )
 
     # Chatbot rate limits indexes (distributed window counting)
+    # One counter per (user, window), removed once its window has ended.
     db[CHATBOT_RATE_LIMITS_COLLECTION].create_index(
-        [("user_id", ASCENDING), ("created_at", ASCENDING)]
+        [("expires_at", ASCENDING)],
+        expireAfterSeconds=0,
+        name="chatbot_rate_limits_expires_at_ttl",
     )
-    # Keep rate-limit events for 24 hours
+    # Ages out per-message documents written by the previous limiter.
     db[CHATBOT_RATE_LIMITS_COLLECTION].create_index(
         [("created_at", ASCENDING)],
         expireAfterSeconds=24 * 60 * 60,
         name="chatbot_rate_limits_ttl_24h",
     )
 
+    # Shared login/register counters (AUTH_RATE_LIMIT_BACKEND=mongo)
+    db[AUTH_RATE_LIMITS_COLLECTION].create_index(
+        [("expires_at", ASCENDING)],
+        expireAfterSeconds=0,
+        name="auth_rate_limits_expires_at_ttl",
+    )
+
     # Ratings indexes
     db[RATINGS_COLLECTION].create_index([("doctor_id", ASCENDING)])
     db[RATINGS_COLLECTION].create_index([("appointment_id", ASCENDING)])
+    # Keyset pagination of a doctor's reviews, optionally filtered by score
+    db[RATINGS_COLLECTION].create_index(
+        [("doctor_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]
+    )
+    db[RATINGS_COLLECTION].create_index(
+        [
+            ("doctor_id", ASCENDING),
+            ("score", ASCENDING),
+            ("created_at", DESCENDING),
+            ("_id", DESCENDING),
+        ]
+    )
 
     # Messages indexes (chat performance)
     db[MESSAGES_COLLECTION].create_index(
@@ -169,9 +243,15 @@ PATIENTS_COLLECTION = "patients"
 MEDICAL_RECORDS_COLLECTION = "medical_records"
 APPOINTMENTS_COLLECTION = "appointments"
 CHAT_HISTORY_COLLECTION = "chat_history"
+CHAT_HISTORY_BUCKETS_COLLECTION = "chat_history_buckets"
 RATINGS_COLLECTION = "ratings"
 PRESCRIPTIONS_COLLECTION = "prescriptions"
 SCHEDULES_COLLECTION = "schedules"
 NOTIFICATIONS_COLLECTION = "notifications"
 MESSAGES_COLLECTION = "messages"
 CHATBOT_RATE_LIMITS_COLLECTION = "chatbot_rate_limits"
+AUTH_RATE_LIMITS_COLLECTION = "auth_rate_limits"
+DOCTOR_STATS_COLLECTION = "doctor_stats"
+DOCTOR_PATIENTS_COLLECTION = "doctor_patients"
+DAILY_APPOINTMENT_ROLLUPS_COLLECTION = "daily_appointment_rollups"
+CACHE_INVALIDATIONS_COLLECTION = "cache_invalidations"
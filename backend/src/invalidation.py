@@ -0,0 +1,109 @@
+"""
+Cache invalidation bus fed by model write paths.
+
+Models ``publish`` a small event (ids as strings) after each write; cache
+owners ``subscribe`` handlers that evict exactly the affected keys. Handlers
+always run in-process. With ``INVALIDATION_BACKEND=mongo`` events are also
+written to a collection and other workers receive them through a change
+stream (requires a replica set, a single-node one is enough).
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+
+from .database import get_db, CACHE_INVALIDATIONS_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+APPOINTMENT_CHANGED = "appointment.changed"
+PRESCRIPTION_CREATED = "prescription.created"
+RATING_CREATED = "rating.created"
+DOCTOR_CHANGED = "doctor.changed"
+MEDICAL_RECORD_CHANGED = "medical_record.changed"
+
+_handlers: Dict[str, List[Callable[[dict], None]]] = {}
+_lock = threading.Lock()
+# Identifies this process so it ignores its own events on the change stream.
+_ORIGIN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+_backend = {"name": "local"}
+
+
+def subscribe(event: str, handler: Callable[[dict], None] = None):
+    """Register a handler for an event; usable as a decorator."""
+    if handler is None:
+        return lambda func: subscribe(event, func)
+    with _lock:
+        _handlers.setdefault(event, []).append(handler)
+    return handler
+
+
+def _dispatch(event: str, payload: dict) -> None:
+    with _lock:
+        handlers = list(_handlers.get(event, []))
+    for handler in handlers:
+        try:
+            handler(payload)
+        except Exception:
+            logger.exception("Invalidation handler for %s failed", event)
+
+
+def publish(event: str, **ids) -> None:
+    """Notify subscribers that data identified by ``ids`` changed."""
+    payload = {
+        key: str(value) if isinstance(value, ObjectId) else value
+        for key, value in ids.items()
+        if value is not None
+    }
+    _dispatch(event, payload)
+    if _backend["name"] != "mongo":
+        return
+    try:
+        get_db()[CACHE_INVALIDATIONS_COLLECTION].insert_one(
+            {
+                "event": event,
+                "payload": payload,
+                "origin": _ORIGIN,
+                "created_at": datetime.utcnow(),
+            }
+        )
+    except PyMongoError:
+        logger.exception("Failed to broadcast invalidation event %s", event)
+
+
+def _listen(app) -> None:
+    """Apply invalidation events from other processes, resuming after errors."""
+    resume_token = None
+    pipeline = [
+        {"$match": {"operationType": "insert", "fullDocument.origin": {"$ne": _ORIGIN}}}
+    ]
+    while True:
+        try:
+            with app.app_context():
+                collection = get_db()[CACHE_INVALIDATIONS_COLLECTION]
+                with collection.watch(pipeline, resume_after=resume_token) as stream:
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        document = change.get("fullDocument") or {}
+                        _dispatch(document.get("event"), document.get("payload") or {})
+        except PyMongoError:
+            logger.exception("Invalidation change stream failed; retrying")
+            time.sleep(5)
+
+
+def init_invalidation(app) -> None:
+    """Select the invalidation backend and start the change stream listener."""
+    backend = str(app.config.get("INVALIDATION_BACKEND", "local")).strip().lower()
+    _backend["name"] = backend
+    if backend != "mongo" or app.testing:
+        return
+    threading.Thread(
+        target=_listen, args=(app,), name="cache-invalidation-listener", daemon=True
+    ).start()
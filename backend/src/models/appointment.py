@@ -1,6 +1,13 @@
 from bson import ObjectId
 from datetime import datetime
+from pymongo import ReturnDocument
 from ..database import get_db, APPOINTMENTS_COLLECTION
+from .appointment_rollup import AppointmentRollup
+from .doctor_stats import DoctorStats
+from ..invalidation import publish, APPOINTMENT_CHANGED
+
+# Fields that feed derived stats, rollups and cached dashboards
+_TRACKED_FIELDS = ("status", "date", "time")
 
 
 class Appointment:
@@ -29,6 +36,13 @@ class Appointment:
         }
         result = db[APPOINTMENTS_COLLECTION].insert_one(appointment_data)
         appointment_data["_id"] = result.inserted_id
+        DoctorStats.record_appointment_created(appointment_data)
+        AppointmentRollup.record_created(appointment_data)
+        publish(
+            APPOINTMENT_CHANGED,
+            doctor_id=appointment_data["doctor_id"],
+            patient_id=appointment_data["patient_id"],
+        )
         return appointment_data
 
     @staticmethod
@@ -85,16 +99,19 @@ class Appointment:
             appointment_id = ObjectId(appointment_id)
         return db[APPOINTMENTS_COLLECTION].find_one({"_id": appointment_id})
 
+    @staticmethod
+    def find_by_ids(appointment_ids, projection=None):
+        """Find several appointments in one query."""
+        db = get_db()
+        ids = [ObjectId(a) if isinstance(a, str) else a for a in appointment_ids if a]
+        if not ids:
+            return []
+        return list(db[APPOINTMENTS_COLLECTION].find({"_id": {"$in": ids}}, projection))
+
     @staticmethod
     def update_status(appointment_id, status):
         """Update appointment status."""
-        db = get_db()
-        if isinstance(appointment_id, str):
-            appointment_id = ObjectId(appointment_id)
-        db[APPOINTMENTS_COLLECTION].update_one(
-            {"_id": appointment_id}, {"$set": {"status": status}}
-        )
-        return Appointment.find_by_id(appointment_id)
+        return Appointment.update(appointment_id, {"status": status})
 
     @staticmethod
     def update(appointment_id, updates):
@@ -102,8 +119,30 @@ class Appointment:
         db = get_db()
         if isinstance(appointment_id, str):
             appointment_id = ObjectId(appointment_id)
-        db[APPOINTMENTS_COLLECTION].update_one(
-            {"_id": appointment_id}, {"$set": updates}
+        if not any(field in updates for field in _TRACKED_FIELDS):
+            db[APPOINTMENTS_COLLECTION].update_one(
+                {"_id": appointment_id}, {"$set": updates}
+            )
+            return Appointment.find_by_id(appointment_id)
+
+        # Status/date/time changes read the previous values atomically to keep
+        # stats and daily rollups exact.
+        previous = db[APPOINTMENTS_COLLECTION].find_one_and_update(
+            {"_id": appointment_id},
+            {"$set": updates},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if previous is None:
+            return None
+        if "status" in updates:
+            DoctorStats.record_status_change(
+                previous.get("doctor_id"), previous.get("status"), updates["status"]
+            )
+        AppointmentRollup.record_change(previous, updates)
+        publish(
+            APPOINTMENT_CHANGED,
+            doctor_id=previous.get("doctor_id"),
+            patient_id=previous.get("patient_id"),
         )
         return Appointment.find_by_id(appointment_id)
 
@@ -113,7 +152,17 @@ class Appointment:
         db = get_db()
         if isinstance(appointment_id, str):
             appointment_id = ObjectId(appointment_id)
-        return db[APPOINTMENTS_COLLECTION].delete_one({"_id": appointment_id})
+        existing = db[APPOINTMENTS_COLLECTION].find_one({"_id": appointment_id})
+        result = db[APPOINTMENTS_COLLECTION].delete_one({"_id": appointment_id})
+        if existing is not None and result.deleted_count:
+            DoctorStats.record_appointment_deleted(existing)
+            AppointmentRollup.record_deleted(existing)
+            publish(
+                APPOINTMENT_CHANGED,
+                doctor_id=existing.get("doctor_id"),
+                patient_id=existing.get("patient_id"),
+            )
+        return result
 
     @staticmethod
     def to_dict(appointment):
@@ -0,0 +1,149 @@
+from bson import ObjectId
+from datetime import datetime
+from ..database import (
+    get_db,
+    replace_all,
+    APPOINTMENTS_COLLECTION,
+    DAILY_APPOINTMENT_ROLLUPS_COLLECTION,
+)
+
+
+class AppointmentRollup:
+    """Per-doctor, per-day appointment counts keyed by appointment date.
+
+    Maintained with upserted ``$inc`` deltas on every appointment write, so
+    chart ranges read at most one small document per day regardless of the
+    total appointment volume. ``rebuild`` recomputes them from raw data.
+    """
+
+    @staticmethod
+    def _oid(value):
+        return ObjectId(value) if isinstance(value, str) else value
+
+    @staticmethod
+    def _apply(doctor_id, date, status, delta):
+        if not doctor_id or not date or not status:
+            return
+        db = get_db()
+        db[DAILY_APPOINTMENT_ROLLUPS_COLLECTION].update_one(
+            {"doctor_id": AppointmentRollup._oid(doctor_id), "date": date},
+            {
+                "$inc": {"total": delta, f"status_counts.{status}": delta},
+                "$set": {"updated_at": datetime.utcnow()},
+            },
+            upsert=True,
+        )
+
+    @staticmethod
+    def record_created(appointment):
+        """Count a new appointment on its day."""
+        AppointmentRollup._apply(
+            appointment.get("doctor_id"),
+            appointment.get("date"),
+            appointment.get("status", "pending"),
+            1,
+        )
+
+    @staticmethod
+    def record_change(previous, updates):
+        """Move an appointment between (date, status) cells after an update."""
+        old_date = previous.get("date")
+        old_status = previous.get("status", "pending")
+        new_date = updates.get("date", old_date)
+        new_status = updates.get("status", old_status)
+        if (old_date, old_status) == (new_date, new_status):
+            return
+        doctor_id = previous.get("doctor_id")
+        AppointmentRollup._apply(doctor_id, old_date, old_status, -1)
+        AppointmentRollup._apply(doctor_id, new_date, new_status, 1)
+
+    @staticmethod
+    def record_deleted(appointment):
+        """Uncount a deleted appointment."""
+        AppointmentRollup._apply(
+            appointment.get("doctor_id"),
+            appointment.get("date"),
+            appointment.get("status", "pending"),
+            -1,
+        )
+
+    @staticmethod
+    def find_range(doctor_id, start_date, end_date):
+        """Get rollups for a doctor between two YYYY-MM-DD dates (inclusive)."""
+        db = get_db()
+        return list(
+            db[DAILY_APPOINTMENT_ROLLUPS_COLLECTION]
+            .find(
+                {
+                    "doctor_id": AppointmentRollup._oid(doctor_id),
+                    "date": {"$gte": start_date, "$lte": end_date},
+                },
+                {"_id": 0, "date": 1, "total": 1, "status_counts": 1},
+            )
+            .sort("date", 1)
+        )
+
+    @staticmethod
+    def count_for_day(doctor_id, date):
+        """Get the number of appointments a doctor has on a given date."""
+        db = get_db()
+        rollup = db[DAILY_APPOINTMENT_ROLLUPS_COLLECTION].find_one(
+            {"doctor_id": AppointmentRollup._oid(doctor_id), "date": date},
+            {"total": 1},
+        )
+        return rollup.get("total", 0) if rollup else 0
+
+    @staticmethod
+    def rebuild(doctor_id):
+        """Recompute a doctor's daily rollups from raw appointments.
+
+        Upsert-only, so it is safe alongside a concurrent rebuild.
+        """
+        db = get_db()
+        doctor_id = AppointmentRollup._oid(doctor_id)
+        pipeline = [
+            {"$match": {"doctor_id": doctor_id}},
+            {
+                "$group": {
+                    "_id": {"date": "$date", "status": "$status"},
+                    "count": {"$sum": 1},
+                }
+            },
+        ]
+        by_date = {}
+        for row in db[APPOINTMENTS_COLLECTION].aggregate(pipeline):
+            date = row["_id"].get("date")
+            if not date:
+                continue
+            status = row["_id"].get("status") or "pending"
+            rollup = by_date.setdefault(
+                date, {"doctor_id": doctor_id, "date": date, "total": 0, "status_counts": {}}
+            )
+            rollup["total"] += row["count"]
+            rollup["status_counts"][status] = (
+                rollup["status_counts"].get(status, 0) + row["count"]
+            )
+
+        now = datetime.utcnow()
+        for rollup in by_date.values():
+            rollup["updated_at"] = now
+        replace_all(
+            db[DAILY_APPOINTMENT_ROLLUPS_COLLECTION],
+            {"doctor_id": doctor_id},
+            "date",
+            list(by_date.values()),
+        )
+        return len(by_date)
+
+    @staticmethod
+    def rebuild_all():
+        """Rebuild rollups for every doctor with appointments."""
+        db = get_db()
+        doctor_ids = [
+            doctor_id
+            for doctor_id in db[APPOINTMENTS_COLLECTION].distinct("doctor_id")
+            if doctor_id
+        ]
+        for doctor_id in doctor_ids:
+            AppointmentRollup.rebuild(doctor_id)
+        return len(doctor_ids)
@@ -1,84 +1,326 @@
 from bson import ObjectId
 from datetime import datetime
+import math
 import os
-from ..database import get_db, CHAT_HISTORY_COLLECTION
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from ..database import get_db, CHAT_HISTORY_COLLECTION, CHAT_HISTORY_BUCKETS_COLLECTION
 
 
 class ChatHistory:
-    """Model for storing chatbot conversation history."""
+    """Model for storing chatbot conversation history.
+
+    Messages live in fixed-size bucket documents (``chat_history_buckets``),
+    one sequence per user; only the newest bucket is ``open`` for appends, so
+    a turn is a single ``$push`` to a small document. Each bucket records the
+    absolute index of its first message (``start``). The per-user document in
+    ``chat_history`` keeps the rolling summary state. Histories written before
+    buckets keep their ``messages`` array there until the next append moves
+    it into buckets.
+    """
 
     _MAX_MESSAGES = int(os.environ.get("CHAT_HISTORY_MAX_MESSAGES", "200"))
-    
+    BUCKET_SIZE = int(os.environ.get("CHAT_HISTORY_BUCKET_SIZE", "50"))
+
+    @staticmethod
+    def _oid(user_id):
+        return ObjectId(user_id) if isinstance(user_id, str) else user_id
+
+    @staticmethod
+    def _message(role, content):
+        return {
+            'role': role,  # 'user' or 'assistant'
+            'content': content,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+
     @staticmethod
     def find_by_user_id(user_id):
-        """Get chat history for a user."""
+        """Get a user's chat history document (summary state)."""
         db = get_db()
-        if isinstance(user_id, str):
-            user_id = ObjectId(user_id)
-        return db[CHAT_HISTORY_COLLECTION].find_one({'user_id': user_id})
-    
+        return db[CHAT_HISTORY_COLLECTION].find_one({'user_id': ChatHistory._oid(user_id)})
+
     @staticmethod
     def create(user_id, messages=None):
         """Create a new chat history entry."""
         db = get_db()
-        if isinstance(user_id, str):
-            user_id = ObjectId(user_id)
-        
-        capped_messages = (messages or [])[-ChatHistory._MAX_MESSAGES :]
+        user_id = ChatHistory._oid(user_id)
         chat_data = {
             'user_id': user_id,
-            'messages': capped_messages,
+            'summary_through': 0,
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
         result = db[CHAT_HISTORY_COLLECTION].insert_one(chat_data)
         chat_data['_id'] = result.inserted_id
+        if messages:
+            ChatHistory._append(user_id, list(messages))
         return chat_data
-    
+
+    @staticmethod
+    def _insert_buckets(user_id, messages, seq, start):
+        """Write ``messages`` as buckets numbered from ``seq``; the last stays open.
+
+        The newest bucket is inserted first: a concurrent writer only ever
+        targets the bucket after the newest one, so it either collides on
+        that first insert (and nothing was written) or appends after it.
+        """
+        db = get_db()
+        now = datetime.utcnow()
+        chunks = [
+            messages[i:i + ChatHistory.BUCKET_SIZE]
+            for i in range(0, len(messages), ChatHistory.BUCKET_SIZE)
+        ]
+        buckets = []
+        for offset, chunk in enumerate(chunks):
+            buckets.append({
+                '_id': f'{user_id}:{seq + offset}',
+                'user_id': user_id,
+                'seq': seq + offset,
+                'start': start,
+                'count': len(chunk),
+                'messages': chunk,
+                'open': offset == len(chunks) - 1,
+                'created_at': now,
+                'updated_at': now,
+            })
+            start += len(chunk)
+        for bucket in reversed(buckets):
+            db[CHAT_HISTORY_BUCKETS_COLLECTION].insert_one(bucket)
+
+    @staticmethod
+    def _start_history(user_id):
+        """Ensure the user's history document exists before their first bucket.
+
+        A pre-bucket ``messages`` array is moved into buckets; returns True
+        if that wrote any, or if a concurrent writer already moved them.
+        """
+        db = get_db()
+        history = db[CHAT_HISTORY_COLLECTION].find_one_and_update(
+            {'user_id': user_id},
+            {'$setOnInsert': {
+                'summary_through': 0,
+                'created_at': datetime.utcnow(),
+                'updated_at': datetime.utcnow(),
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if 'messages' not in history:
+            return False
+        messages = history['messages'] or []
+        if messages:
+            start = history.get('message_count', len(messages)) - len(messages)
+            try:
+                ChatHistory._insert_buckets(user_id, messages, 0, start)
+            except DuplicateKeyError:
+                # Another request moved them first and clears the array.
+                return True
+        db[CHAT_HISTORY_COLLECTION].update_one(
+            {'_id': history['_id']}, {'$unset': {'messages': '', 'message_count': ''}}
+        )
+        return bool(messages)
+
+    @staticmethod
+    def _append(user_id, messages):
+        """Append messages in one update to the open bucket.
+
+        When it lacks room the bucket is closed and a new one started (and
+        buckets beyond ``_MAX_MESSAGES`` are dropped).
+        """
+        db = get_db()
+        buckets = db[CHAT_HISTORY_BUCKETS_COLLECTION]
+        size = len(messages)
+        while True:
+            appended = buckets.find_one_and_update(
+                {
+                    'user_id': user_id,
+                    'open': True,
+                    'count': {'$lte': max(0, ChatHistory.BUCKET_SIZE - size)},
+                },
+                {
+                    '$push': {'messages': {'$each': messages}},
+                    '$inc': {'count': size},
+                    '$set': {'updated_at': datetime.utcnow()},
+                },
+                projection={'_id': 1},
+            )
+            if appended:
+                return messages
+
+            latest = buckets.find_one(
+                {'user_id': user_id},
+                {'seq': 1, 'start': 1, 'count': 1},
+                sort=[('seq', DESCENDING)],
+            )
+            if latest is None:
+                if ChatHistory._start_history(user_id):
+                    continue
+                seq, start = 0, 0
+            else:
+                # Close before starting the next bucket so appends stay in order.
+                buckets.update_one({'_id': latest['_id']}, {'$set': {'open': False}})
+                seq, start = latest['seq'] + 1, latest['start'] + latest['count']
+            try:
+                ChatHistory._insert_buckets(user_id, messages, seq, start)
+            except DuplicateKeyError:
+                # Another writer started this bucket first.
+                continue
+            kept_buckets = math.ceil(ChatHistory._MAX_MESSAGES / ChatHistory.BUCKET_SIZE)
+            buckets.delete_many({'user_id': user_id, 'seq': {'$lt': seq - kept_buckets}})
+            return messages
+
     @staticmethod
     def add_message(user_id, role, content):
         """Add a message to chat history."""
+        message = ChatHistory._message(role, content)
+        ChatHistory._append(ChatHistory._oid(user_id), [message])
+        return message
+
+    @staticmethod
+    def add_turn(user_id, user_content, assistant_content):
+        """Store a user message and the assistant's reply in one write."""
+        messages = [
+            ChatHistory._message('user', user_content),
+            ChatHistory._message('assistant', assistant_content),
+        ]
+        return ChatHistory._append(ChatHistory._oid(user_id), messages)
+
+    @staticmethod
+    def _legacy_messages(user_id, max_messages=None):
+        """The ``messages`` array of a pre-bucket history, or None."""
+        db = get_db()
+        projection = {'messages': 1, 'message_count': 1}
+        if max_messages is not None:
+            projection['messages'] = {'$slice': -max(1, int(max_messages))}
+        history = db[CHAT_HISTORY_COLLECTION].find_one(
+            {'user_id': user_id, 'messages': {'$exists': True}}, projection
+        )
+        return history
+
+    @staticmethod
+    def get_messages(user_id):
+        """Get all stored messages for a user, oldest first."""
+        db = get_db()
+        user_id = ChatHistory._oid(user_id)
+        messages = []
+        for bucket in db[CHAT_HISTORY_BUCKETS_COLLECTION].find(
+            {'user_id': user_id}, {'messages': 1}
+        ).sort('seq', 1):
+            messages.extend(bucket.get('messages', []))
+        if messages:
+            return messages
+        legacy = ChatHistory._legacy_messages(user_id)
+        return legacy.get('messages', []) if legacy else []
+
+    @staticmethod
+    def get_page(user_id, before=None, limit=50):
+        """Return ``(messages, next_cursor)`` for one page, newest page first.
+
+        A page is whole buckets read backwards from before bucket ``before``
+        until at least ``limit`` messages; messages are oldest first.
+        ``next_cursor`` is the bucket sequence to pass as ``before`` for the
+        previous page, or None at the start of the history.
+        """
+        db = get_db()
+        user_id = ChatHistory._oid(user_id)
+        query = {'user_id': user_id}
+        if before is not None:
+            query['seq'] = {'$lt': int(before)}
+        pages = []
+        count = 0
+        oldest_seq = None
+        cursor = db[CHAT_HISTORY_BUCKETS_COLLECTION].find(
+            query, {'seq': 1, 'messages': 1}
+        ).sort('seq', DESCENDING)
+        for bucket in cursor:
+            pages.append(bucket.get('messages', []))
+            count += len(pages[-1])
+            oldest_seq = bucket['seq']
+            if count >= limit:
+                break
+        if not pages:
+            if before is not None:
+                return [], None
+            legacy = ChatHistory._legacy_messages(user_id, limit)
+            return (legacy.get('messages', []) if legacy else []), None
+
+        messages = [message for page in reversed(pages) for message in page]
+        has_older = db[CHAT_HISTORY_BUCKETS_COLLECTION].find_one(
+            {'user_id': user_id, 'seq': {'$lt': oldest_seq}}, {'_id': 1}
+        ) is not None
+        return messages, (oldest_seq if has_older else None)
+
+    @staticmethod
+    def get_context_window(user_id, max_messages):
+        """Return the newest ``max_messages`` messages plus summary state.
+
+        Only the newest buckets are read. Returns a dict with ``messages``,
+        ``message_count``, ``summary`` and ``summary_through`` (messages
+        before that absolute index are folded into ``summary``), or None if
+        the user has no history.
+        """
         db = get_db()
         if isinstance(user_id, str):
+            if not ObjectId.is_valid(user_id):
+                return None
             user_id = ObjectId(user_id)
-        
-        message = {
-            'role': role,  # 'user' or 'assistant'
-            'content': content,
-            'timestamp': datetime.utcnow().isoformat()
-        }
-        
-        # Try to update existing history
-        result = db[CHAT_HISTORY_COLLECTION].update_one(
+        max_messages = max(1, int(max_messages))
+        history = db[CHAT_HISTORY_COLLECTION].find_one(
             {'user_id': user_id},
             {
-                '$push': {'messages': {'$each': [message], '$slice': -ChatHistory._MAX_MESSAGES}},
-                '$set': {'updated_at': datetime.utcnow()}
+                'messages': {'$slice': -max_messages},
+                'message_count': 1,
+                'summary': 1,
+                'summary_through': 1,
             }
         )
-        
-        # If no existing history, create new
-        if result.matched_count == 0:
-            ChatHistory.create(user_id, [message])
-        
-        return message
-    
+        if not history:
+            return None
+
+        if 'messages' in history:
+            messages = history['messages']
+            message_count = history.get('message_count', len(messages))
+        else:
+            buckets = list(db[CHAT_HISTORY_BUCKETS_COLLECTION].find(
+                {'user_id': user_id}, {'start': 1, 'count': 1, 'messages': 1}
+            ).sort('seq', DESCENDING).limit(max_messages // ChatHistory.BUCKET_SIZE + 2))
+            message_count = buckets[0]['start'] + buckets[0]['count'] if buckets else 0
+            messages = [
+                message for bucket in reversed(buckets) for message in bucket.get('messages', [])
+            ][-max_messages:]
+        return {
+            'messages': messages,
+            'message_count': message_count,
+            'summary': history.get('summary', ''),
+            'summary_through': history.get('summary_through', 0),
+        }
+
     @staticmethod
-    def get_messages(user_id):
-        """Get all messages for a user."""
-        history = ChatHistory.find_by_user_id(user_id)
-        if history:
-            return history.get('messages', [])
-        return []
-    
+    def set_summary(user_id, text, through, previous_through):
+        """Store a rolling summary covering messages before index ``through``.
+
+        Only applies if no other writer advanced the summary since
+        ``previous_through`` was read; returns True if it was stored.
+        """
+        db = get_db()
+        if isinstance(user_id, str):
+            user_id = ObjectId(user_id)
+        current = {'$in': [None, 0]} if not previous_through else previous_through
+        result = db[CHAT_HISTORY_COLLECTION].update_one(
+            {'user_id': user_id, 'summary_through': current},
+            {'$set': {'summary': text, 'summary_through': through}}
+        )
+        return result.modified_count == 1
+
     @staticmethod
     def clear_history(user_id):
         """Clear chat history for a user."""
         db = get_db()
-        if isinstance(user_id, str):
-            user_id = ObjectId(user_id)
+        user_id = ChatHistory._oid(user_id)
+        db[CHAT_HISTORY_BUCKETS_COLLECTION].delete_many({'user_id': user_id})
         return db[CHAT_HISTORY_COLLECTION].delete_one({'user_id': user_id})
-    
+
     @staticmethod
     def to_dict(history):
         """Convert chat history to dictionary."""
@@ -1,6 +1,7 @@
 from bson import ObjectId
 from pymongo import DESCENDING
 from ..database import get_db, DOCTORS_COLLECTION
+from ..invalidation import publish, DOCTOR_CHANGED
 
 class Doctor:
     """Doctor model."""
@@ -17,20 +18,23 @@ class Doctor:
             'availability': availability,
             'rating': rating,
             'rating_count': 0,
+            'rating_sum': 0,
+            'rating_histogram': {str(score): 0 for score in range(1, 6)},
             'image': image,
             'verified': verified,
             'verification_status': 'verified' if verified else 'pending'
         }
         result = db[DOCTORS_COLLECTION].insert_one(doctor_data)
         doctor_data['_id'] = result.inserted_id
+        publish(DOCTOR_CHANGED, doctor_id=result.inserted_id)
         return doctor_data
     
     @staticmethod
-    def find_all(verified_only=False):
+    def find_all(verified_only=False, projection=None):
         """Get all doctors."""
         db = get_db()
         query = {'verified': True} if verified_only else {}
-        return list(db[DOCTORS_COLLECTION].find(query))
+        return list(db[DOCTORS_COLLECTION].find(query, projection))
     
     @staticmethod
     def find_by_verification_status(status):
@@ -46,6 +50,15 @@ class Doctor:
             doctor_id = ObjectId(doctor_id)
         return db[DOCTORS_COLLECTION].find_one({'_id': doctor_id})
     
+    @staticmethod
+    def find_by_ids(doctor_ids, projection=None):
+        """Find several doctors in one query."""
+        db = get_db()
+        ids = [ObjectId(d) if isinstance(d, str) else d for d in doctor_ids if d]
+        if not ids:
+            return []
+        return list(db[DOCTORS_COLLECTION].find({'_id': {'$in': ids}}, projection))
+    
     @staticmethod
     def find_by_user_id(user_id):
         """Find a doctor by user ID."""
@@ -67,6 +80,7 @@ class Doctor:
             {'_id': doctor_id},
             {'$set': update_data}
         )
+        publish(DOCTOR_CHANGED, doctor_id=doctor_id)
         return Doctor.find_by_id(doctor_id)
     
     @staticmethod
@@ -91,7 +105,9 @@ class Doctor:
         db = get_db()
         if isinstance(doctor_id, str):
             doctor_id = ObjectId(doctor_id)
-        return db[DOCTORS_COLLECTION].delete_one({'_id': doctor_id})
+        result = db[DOCTORS_COLLECTION].delete_one({'_id': doctor_id})
+        publish(DOCTOR_CHANGED, doctor_id=doctor_id)
+        return result
     
     @staticmethod
     def to_dict(doctor):
@@ -153,6 +169,7 @@ class Doctor:
                 }
             }
         )
+        publish(DOCTOR_CHANGED, doctor_id=doctor_id)
         return Doctor.find_by_id(doctor_id)
     
     @staticmethod
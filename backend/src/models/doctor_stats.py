@@ -0,0 +1,245 @@
+from bson import ObjectId
+from datetime import datetime
+from pymongo import ReturnDocument
+from ..database import (
+    get_db,
+    replace_all,
+    APPOINTMENTS_COLLECTION,
+    DOCTOR_PATIENTS_COLLECTION,
+    DOCTOR_STATS_COLLECTION,
+    PRESCRIPTIONS_COLLECTION,
+)
+from .appointment_rollup import AppointmentRollup
+
+
+class DoctorStats:
+    """Incrementally maintained dashboard counters, one document per doctor.
+
+    Write paths apply ``$inc`` deltas to an existing document only. A doctor
+    without a stats document (legacy or seeded data) is rebuilt from the raw
+    collections on first read, after which the counters stay current.
+    Rebuilds only upsert, so concurrent first reads are safe. Rating totals
+    live on the doctor document (see ``Rating``), not here.
+    """
+
+    @staticmethod
+    def _oid(value):
+        return ObjectId(value) if isinstance(value, str) else value
+
+    @staticmethod
+    def _month_key(created_at):
+        if isinstance(created_at, datetime):
+            return created_at.strftime("%Y-%m")
+        return None
+
+    @staticmethod
+    def _apply(doctor_id, increments):
+        """Apply counter deltas; skipped when the doctor has no stats yet."""
+        increments = {key: value for key, value in increments.items() if value}
+        if not doctor_id or not increments:
+            return
+        db = get_db()
+        db[DOCTOR_STATS_COLLECTION].update_one(
+            {"_id": DoctorStats._oid(doctor_id)},
+            {"$inc": increments, "$set": {"updated_at": datetime.utcnow()}},
+        )
+
+    @staticmethod
+    def _add_patient_pair(doctor_id, patient_id):
+        """Count an appointment for a doctor/patient pair; True if the pair is new."""
+        db = get_db()
+        previous = db[DOCTOR_PATIENTS_COLLECTION].find_one_and_update(
+            {"doctor_id": doctor_id, "patient_id": patient_id},
+            {
+                "$inc": {"appointments": 1},
+                "$setOnInsert": {"created_at": datetime.utcnow()},
+            },
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+        return previous is None
+
+    @staticmethod
+    def _remove_patient_pair(doctor_id, patient_id):
+        """Uncount an appointment for a pair; True if it was the pair's last one."""
+        db = get_db()
+        updated = db[DOCTOR_PATIENTS_COLLECTION].find_one_and_update(
+            {"doctor_id": doctor_id, "patient_id": patient_id},
+            {"$inc": {"appointments": -1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if updated is None or updated.get("appointments", 0) > 0:
+            return False
+        db[DOCTOR_PATIENTS_COLLECTION].delete_one({"_id": updated["_id"]})
+        return True
+
+    @staticmethod
+    def record_appointment_created(appointment):
+        """Count a newly booked appointment."""
+        doctor_id = appointment.get("doctor_id")
+        patient_id = appointment.get("patient_id")
+        if not doctor_id:
+            return
+        increments = {
+            "total": 1,
+            f"status_counts.{appointment.get('status', 'pending')}": 1,
+        }
+        month = DoctorStats._month_key(appointment.get("created_at"))
+        if month:
+            increments[f"created_by_month.{month}"] = 1
+        if patient_id and DoctorStats._add_patient_pair(doctor_id, patient_id):
+            increments["unique_patients"] = 1
+        DoctorStats._apply(doctor_id, increments)
+
+    @staticmethod
+    def record_status_change(doctor_id, old_status, new_status):
+        """Move one appointment between status counters."""
+        if not old_status or not new_status or old_status == new_status:
+            return
+        DoctorStats._apply(
+            doctor_id,
+            {f"status_counts.{old_status}": -1, f"status_counts.{new_status}": 1},
+        )
+
+    @staticmethod
+    def record_appointment_deleted(appointment):
+        """Uncount a deleted appointment."""
+        doctor_id = appointment.get("doctor_id")
+        patient_id = appointment.get("patient_id")
+        if not doctor_id:
+            return
+        increments = {
+            "total": -1,
+            f"status_counts.{appointment.get('status', 'pending')}": -1,
+        }
+        month = DoctorStats._month_key(appointment.get("created_at"))
+        if month:
+            increments[f"created_by_month.{month}"] = -1
+        if patient_id and DoctorStats._remove_patient_pair(doctor_id, patient_id):
+            increments["unique_patients"] = -1
+        DoctorStats._apply(doctor_id, increments)
+
+    @staticmethod
+    def record_prescription(doctor_id):
+        """Count a prescription written by the doctor."""
+        DoctorStats._apply(doctor_id, {"prescriptions": 1})
+
+    @staticmethod
+    def rebuild(doctor_id):
+        """Recompute a doctor's stats, patient pairs and daily rollups from raw data."""
+        db = get_db()
+        doctor_id = DoctorStats._oid(doctor_id)
+
+        pipeline = [
+            {"$match": {"doctor_id": doctor_id}},
+            {
+                "$group": {
+                    "_id": {
+                        "patient_id": "$patient_id",
+                        "status": "$status",
+                        "month": {
+                            "$dateToString": {"format": "%Y-%m", "date": "$created_at"}
+                        },
+                    },
+                    "count": {"$sum": 1},
+                }
+            },
+        ]
+
+        total = 0
+        status_counts = {}
+        created_by_month = {}
+        pair_counts = {}
+        for row in db[APPOINTMENTS_COLLECTION].aggregate(pipeline):
+            key = row["_id"]
+            count = row["count"]
+            total += count
+            status = key.get("status") or "pending"
+            status_counts[status] = status_counts.get(status, 0) + count
+            if key.get("month"):
+                created_by_month[key["month"]] = (
+                    created_by_month.get(key["month"], 0) + count
+                )
+            if key.get("patient_id"):
+                patient_id = key["patient_id"]
+                pair_counts[patient_id] = pair_counts.get(patient_id, 0) + count
+
+        now = datetime.utcnow()
+        replace_all(
+            db[DOCTOR_PATIENTS_COLLECTION],
+            {"doctor_id": doctor_id},
+            "patient_id",
+            [
+                {
+                    "doctor_id": doctor_id,
+                    "patient_id": patient_id,
+                    "appointments": count,
+                    "created_at": now,
+                }
+                for patient_id, count in pair_counts.items()
+            ],
+        )
+
+        stats = {
+            "total": total,
+            "status_counts": status_counts,
+            "created_by_month": created_by_month,
+            "unique_patients": len(pair_counts),
+            "prescriptions": db[PRESCRIPTIONS_COLLECTION].count_documents(
+                {"doctor_id": doctor_id}
+            ),
+            "updated_at": now,
+            "rebuilt_at": now,
+        }
+        db[DOCTOR_STATS_COLLECTION].update_one(
+            {"_id": doctor_id},
+            # Rating totals were stored here before they moved to the doctor document.
+            {"$set": stats, "$unset": {"rating_sum": "", "rating_count": ""}},
+            upsert=True,
+        )
+        stats["_id"] = doctor_id
+        # Daily rollups are derived from the same raw data; keep them in step.
+        AppointmentRollup.rebuild(doctor_id)
+        return stats
+
+    @staticmethod
+    def rebuild_all():
+        """Rebuild stats for every doctor that has appointments or prescriptions."""
+        db = get_db()
+        doctor_ids = set(db[APPOINTMENTS_COLLECTION].distinct("doctor_id"))
+        doctor_ids.update(db[PRESCRIPTIONS_COLLECTION].distinct("doctor_id"))
+        for doctor_id in doctor_ids:
+            if doctor_id:
+                DoctorStats.rebuild(doctor_id)
+        return len(doctor_ids)
+
+    @staticmethod
+    def get(doctor_id):
+        """Point-read a doctor's stats, rebuilding them once if missing."""
+        db = get_db()
+        doctor_id = DoctorStats._oid(doctor_id)
+        stats = db[DOCTOR_STATS_COLLECTION].find_one({"_id": doctor_id})
+        if stats is None:
+            stats = DoctorStats.rebuild(doctor_id)
+        return stats
+
+    @staticmethod
+    def to_dict(stats, rating_summary, month_key=None):
+        """Convert stats and the doctor's ``Rating.summary`` to the dashboard payload."""
+        status_counts = stats.get("status_counts", {})
+        if month_key is None:
+            month_key = datetime.utcnow().strftime("%Y-%m")
+        return {
+            "totalAppointments": stats.get("total", 0),
+            "appointmentsByStatus": {
+                "pending": status_counts.get("pending", 0),
+                "confirmed": status_counts.get("confirmed", 0),
+                "completed": status_counts.get("completed", 0),
+                "cancelled": status_counts.get("cancelled", 0),
+            },
+            "uniquePatients": stats.get("unique_patients", 0),
+            "thisMonthAppointments": stats.get("created_by_month", {}).get(month_key, 0),
+            "rating": rating_summary["average"],
+            "ratingCount": rating_summary["count"],
+            "prescriptionsWritten": stats.get("prescriptions", 0),
+        }
@@ -1,5 +1,6 @@
 from bson import ObjectId
 from ..database import get_db, MEDICAL_RECORDS_COLLECTION
+from ..invalidation import publish, MEDICAL_RECORD_CHANGED
 
 
 class MedicalRecord:
@@ -32,6 +33,19 @@ class MedicalRecord:
             patient_id = ObjectId(patient_id)
         return list(db[MEDICAL_RECORDS_COLLECTION].find({"patient_id": patient_id}))
 
+    @staticmethod
+    def iter_by_patient_id(patient_id, batch_size=100):
+        """Cursor over a patient's records, oldest first, fetched in batches."""
+        db = get_db()
+        if isinstance(patient_id, str):
+            patient_id = ObjectId(patient_id)
+        return (
+            db[MEDICAL_RECORDS_COLLECTION]
+            .find({"patient_id": patient_id})
+            .sort([("date", 1), ("_id", 1)])
+            .batch_size(batch_size)
+        )
+
     @staticmethod
     def find_by_patient_user_id(user_id):
         """Get all records for a patient by their user ID."""
@@ -60,6 +74,7 @@ class MedicalRecord:
         db[MEDICAL_RECORDS_COLLECTION].update_one(
             {"_id": record_id}, {"$set": update_data}
         )
+        publish(MEDICAL_RECORD_CHANGED, record_id=record_id)
         return MedicalRecord.find_by_id(record_id)
 
     @staticmethod
@@ -68,7 +83,9 @@ class MedicalRecord:
         db = get_db()
         if isinstance(record_id, str):
             record_id = ObjectId(record_id)
-        return db[MEDICAL_RECORDS_COLLECTION].delete_one({"_id": record_id})
+        result = db[MEDICAL_RECORDS_COLLECTION].delete_one({"_id": record_id})
+        publish(MEDICAL_RECORD_CHANGED, record_id=record_id)
+        return result
 
     @staticmethod
     def to_dict(record):
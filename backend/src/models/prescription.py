@@ -1,6 +1,8 @@
 from bson import ObjectId
 from datetime import datetime
 from ..database import get_db, PRESCRIPTIONS_COLLECTION
+from .doctor_stats import DoctorStats
+from ..invalidation import publish, PRESCRIPTION_CREATED
 
 
 class Prescription:
@@ -31,6 +33,12 @@ class Prescription:
 
         result = db[PRESCRIPTIONS_COLLECTION].insert_one(prescription_data)
         prescription_data["_id"] = result.inserted_id
+        DoctorStats.record_prescription(prescription_data["doctor_id"])
+        publish(
+            PRESCRIPTION_CREATED,
+            doctor_id=prescription_data["doctor_id"],
+            patient_id=prescription_data["patient_id"],
+        )
         return prescription_data
 
     @staticmethod
@@ -45,6 +53,19 @@ class Prescription:
             .sort("created_at", -1)
         )
 
+    @staticmethod
+    def iter_by_patient_id(patient_id, batch_size=100):
+        """Cursor over a patient's prescriptions, oldest first, fetched in batches."""
+        db = get_db()
+        if isinstance(patient_id, str):
+            patient_id = ObjectId(patient_id)
+        return (
+            db[PRESCRIPTIONS_COLLECTION]
+            .find({"patient_id": patient_id})
+            .sort([("created_at", 1), ("_id", 1)])
+            .batch_size(batch_size)
+        )
+
     @staticmethod
     def find_by_doctor_id(doctor_id):
         """Get all prescriptions by a doctor."""
@@ -73,6 +94,25 @@ class Prescription:
             prescription_id = ObjectId(prescription_id)
         return db[PRESCRIPTIONS_COLLECTION].find_one({"_id": prescription_id})
 
+    @staticmethod
+    def set_ai_summary(prescription_id, text, inputs_hash):
+        """Store the generated summary with the hash of the inputs it was built from."""
+        db = get_db()
+        if isinstance(prescription_id, str):
+            prescription_id = ObjectId(prescription_id)
+        db[PRESCRIPTIONS_COLLECTION].update_one(
+            {"_id": prescription_id},
+            {
+                "$set": {
+                    "ai_summary": {
+                        "text": text,
+                        "inputs_hash": inputs_hash,
+                        "generated_at": datetime.utcnow(),
+                    }
+                }
+            },
+        )
+
     @staticmethod
     def to_dict(prescription, include_names=False):
         """Convert prescription to dictionary."""
@@ -1,10 +1,22 @@
 from bson import ObjectId
 from datetime import datetime
-from ..database import get_db, RATINGS_COLLECTION
+from pymongo import ReturnDocument
+from ..database import get_db, DOCTORS_COLLECTION, RATINGS_COLLECTION
+from ..utils.pagination import encode_keyset_cursor, keyset_after
+from ..invalidation import publish, RATING_CREATED
+
+
+SCORES = (1, 2, 3, 4, 5)
 
 
 class Rating:
-    """Model for patient ratings of doctors."""
+    """Model for patient ratings of doctors.
+
+    Each doctor document carries ``rating_sum``, ``rating_count`` and a
+    ``rating_histogram`` of score counts, incremented when a rating is
+    inserted; ``rating`` (the average) is derived from them. Doctors without
+    these fields are rebuilt from the raw ratings on first use.
+    """
 
     @staticmethod
     def create(patient_id, doctor_id, appointment_id, score, comment=""):
@@ -32,8 +44,100 @@ class Rating:
 
         result = db[RATINGS_COLLECTION].insert_one(rating_data)
         rating_data["_id"] = result.inserted_id
+        Rating._add_to_doctor_aggregates(rating_data["doctor_id"], rating_data["score"])
+        publish(RATING_CREATED, doctor_id=rating_data["doctor_id"])
         return rating_data
 
+    @staticmethod
+    def _average(rating_sum, rating_count):
+        return round(rating_sum / rating_count, 1) if rating_count else 0
+
+    @staticmethod
+    def _add_to_doctor_aggregates(doctor_id, score):
+        """Count one score on the doctor document and refresh the average."""
+        db = get_db()
+        updated = db[DOCTORS_COLLECTION].find_one_and_update(
+            {"_id": doctor_id, "rating_sum": {"$exists": True}},
+            {
+                "$inc": {
+                    "rating_sum": score,
+                    "rating_count": 1,
+                    f"rating_histogram.{score}": 1,
+                }
+            },
+            projection={"rating_sum": 1, "rating_count": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if updated is None:
+            # Legacy doctor without aggregates; the rebuild includes this rating.
+            Rating.rebuild_doctor_aggregates(doctor_id)
+            return
+        count = updated["rating_count"]
+        # Guarded by count so a slower concurrent writer can't overwrite a newer average.
+        db[DOCTORS_COLLECTION].update_one(
+            {"_id": doctor_id, "rating_count": count},
+            {
+                "$set": {
+                    "rating": Rating._average(updated["rating_sum"], count),
+                    "review_count": count,
+                }
+            },
+        )
+
+    @staticmethod
+    def rebuild_doctor_aggregates(doctor_id):
+        """Recompute a doctor's rating aggregates from the raw ratings."""
+        db = get_db()
+        if isinstance(doctor_id, str):
+            doctor_id = ObjectId(doctor_id)
+        histogram = {str(score): 0 for score in SCORES}
+        rating_sum = 0
+        for row in db[RATINGS_COLLECTION].aggregate(
+            [
+                {"$match": {"doctor_id": doctor_id}},
+                {"$group": {"_id": "$score", "count": {"$sum": 1}}},
+            ]
+        ):
+            try:
+                score = int(row["_id"])
+            except (TypeError, ValueError):
+                continue
+            if score in SCORES:
+                histogram[str(score)] += row["count"]
+                rating_sum += score * row["count"]
+        rating_count = sum(histogram.values())
+        aggregates = {
+            "rating_sum": rating_sum,
+            "rating_count": rating_count,
+            "rating_histogram": histogram,
+            "rating": Rating._average(rating_sum, rating_count),
+            "review_count": rating_count,
+        }
+        db[DOCTORS_COLLECTION].update_one({"_id": doctor_id}, {"$set": aggregates})
+        return aggregates
+
+    @staticmethod
+    def rebuild_all_doctor_aggregates():
+        """Recompute rating aggregates for every doctor."""
+        db = get_db()
+        doctor_ids = [doc["_id"] for doc in db[DOCTORS_COLLECTION].find({}, {"_id": 1})]
+        for doctor_id in doctor_ids:
+            Rating.rebuild_doctor_aggregates(doctor_id)
+        return len(doctor_ids)
+
+    @staticmethod
+    def summary(doctor):
+        """Get average, count and score histogram from a doctor document."""
+        if "rating_sum" not in doctor:
+            doctor = Rating.rebuild_doctor_aggregates(doctor["_id"])
+        rating_count = doctor.get("rating_count", 0)
+        histogram = doctor.get("rating_histogram") or {}
+        return {
+            "average": Rating._average(doctor.get("rating_sum", 0), rating_count),
+            "count": rating_count,
+            "histogram": {str(score): histogram.get(str(score), 0) for score in SCORES},
+        }
+
     @staticmethod
     def find_by_doctor_id(doctor_id):
         """Get all ratings for a doctor."""
@@ -44,6 +148,34 @@ class Rating:
             db[RATINGS_COLLECTION].find({"doctor_id": doctor_id}).sort("created_at", -1)
         )
 
+    @staticmethod
+    def find_page_by_doctor_id(doctor_id, limit, after=None, score=None):
+        """Get one page of a doctor's ratings, newest first.
+
+        ``after`` is a decoded keyset cursor ``(created_at, _id)``. Returns the
+        page and the cursor for the next one (None on the last page).
+        """
+        db = get_db()
+        if isinstance(doctor_id, str):
+            doctor_id = ObjectId(doctor_id)
+        query = {"doctor_id": doctor_id}
+        if score is not None:
+            query["score"] = score
+        if after is not None:
+            query.update(keyset_after(*after))
+        ratings = list(
+            db[RATINGS_COLLECTION]
+            .find(query)
+            .sort([("created_at", -1), ("_id", -1)])
+            .limit(limit + 1)
+        )
+        next_cursor = None
+        if len(ratings) > limit:
+            ratings = ratings[:limit]
+            last = ratings[-1]
+            next_cursor = encode_keyset_cursor(last.get("created_at"), last["_id"])
+        return ratings, next_cursor
+
     @staticmethod
     def find_by_appointment_id(appointment_id):
         """Find rating by appointment ID."""
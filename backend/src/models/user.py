@@ -1,7 +1,7 @@
 from bson import ObjectId
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from ..database import get_db, USERS_COLLECTION
+from ..utils.password_hashing import hash_password, needs_rehash, verify_password
 
 class User:
     """User model for authentication."""
@@ -12,7 +12,7 @@ class User:
         db = get_db()
         user_data = {
             'email': email.lower(),
-            'password': generate_password_hash(password),
+            'password': hash_password(password),
             'role': role,
             'created_at': datetime.utcnow()
         }
@@ -37,7 +37,23 @@ class User:
     @staticmethod
     def check_password(user, password):
         """Check if password matches."""
-        return check_password_hash(user['password'], password)
+        return verify_password(user['password'], password)
+    
+    @staticmethod
+    def upgrade_password_hash(user, password):
+        """Rehash a verified password made with outdated hashing parameters.
+
+        Returns True if the stored hash was replaced. The update only applies
+        if the hash has not changed since it was read.
+        """
+        if not needs_rehash(user['password']):
+            return False
+        db = get_db()
+        result = db[USERS_COLLECTION].update_one(
+            {'_id': user['_id'], 'password': user['password']},
+            {'$set': {'password': hash_password(password)}}
+        )
+        return result.modified_count == 1
     
     @staticmethod
     def delete(user_id):
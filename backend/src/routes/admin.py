@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from ..models.doctor import Doctor
@@ -6,10 +6,15 @@ from ..models.patient import Patient
 from ..models.user import User
 from ..database import get_db
 from ..utils.pagination import get_pagination_params
+from ..utils import metrics
+from ..utils.cache import TTLCache, cache_stats
 import json
 
 admin_bp = Blueprint('admin', __name__)
 
+# Expired stats stay servable for a day while a background refresh runs.
+_stats_cache = TTLCache('admin_stats', max_entries=1, stale_seconds=24 * 60 * 60)
+
 
 def get_current_user():
     """Parse JWT identity and return user dict."""
@@ -32,47 +37,75 @@ def require_admin(func):
     return wrapper
 
 
-@admin_bp.route('/stats', methods=['GET'])
-@jwt_required()
-@require_admin
-def get_stats():
-    """Get admin dashboard statistics."""
-    db = get_db()
-    
-    # Count users by role
-    total_patients = db.patients.count_documents({})
-    total_doctors = db.doctors.count_documents({})
-    verified_doctors = db.doctors.count_documents({'verified': True})
-    pending_doctors = db.doctors.count_documents({'verification_status': 'pending'})
-    rejected_doctors = db.doctors.count_documents({'verification_status': 'rejected'})
-    
-    # Count appointments
-    total_appointments = db.appointments.count_documents({})
-    completed_appointments = db.appointments.count_documents({'status': 'completed'})
-    pending_appointments = db.appointments.count_documents({'status': 'pending'})
-    
-    # Count other entities
-    total_prescriptions = db.prescriptions.count_documents({})
-    total_ratings = db.ratings.count_documents({})
-    
-    return jsonify({
+def _compute_stats(db):
+    """Compute admin dashboard counts with one query per collection."""
+    doctor_counts = next(iter(db.doctors.aggregate([
+        {
+            '$group': {
+                '_id': None,
+                'verified': {'$sum': {'$cond': [{'$eq': ['$verified', True]}, 1, 0]}},
+                'pending': {'$sum': {'$cond': [{'$eq': ['$verification_status', 'pending']}, 1, 0]}},
+                'rejected': {'$sum': {'$cond': [{'$eq': ['$verification_status', 'rejected']}, 1, 0]}},
+            }
+        },
+    ])), {})
+
+    appointment_counts = {
+        row['_id']: row['count']
+        for row in db.appointments.aggregate([
+            {'$match': {'status': {'$in': ['completed', 'pending']}}},
+            {'$group': {'_id': '$status', 'count': {'$sum': 1}}},
+        ])
+    }
+
+    # Unfiltered totals come from collection metadata instead of full counts.
+    return {
         'patients': {
-            'total': total_patients
+            'total': db.patients.estimated_document_count()
         },
         'doctors': {
-            'total': total_doctors,
-            'verified': verified_doctors,
-            'pending': pending_doctors,
-            'rejected': rejected_doctors
+            'total': db.doctors.estimated_document_count(),
+            'verified': doctor_counts.get('verified', 0),
+            'pending': doctor_counts.get('pending', 0),
+            'rejected': doctor_counts.get('rejected', 0)
         },
         'appointments': {
-            'total': total_appointments,
-            'completed': completed_appointments,
-            'pending': pending_appointments
+            'total': db.appointments.estimated_document_count(),
+            'completed': appointment_counts.get('completed', 0),
+            'pending': appointment_counts.get('pending', 0)
         },
-        'prescriptions': total_prescriptions,
-        'ratings': total_ratings
-    })
+        'prescriptions': db.prescriptions.estimated_document_count(),
+        'ratings': db.ratings.estimated_document_count()
+    }
+
+
+def _load_stats():
+    with metrics.timer('admin_stats.refresh_seconds'):
+        return _compute_stats(get_db())
+
+
+@admin_bp.route('/stats', methods=['GET'])
+@jwt_required()
+@require_admin
+def get_stats():
+    """Get admin dashboard statistics (stale-while-revalidate cached)."""
+    ttl_seconds = int(current_app.config.get('ADMIN_STATS_CACHE_TTL_SECONDS', 60))
+    return jsonify(_stats_cache.get_or_load('stats', _load_stats, ttl_seconds=ttl_seconds))
+
+
+@admin_bp.route('/metrics', methods=['GET'])
+@jwt_required()
+@require_admin
+def get_metrics():
+    """Get this worker's in-process counters and latency histograms."""
+    snapshot = metrics.snapshot()
+    counters = snapshot['counters']
+    hits = counters.get('chatbot.triage.hits', 0)
+    answered = hits + counters.get('chatbot.triage.misses', 0)
+    snapshot['derived'] = {
+        'chatbot.triage.hit_rate': round(hits / answered, 4) if answered else None,
+    }
+    return jsonify(dict(snapshot, caches=cache_stats()))
 
 
 @admin_bp.route('/doctors', methods=['GET'])
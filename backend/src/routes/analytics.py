@@ -1,40 +1,40 @@
-from flask import Blueprint, jsonify, current_app
+from flask import Blueprint, jsonify, current_app, request
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from ..models.doctor import Doctor
+from ..models.doctor_stats import DoctorStats
 from ..models.rating import Rating
+from ..models.appointment_rollup import AppointmentRollup
 from ..database import get_db, APPOINTMENTS_COLLECTION
+from ..utils import analytics_cache, metrics
+from ..utils.cache import TTLCache
+from ..invalidation import subscribe, APPOINTMENT_CHANGED
 import json
+import logging
 from datetime import datetime, timedelta
 import threading
 from bson import ObjectId
 
 analytics_bp = Blueprint('analytics', __name__)
+logger = logging.getLogger(__name__)
 PUBLIC_STATS_CACHE_TTL_SECONDS = 5 * 60
-_public_stats_cache = {
-    'expires_at': 0.0,
-    'data': None,
-}
-_doctor_cache_lock = threading.Lock()
-_doctor_analytics_cache = {}
-_doctor_chart_cache = {}
-
-
-def _cache_get(cache, key):
-    now_ts = datetime.utcnow().timestamp()
-    with _doctor_cache_lock:
-        entry = cache.get(key)
-        if not entry:
-            return None
-        if now_ts >= entry['expires_at']:
-            cache.pop(key, None)
-            return None
-        return entry['data']
-
-
-def _cache_set(cache, key, data, ttl_seconds):
-    expires_at = datetime.utcnow().timestamp() + max(1, int(ttl_seconds))
-    with _doctor_cache_lock:
-        cache[key] = {'data': data, 'expires_at': expires_at}
+# How long an expired public stats payload may still be served while it refreshes.
+PUBLIC_STATS_STALE_SECONDS = 60 * 60
+DOCTOR_CHART_CACHE_MAX_ENTRIES = 4096
+CHART_RANGE_DAYS = (7, 30, 90, 365)
+_public_stats_cache = TTLCache(
+    'public_stats',
+    max_entries=1,
+    ttl_seconds=PUBLIC_STATS_CACHE_TTL_SECONDS,
+    stale_seconds=PUBLIC_STATS_STALE_SECONDS,
+)
+_doctor_chart_cache = TTLCache('doctor_chart', max_entries=DOCTOR_CHART_CACHE_MAX_ENTRIES)
+
+
+@subscribe(APPOINTMENT_CHANGED)
+def _on_appointment_changed(event):
+    # Chart keys are '<doctor_id>:<range>'; drop every range for the doctor.
+    if event.get('doctor_id'):
+        _doctor_chart_cache.invalidate_prefix(f"{event['doctor_id']}:")
 
 
 def get_current_user():
@@ -80,76 +80,12 @@ def get_doctor_analytics():
     if not doctor:
         return jsonify({'error': 'Doctor profile not found'}), 404
     
-    doctor_id = doctor['_id']
-    cache_ttl = int(current_app.config.get('DOCTOR_ANALYTICS_CACHE_TTL_SECONDS', 60))
-    cache_key = str(doctor_id)
-    cached_payload = _cache_get(_doctor_analytics_cache, cache_key)
-    if cached_payload is not None:
-        return jsonify(cached_payload)
-
-    db = get_db()
-    
-    now = datetime.utcnow()
-    first_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    today = now.strftime('%Y-%m-%d')
-
-    pipeline = [
-        {'$match': {'doctor_id': doctor_id}},
-        {
-            '$group': {
-                '_id': None,
-                'total': {'$sum': 1},
-                'pending': {'$sum': {'$cond': [{'$eq': ['$status', 'pending']}, 1, 0]}},
-                'confirmed': {'$sum': {'$cond': [{'$eq': ['$status', 'confirmed']}, 1, 0]}},
-                'completed': {'$sum': {'$cond': [{'$eq': ['$status', 'completed']}, 1, 0]}},
-                'cancelled': {'$sum': {'$cond': [{'$eq': ['$status', 'cancelled']}, 1, 0]}},
-                'uniquePatients': {'$addToSet': '$patient_id'},
-                'thisMonthAppointments': {
-                    '$sum': {
-                        '$cond': [
-                            {
-                                '$and': [
-                                    {'$gte': ['$created_at', first_of_month]},
-                                    {'$ne': ['$created_at', None]}
-                                ]
-                            },
-                            1,
-                            0
-                        ]
-                    }
-                },
-                'todayAppointments': {
-                    '$sum': {'$cond': [{'$eq': ['$date', today]}, 1, 0]}
-                },
-            }
-        },
-    ]
-
-    agg_result = list(db[APPOINTMENTS_COLLECTION].aggregate(pipeline))
-    stats = agg_result[0] if agg_result else {}
-
-    # Get rating stats
-    rating_stats = Rating.calculate_average(doctor_id)
-    
-    # Get prescriptions count
-    prescriptions_count = db.prescriptions.count_documents({'doctor_id': doctor_id})
-
-    payload = {
-        'totalAppointments': stats.get('total', 0),
-        'appointmentsByStatus': {
-            'pending': stats.get('pending', 0),
-            'confirmed': stats.get('confirmed', 0),
-            'completed': stats.get('completed', 0),
-            'cancelled': stats.get('cancelled', 0)
-        },
-        'uniquePatients': len(stats.get('uniquePatients', [])),
-        'thisMonthAppointments': stats.get('thisMonthAppointments', 0),
-        'todayAppointments': stats.get('todayAppointments', 0),
-        'rating': rating_stats['average'],
-        'ratingCount': rating_stats['count'],
-        'prescriptionsWritten': prescriptions_count
-    }
-    _cache_set(_doctor_analytics_cache, cache_key, payload, cache_ttl)
+    # Single point read of the incrementally maintained counters.
+    stats = DoctorStats.get(doctor['_id'])
+    payload = DoctorStats.to_dict(stats, Rating.summary(doctor))
+    payload['todayAppointments'] = AppointmentRollup.count_for_day(
+        doctor['_id'], datetime.utcnow().strftime('%Y-%m-%d')
+    )
     return jsonify(payload)
 
 
@@ -168,54 +104,75 @@ def get_patient_analytics():
     if role != 'patient':
         return jsonify({'error': 'Only patients can access this endpoint'}), 403
     
-    db = get_db()
     patient_id = user_id
     try:
         patient_oid = ObjectId(patient_id)
     except Exception:
         return jsonify({'error': 'Invalid user id'}), 400
 
-    total_appointments = db.appointments.count_documents({'patient_id': patient_oid})
-    upcoming = db.appointments.count_documents(
-        {'patient_id': patient_oid, 'status': {'$in': ['pending', 'confirmed']}}
-    )
-    completed = db.appointments.count_documents(
-        {'patient_id': patient_oid, 'status': 'completed'}
+    cache_ttl = int(current_app.config.get('PATIENT_ANALYTICS_CACHE_TTL_SECONDS', 3600))
+    payload = analytics_cache.patient_analytics_cache.get_or_load(
+        patient_id, lambda: _build_patient_analytics(patient_oid), ttl_seconds=cache_ttl
     )
+    return jsonify(payload)
 
-    prescriptions_count = db.prescriptions.count_documents({'patient_id': patient_oid})
-    unique_doctors = len(
-        db.appointments.distinct(
-            'doctor_id',
-            {'patient_id': patient_oid, 'status': 'completed'},
-        )
-    )
 
-    next_appointment = None
+def _build_patient_analytics(patient_oid):
+    """Compute the patient dashboard payload."""
+    db = get_db()
+    active_statuses = ['pending', 'confirmed']
     today = datetime.utcnow().strftime('%Y-%m-%d')
-    next_appt_doc = db.appointments.find_one(
+
+    # All appointment statistics in a single pass over the patient's appointments
+    pipeline = [
+        {'$match': {'patient_id': patient_oid}},
         {
-            'patient_id': patient_oid,
-            'status': {'$in': ['pending', 'confirmed']},
-            'date': {'$gte': today},
+            '$facet': {
+                'counts': [
+                    {
+                        '$group': {
+                            '_id': None,
+                            'total': {'$sum': 1},
+                            'upcoming': {'$sum': {'$cond': [{'$in': ['$status', active_statuses]}, 1, 0]}},
+                            'completed': {'$sum': {'$cond': [{'$eq': ['$status', 'completed']}, 1, 0]}},
+                        }
+                    }
+                ],
+                'doctorsVisited': [
+                    {'$match': {'status': 'completed'}},
+                    {'$group': {'_id': '$doctor_id'}},
+                    {'$count': 'count'},
+                ],
+                'nextAppointment': [
+                    {'$match': {'status': {'$in': active_statuses}, 'date': {'$gte': today}}},
+                    {'$sort': {'date': 1, 'time': 1, 'created_at': 1}},
+                    {'$limit': 1},
+                    {'$project': {'_id': 0, 'date': 1, 'time': 1, 'doctor_name': 1}},
+                ],
+            }
         },
-        sort=[('date', 1), ('time', 1), ('created_at', 1)],
-    )
+    ]
+    facets = next(iter(db[APPOINTMENTS_COLLECTION].aggregate(pipeline)), {})
+    counts = (facets.get('counts') or [{}])[0]
+    doctors_visited = (facets.get('doctorsVisited') or [{}])[0]
+    next_appt_doc = (facets.get('nextAppointment') or [None])[0]
+
+    next_appointment = None
     if next_appt_doc:
         next_appointment = {
             'date': next_appt_doc.get('date', ''),
             'time': next_appt_doc.get('time', ''),
             'doctorName': next_appt_doc.get('doctor_name', ''),
         }
-    
-    return jsonify({
-        'totalAppointments': total_appointments,
-        'upcomingAppointments': upcoming,
-        'completedAppointments': completed,
-        'prescriptionsReceived': prescriptions_count,
-        'doctorsVisited': unique_doctors,
+
+    return {
+        'totalAppointments': counts.get('total', 0),
+        'upcomingAppointments': counts.get('upcoming', 0),
+        'completedAppointments': counts.get('completed', 0),
+        'prescriptionsReceived': db.prescriptions.count_documents({'patient_id': patient_oid}),
+        'doctorsVisited': doctors_visited.get('count', 0),
         'nextAppointment': next_appointment
-    })
+    }
 
 
 @analytics_bp.route('/doctor/chart', methods=['GET'])
@@ -237,53 +194,48 @@ def get_doctor_chart_data():
     if not doctor:
         return jsonify({'error': 'Doctor profile not found'}), 404
     
+    range_days = request.args.get('range', 7, type=int)
+    if range_days not in CHART_RANGE_DAYS:
+        allowed = ', '.join(str(days) for days in CHART_RANGE_DAYS)
+        return jsonify({'error': f'Invalid range. Must be one of: {allowed}'}), 400
+
     doctor_id = doctor['_id']
-    cache_ttl = int(current_app.config.get('DOCTOR_ANALYTICS_CACHE_TTL_SECONDS', 60))
-    cache_key = str(doctor_id)
-    cached_payload = _cache_get(_doctor_chart_cache, cache_key)
-    if cached_payload is not None:
-        return jsonify(cached_payload)
+    cache_ttl = int(current_app.config.get('DOCTOR_ANALYTICS_CACHE_TTL_SECONDS', 3600))
+    payload = _doctor_chart_cache.get_or_load(
+        f'{doctor_id}:{range_days}',
+        lambda: _build_doctor_chart(doctor_id, range_days),
+        ttl_seconds=cache_ttl,
+    )
+    return jsonify(payload)
 
-    db = get_db()
-    
-    # Appointments for the last 7 days
+
+def _build_doctor_chart(doctor_id, range_days):
+    """Compute the doctor chart payload for the last ``range_days`` days."""
+    # Ensures stats and daily rollups exist (rebuilt once for legacy data).
+    stats = DoctorStats.get(doctor_id)
+
+    # Appointments per day over the requested range, at most one rollup per day
     today = datetime.utcnow().date()
-    start_date = today - timedelta(days=6)
-    start_str = start_date.strftime('%Y-%m-%d')
-    end_str = today.strftime('%Y-%m-%d')
-
-    chart_pipeline = [
-        {'$match': {'doctor_id': doctor_id, 'date': {'$gte': start_str, '$lte': end_str}}},
-        {'$group': {'_id': '$date', 'appointments': {'$sum': 1}}},
-        {'$sort': {'_id': 1}}
-    ]
-    chart_result = {doc['_id']: doc['appointments'] for doc in db[APPOINTMENTS_COLLECTION].aggregate(chart_pipeline)}
+    start_date = today - timedelta(days=range_days - 1)
+    rollups = AppointmentRollup.find_range(
+        doctor_id, start_date.strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')
+    )
+    chart_result = {rollup['date']: rollup.get('total', 0) for rollup in rollups}
 
     day_names = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
     appointments_data = []
-    for i in range(6, -1, -1):
+    for i in range(range_days - 1, -1, -1):
         day = today - timedelta(days=i)
         day_str = day.strftime('%Y-%m-%d')
-        day_name = day_names[day.weekday()]
+        day_label = day_names[day.weekday()] if range_days == 7 else day.strftime('%b %d')
         appointments_data.append({
-            'day': day_name,
+            'day': day_label,
+            'date': day_str,
             'appointments': chart_result.get(day_str, 0)
         })
 
-    # Status breakdown percentages
-    status_pipeline = [
-        {'$match': {'doctor_id': doctor_id}},
-        {
-            '$group': {
-                '_id': None,
-                'pending': {'$sum': {'$cond': [{'$eq': ['$status', 'pending']}, 1, 0]}},
-                'confirmed': {'$sum': {'$cond': [{'$eq': ['$status', 'confirmed']}, 1, 0]}},
-                'completed': {'$sum': {'$cond': [{'$eq': ['$status', 'completed']}, 1, 0]}},
-            }
-        },
-    ]
-    status_result = list(db[APPOINTMENTS_COLLECTION].aggregate(status_pipeline))
-    status_counts = status_result[0] if status_result else {}
+    # Status breakdown percentages from the maintained counters
+    status_counts = stats.get('status_counts', {})
     total = sum(status_counts.get(k, 0) for k in ('pending', 'confirmed', 'completed'))
 
     def pct(val):
@@ -295,29 +247,15 @@ def get_doctor_chart_data():
         {'name': 'Completed', 'value': pct(status_counts.get('completed', 0)), 'color': '#10B981'},
     ]
     
-    payload = {
+    return {
+        'range': range_days,
         'appointmentsData': appointments_data,
         'statusData': status_data
     }
-    _cache_set(_doctor_chart_cache, cache_key, payload, cache_ttl)
-    return jsonify(payload)
-
 
-@analytics_bp.route('/public-stats', methods=['GET'])
-def get_public_stats():
-    """Get public stats for homepage - no auth required."""
-    now_ts = datetime.utcnow().timestamp()
-    cached_data = _public_stats_cache.get('data')
-    if cached_data is not None and now_ts < float(_public_stats_cache.get('expires_at', 0.0)):
-        response = jsonify(cached_data)
-        response.headers['Cache-Control'] = (
-            f'public, max-age={PUBLIC_STATS_CACHE_TTL_SECONDS}, '
-            f's-maxage={PUBLIC_STATS_CACHE_TTL_SECONDS}, stale-while-revalidate=60'
-        )
-        return response
 
-    db = get_db()
-    
+def _compute_public_stats(db):
+    """Compute the homepage counters from the raw collections."""
     patients_count = db.patients.count_documents({})
     doctors_count = db.doctors.count_documents({'verified': True})
     completed_appointments = db.appointments.count_documents({'status': 'completed'})
@@ -333,16 +271,40 @@ def get_public_stats():
         satisfaction_percent = 0
         average_rating = 0
 
-    payload = {
+    return {
         'activePatients': patients_count,
         'licensedDoctors': doctors_count,
         'completedConsultations': completed_appointments,
         'satisfactionRate': satisfaction_percent,
         'averageRating': average_rating
     }
-    _public_stats_cache['data'] = payload
-    _public_stats_cache['expires_at'] = now_ts + PUBLIC_STATS_CACHE_TTL_SECONDS
 
+
+def _load_public_stats():
+    with metrics.timer('public_stats.refresh_seconds'):
+        return _compute_public_stats(get_db())
+
+
+def prewarm_public_stats(app):
+    """Fill the public stats cache in a background thread at startup."""
+    def _run():
+        try:
+            with app.app_context():
+                _public_stats_cache.get_or_load('public', _load_public_stats)
+        except Exception:
+            logger.exception("Public stats pre-warm failed")
+
+    threading.Thread(target=_run, name='public-stats-prewarm', daemon=True).start()
+
+
+@analytics_bp.route('/public-stats', methods=['GET'])
+def get_public_stats():
+    """Get public stats for homepage - no auth required.
+
+    Only one thread recomputes an expired entry; concurrent requests keep
+    serving the previous payload, or wait for the first one on a cold cache.
+    """
+    payload = _public_stats_cache.get_or_load('public', _load_public_stats)
     response = jsonify(payload)
     response.headers['Cache-Control'] = (
         f'public, max-age={PUBLIC_STATS_CACHE_TTL_SECONDS}, '
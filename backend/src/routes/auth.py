@@ -4,12 +4,13 @@ from ..models.user import User
 from ..models.patient import Patient
 from ..models.doctor import Doctor
 from ..models.notification import Notification
-from ..database import get_db
+from ..database import get_db, AUTH_RATE_LIMITS_COLLECTION
+from ..utils.password_hashing import PasswordHashBusyError
+from ..utils.rate_limit import MongoRateLimiter, TokenBucketLimiter
 import json
 import re
-import time
 import logging
-from collections import defaultdict, deque
+import threading
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -34,7 +35,10 @@ VALID_SPECIALTIES = [
     'Emergency Medicine'
 ]
 
-_RATE_LIMIT_BUCKETS = defaultdict(deque)
+# Built on first use so AUTH_RATE_LIMIT_MAX_BUCKETS is read once.
+_RATE_LIMITER = {"limiter": None}
+_rate_limiter_lock = threading.Lock()
+_SHARED_RATE_LIMITER = MongoRateLimiter(lambda: get_db()[AUTH_RATE_LIMITS_COLLECTION])
 logger = logging.getLogger(__name__)
 
 
@@ -47,47 +51,21 @@ def _get_client_id():
     return request.remote_addr or "unknown"
 
 
-def _prune_rate_limit_buckets(now: float, window_seconds: int, max_buckets: int) -> None:
-    stale_threshold = max(window_seconds * 5, 300)
-    for key in list(_RATE_LIMIT_BUCKETS.keys()):
-        bucket = _RATE_LIMIT_BUCKETS.get(key)
-        if not bucket:
-            _RATE_LIMIT_BUCKETS.pop(key, None)
-            continue
-        while bucket and now - bucket[0] > window_seconds:
-            bucket.popleft()
-        if not bucket or now - bucket[-1] > stale_threshold:
-            _RATE_LIMIT_BUCKETS.pop(key, None)
-
-    if len(_RATE_LIMIT_BUCKETS) <= max_buckets:
-        return
-
-    overflow = len(_RATE_LIMIT_BUCKETS) - max_buckets
-    oldest = sorted(
-        (
-            (key, bucket[-1] if bucket else 0.0)
-            for key, bucket in _RATE_LIMIT_BUCKETS.items()
-        ),
-        key=lambda item: item[1],
-    )
-    for key, _ in oldest[:overflow]:
-        _RATE_LIMIT_BUCKETS.pop(key, None)
-
-
-def _is_rate_limited(
-    bucket_key: str, limit: int, window_seconds: int, max_buckets: int
-) -> bool:
+def _get_rate_limiter():
+    if current_app.config.get("AUTH_RATE_LIMIT_BACKEND", "memory") == "mongo":
+        return _SHARED_RATE_LIMITER
+    with _rate_limiter_lock:
+        if _RATE_LIMITER["limiter"] is None:
+            _RATE_LIMITER["limiter"] = TokenBucketLimiter(
+                current_app.config.get("AUTH_RATE_LIMIT_MAX_BUCKETS", 5000)
+            )
+        return _RATE_LIMITER["limiter"]
+
+
+def _is_rate_limited(bucket_key: str, limit: int, window_seconds: int) -> bool:
     if current_app.testing:
         return False
-    now = time.time()
-    _prune_rate_limit_buckets(now, window_seconds, max_buckets)
-    bucket = _RATE_LIMIT_BUCKETS[bucket_key]
-    while bucket and now - bucket[0] > window_seconds:
-        bucket.popleft()
-    if len(bucket) >= limit:
-        return True
-    bucket.append(now)
-    return False
+    return _get_rate_limiter().hit(bucket_key, limit, window_seconds)
 
 
 def validate_password(password):
@@ -107,13 +85,19 @@ def validate_email(email):
     return re.match(pattern, email) is not None
 
 
+def _busy_response(exc):
+    response = jsonify({'error': 'The server is busy right now. Please try again shortly.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(exc.retry_after)
+    return response
+
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     client_id = _get_client_id()
     window = current_app.config.get("AUTH_RATE_LIMIT_WINDOW_SECONDS", 60)
     limit = current_app.config.get("AUTH_RATE_LIMIT_MAX_LOGIN", 20)
-    max_buckets = current_app.config.get("AUTH_RATE_LIMIT_MAX_BUCKETS", 5000)
-    if _is_rate_limited(f"login:{client_id}", limit, window, max_buckets):
+    if _is_rate_limited(f"login:{client_id}", limit, window):
         return jsonify({'error': 'Too many login attempts. Please try again later.'}), 429
 
     data = request.get_json() or {}
@@ -121,8 +105,15 @@ def login():
     password = data.get('password')
 
     user = User.find_by_email(email)
-    if not user or not User.check_password(user, password):
-        return jsonify({'error': 'Invalid credentials'}), 401
+    try:
+        if not user or not User.check_password(user, password):
+            return jsonify({'error': 'Invalid credentials'}), 401
+    except PasswordHashBusyError as exc:
+        return _busy_response(exc)
+    try:
+        User.upgrade_password_hash(user, password)
+    except Exception:
+        logger.exception("Failed to upgrade password hash for user %s", user['_id'])
 
     # Check if doctor is verified
     if user['role'] == 'doctor':
@@ -160,8 +151,7 @@ def register():
     client_id = _get_client_id()
     window = current_app.config.get("AUTH_RATE_LIMIT_WINDOW_SECONDS", 60)
     limit = current_app.config.get("AUTH_RATE_LIMIT_MAX_REGISTER", 10)
-    max_buckets = current_app.config.get("AUTH_RATE_LIMIT_MAX_BUCKETS", 5000)
-    if _is_rate_limited(f"register:{client_id}", limit, window, max_buckets):
+    if _is_rate_limited(f"register:{client_id}", limit, window):
         return jsonify({'error': 'Too many registration attempts. Please try again later.'}), 429
 
     data = request.get_json() or {}
@@ -266,6 +256,9 @@ def register():
             'id': str(user['_id']),
             'pending_verification': True
         }), 201
+    except PasswordHashBusyError as exc:
+        # Raised while hashing, before the user is inserted.
+        return _busy_response(exc)
     except Exception:
         logger.exception("Failed to register user")
         if user and user.get('_id'):
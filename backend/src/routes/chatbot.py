@@ -1,19 +1,34 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import json
 import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
+from pymongo import ReturnDocument
+
+from ..services.llm_executor import LLMBusyError, LLMTimeoutError
 from ..services.chatbot_service import (
     process_message,
+    stream_message,
     get_chat_history,
     clear_chat_history
 )
 from ..database import get_db, CHATBOT_RATE_LIMITS_COLLECTION
+from ..realtime import format_sse_message
+from ..utils import metrics
 
 chatbot_bp = Blueprint('chatbot', __name__)
 logger = logging.getLogger(__name__)
 
+# Users this worker has seen over the limit, mapped to when their window ends
+# (epoch seconds), so further messages in that window skip the database.
+OVER_LIMIT_MAX_USERS = 10000
+_over_limit_lock = threading.Lock()
+_over_limit_until = OrderedDict()
+
 
 def get_current_user():
     """Parse JWT identity and return user dict."""
@@ -23,28 +38,91 @@ def get_current_user():
     return identity
 
 
+def _known_over_limit(user_id: str, now_ts: float) -> bool:
+    with _over_limit_lock:
+        until = _over_limit_until.get(user_id)
+        if until is None:
+            return False
+        if now_ts < until:
+            return True
+        del _over_limit_until[user_id]
+        return False
+
+
+def _remember_over_limit(user_id: str, until: float) -> None:
+    with _over_limit_lock:
+        _over_limit_until[user_id] = until
+        _over_limit_until.move_to_end(user_id)
+        while len(_over_limit_until) > OVER_LIMIT_MAX_USERS:
+            _over_limit_until.popitem(last=False)
+
+
 def _is_chatbot_rate_limited(user_id: str, limit: int, window_seconds: int) -> bool:
+    """Count a message against the user's fixed window; True once over ``limit``.
+
+    One counter document per (user, window) is incremented atomically, so
+    concurrent requests cannot overshoot the limit, and it expires through
+    the TTL index on ``expires_at``.
+    """
     if limit <= 0:
         return False
 
     if not current_app.config.get('CHATBOT_RATE_LIMIT_USE_DB', True):
         return False
 
-    db = get_db()
-    now = datetime.utcnow()
-    window_start = now - timedelta(seconds=window_seconds)
-    filter_query = {'user_id': user_id, 'created_at': {'$gte': window_start}}
-
-    count = db[CHATBOT_RATE_LIMITS_COLLECTION].count_documents(filter_query)
-    if count >= limit:
+    now_ts = time.time()
+    if _known_over_limit(user_id, now_ts):
+        metrics.increment('chatbot.rate_limit.local_rejections')
         return True
 
-    db[CHATBOT_RATE_LIMITS_COLLECTION].insert_one(
-        {'user_id': user_id, 'created_at': now}
+    window = int(now_ts // window_seconds)
+    window_end = (window + 1) * window_seconds
+    counter = get_db()[CHATBOT_RATE_LIMITS_COLLECTION].find_one_and_update(
+        {'_id': f'{user_id}:{window}'},
+        {
+            '$inc': {'count': 1},
+            '$setOnInsert': {
+                'user_id': user_id,
+                'expires_at': datetime.utcnow() + timedelta(seconds=window_end - now_ts),
+            },
+        },
+        projection={'count': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
     )
+    if counter['count'] > limit:
+        _remember_over_limit(user_id, window_end)
+        return True
     return False
 
 
+def _busy_response(exc):
+    response = jsonify({'error': 'The assistant is busy right now. Please try again shortly.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(exc.retry_after)
+    return response
+
+
+def _accept_message(user_id):
+    """Validate the posted message and apply the rate limit.
+
+    Returns ``(message, None)`` or ``(None, error_response)``.
+    """
+    data = request.get_json() or {}
+    message = data.get('message', '').strip()
+    max_length = int(current_app.config.get('CHATBOT_MAX_MESSAGE_LENGTH', 2000))
+    rate_window = int(current_app.config.get('CHATBOT_RATE_LIMIT_WINDOW_SECONDS', 60))
+    rate_limit = int(current_app.config.get('CHATBOT_RATE_LIMIT_MAX_MESSAGES', 30))
+    
+    if not message:
+        return None, (jsonify({'error': 'Message is required'}), 400)
+    if len(message) > max_length:
+        return None, (jsonify({'error': f'Message too long. Maximum {max_length} characters.'}), 400)
+    if _is_chatbot_rate_limited(user_id, rate_limit, rate_window):
+        return None, (jsonify({'error': 'Too many chatbot requests. Please try again later.'}), 429)
+    return message, None
+
+
 @chatbot_bp.route('/message', methods=['POST'])
 @jwt_required()
 def send_message():
@@ -53,18 +131,9 @@ def send_message():
         current_user = get_current_user()
         user_id = current_user['id']
         
-        data = request.get_json() or {}
-        message = data.get('message', '').strip()
-        max_length = int(current_app.config.get('CHATBOT_MAX_MESSAGE_LENGTH', 2000))
-        rate_window = int(current_app.config.get('CHATBOT_RATE_LIMIT_WINDOW_SECONDS', 60))
-        rate_limit = int(current_app.config.get('CHATBOT_RATE_LIMIT_MAX_MESSAGES', 30))
-        
-        if not message:
-            return jsonify({'error': 'Message is required'}), 400
-        if len(message) > max_length:
-            return jsonify({'error': f'Message too long. Maximum {max_length} characters.'}), 400
-        if _is_chatbot_rate_limited(user_id, rate_limit, rate_window):
-            return jsonify({'error': 'Too many chatbot requests. Please try again later.'}), 429
+        message, error = _accept_message(user_id)
+        if error:
+            return error
         
         # Process message and get AI response
         response = process_message(user_id, message)
@@ -75,6 +144,11 @@ def send_message():
             'success': True
         })
     
+    except LLMBusyError as exc:
+        return _busy_response(exc)
+    except LLMTimeoutError:
+        logger.warning("Chatbot response exceeded its deadline")
+        return jsonify({'error': 'The assistant took too long to respond. Please try again.'}), 504
     except ValueError:
         logger.exception("Chatbot configuration/validation error")
         return jsonify({'error': 'Chatbot service is temporarily unavailable.'}), 503
@@ -83,18 +157,84 @@ def send_message():
         return jsonify({'error': 'Failed to process message. Please try again.'}), 500
 
 
+@chatbot_bp.route('/message/stream', methods=['POST'])
+@jwt_required()
+def stream_chat_message():
+    """Send a message and receive the reply as Server-Sent Events.
+
+    Emits ``token`` events (``{"text": ...}``) as the model produces them,
+    then one ``done`` event with the full response, or an ``error`` event.
+    """
+    try:
+        current_user = get_current_user()
+        user_id = current_user['id']
+
+        message, error = _accept_message(user_id)
+        if error:
+            return error
+
+        chunks = stream_message(user_id, message)
+    except LLMBusyError as exc:
+        return _busy_response(exc)
+    except ValueError:
+        logger.exception("Chatbot configuration/validation error")
+        return jsonify({'error': 'Chatbot service is temporarily unavailable.'}), 503
+    except Exception:
+        logger.exception("Failed to start chatbot stream")
+        return jsonify({'error': 'Failed to process message. Please try again.'}), 500
+
+    def generate():
+        parts = []
+        try:
+            for text in chunks:
+                parts.append(text)
+                yield format_sse_message({'event': 'token', 'data': {'text': text}})
+        except Exception:
+            logger.exception("Chatbot stream failed")
+            yield format_sse_message({
+                'event': 'error',
+                'data': {'error': 'Failed to process message. Please try again.'}
+            })
+            return
+        finally:
+            # Runs the model stream's cleanup now if the client disconnected.
+            chunks.close()
+        yield format_sse_message({
+            'event': 'done',
+            'data': {'message': message, 'response': ''.join(parts), 'success': True}
+        })
+
+    headers = {
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    }
+    return Response(stream_with_context(generate()), headers=headers, mimetype='text/event-stream')
+
+
 @chatbot_bp.route('/history', methods=['GET'])
 @jwt_required()
 def get_history():
-    """Get chat history for the current user."""
+    """Get chat history for the current user, newest page first.
+
+    Query params: limit (messages, default 50), cursor (``nextCursor`` of the
+    previous response) to page back to older messages.
+    """
     try:
         current_user = get_current_user()
         user_id = current_user['id']
-        
-        history = get_chat_history(user_id)
+
+        cursor = request.args.get('cursor')
+        try:
+            limit = min(max(1, int(request.args.get('limit', 50))), 200)
+            before = int(cursor) if cursor else None
+        except ValueError:
+            return jsonify({'error': 'Invalid limit or cursor'}), 400
+
+        history, next_cursor = get_chat_history(user_id, before=before, limit=limit)
         
         return jsonify({
             'history': history,
+            'nextCursor': str(next_cursor) if next_cursor is not None else None,
             'success': True
         })
     
@@ -8,6 +8,7 @@ from ..models.patient import Patient
 from ..models.notification import Notification
 from ..database import get_db, APPOINTMENTS_COLLECTION
 from ..realtime import publish_event
+from ..services.report_service import schedule_prescription_summary
 import json
 from datetime import datetime
 
@@ -107,6 +108,7 @@ def create_prescription():
         diagnosis=diagnosis,
         notes=notes
     )
+    schedule_prescription_summary(prescription['_id'])
     
     # Create notification for patient
     Notification.create(
@@ -292,6 +294,7 @@ def create_prescription_for_patient(patient_id):
         diagnosis=diagnosis,
         notes=notes
     )
+    schedule_prescription_summary(prescription['_id'])
     
     # Create notification for patient
     Notification.create(
@@ -6,12 +6,16 @@ from ..models.appointment import Appointment
 from ..models.doctor import Doctor
 from ..models.patient import Patient
 from ..models.notification import Notification
+from ..utils.pagination import decode_keyset_cursor
 import json
 import logging
 
 ratings_bp = Blueprint('ratings', __name__)
 logger = logging.getLogger(__name__)
 
+REVIEWS_PAGE_SIZE = 20
+REVIEWS_MAX_PAGE_SIZE = 100
+
 
 def get_current_user():
     """Parse JWT identity and return user dict."""
@@ -21,22 +25,39 @@ def get_current_user():
     return identity
 
 
-def _safe_patient_name(patient_id):
-    """Resolve patient name from a rating row without crashing on malformed IDs."""
-    if not patient_id:
-        return 'Anonymous'
-
+def _patient_names(ratings):
+    """Resolve patient names for a page of ratings with one query."""
+    names = {}
     try:
-        patient = Patient.find_by_user_id(str(patient_id))
+        patients = Patient.find_by_user_ids([r.get('patient_id') for r in ratings])
     except Exception:
-        logger.warning("Failed to resolve patient profile for rating patient_id=%r", patient_id)
-        return 'Anonymous'
+        logger.warning("Failed to resolve patient profiles for ratings page")
+        return names
+
+    for patient in patients:
+        full_name = f"{patient.get('firstName', '')} {patient.get('lastName', '')}".strip()
+        if full_name:
+            names[str(patient.get('user_id'))] = full_name
+    return names
 
-    if not patient:
-        return 'Anonymous'
 
-    full_name = f"{patient.get('firstName', '')} {patient.get('lastName', '')}".strip()
-    return full_name or 'Anonymous'
+def _review_page_params():
+    """Parse ?limit=&cursor=&score= for review listings; raises ValueError."""
+    limit = request.args.get('limit', REVIEWS_PAGE_SIZE, type=int)
+    limit = min(max(1, limit), REVIEWS_MAX_PAGE_SIZE)
+
+    cursor = request.args.get('cursor')
+    after = decode_keyset_cursor(cursor) if cursor else None
+
+    score = request.args.get('score')
+    if score is not None:
+        try:
+            score = int(score)
+        except ValueError:
+            raise ValueError('Score must be between 1 and 5')
+        if score < 1 or score > 5:
+            raise ValueError('Score must be between 1 and 5')
+    return limit, after, score
 
 
 def _safe_rating_dict(rating):
@@ -120,13 +141,6 @@ def create_rating():
         # Mark appointment as rated
         Appointment.update(appointment_id, {'rated': True})
         
-        # Update doctor's average rating
-        rating_stats = Rating.calculate_average(appointment['doctor_id'])
-        Doctor.update(appointment['doctor_id'], {
-            'rating': rating_stats['average'],
-            'rating_count': rating_stats['count']
-        })
-        
         # Create notification for doctor
         doctor = Doctor.find_by_id(appointment['doctor_id'])
         if doctor:
@@ -151,20 +165,32 @@ def create_rating():
 
 @ratings_bp.route('/doctor/<doctor_id>', methods=['GET'])
 def get_doctor_ratings(doctor_id):
-    """Get all ratings for a doctor (public endpoint)."""
+    """Get a page of ratings for a doctor (public endpoint).
+
+    Query params: limit, cursor (``nextCursor`` of the previous page), score.
+    """
+    try:
+        limit, after, score = _review_page_params()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
         # Verify doctor exists
         doctor = Doctor.find_by_id(doctor_id)
         if not doctor:
             return jsonify({'error': 'Doctor not found'}), 404
         
-        ratings = Rating.find_by_doctor_id(doctor_id)
-        stats = Rating.calculate_average(doctor_id)
+        ratings, next_cursor = Rating.find_page_by_doctor_id(
+            doctor['_id'], limit, after=after, score=score
+        )
+        stats = Rating.summary(doctor)
         
         return jsonify({
-            'ratings': [Rating.to_dict(r) for r in ratings],
+            'ratings': [_safe_rating_dict(r) for r in ratings],
             'average': stats['average'],
-            'count': stats['count']
+            'count': stats['count'],
+            'histogram': stats['histogram'],
+            'nextCursor': next_cursor
         })
         
     except Exception:
@@ -188,7 +214,15 @@ def check_rating(appointment_id):
 @ratings_bp.route('/my-reviews', methods=['GET'])
 @jwt_required()
 def get_my_reviews():
-    """Get reviews for the logged-in doctor."""
+    """Get a page of reviews for the logged-in doctor.
+
+    Query params: limit, cursor (``nextCursor`` of the previous page), score.
+    """
+    try:
+        limit, after, score = _review_page_params()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
         current_user = get_current_user()
 
@@ -199,20 +233,25 @@ def get_my_reviews():
         if not doctor:
             return jsonify({'error': 'Doctor profile not found'}), 404
 
-        ratings = Rating.find_by_doctor_id(doctor['_id'])
-        stats = Rating.calculate_average(doctor['_id'])
+        ratings, next_cursor = Rating.find_page_by_doctor_id(
+            doctor['_id'], limit, after=after, score=score
+        )
+        stats = Rating.summary(doctor)
 
         # Enrich with patient names; tolerate malformed legacy rows.
+        patient_names = _patient_names(ratings)
         result = []
         for r in ratings:
             rating_dict = _safe_rating_dict(r)
-            rating_dict['patientName'] = _safe_patient_name(r.get('patient_id'))
+            rating_dict['patientName'] = patient_names.get(str(r.get('patient_id')), 'Anonymous')
             result.append(rating_dict)
 
         return jsonify({
             'reviews': result,
             'average': stats['average'],
-            'count': stats['count']
+            'count': stats['count'],
+            'histogram': stats['histogram'],
+            'nextCursor': next_cursor
         })
     except Exception:
         logger.exception("Failed to fetch my reviews")
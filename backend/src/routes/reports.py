@@ -1,19 +1,32 @@
 """API routes for report generation."""
-from flask import Blueprint, jsonify, send_file
+from concurrent.futures import wait as futures_wait
+from datetime import datetime
+from flask import Blueprint, Response, jsonify, request, send_file, stream_with_context, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
+import io
+import itertools
 import json
 import logging
+import zipfile
 
 from ..models.prescription import Prescription
 from ..models.patient import Patient
 from ..models.doctor import Doctor
 from ..models.appointment import Appointment
 from ..models.medical_record import MedicalRecord
-from ..services.report_service import generate_prescription_pdf, generate_medical_record_pdf
+from ..services.report_service import (
+    format_report_date, patient_display_name, schedule_prescription_summary,
+    stored_summary, template_summary
+)
+from ..services.render_pool import render_pdf, submit_bundle_job, submit_job, get_job, job_status
+from ..services import report_cache
 
 reports_bp = Blueprint('reports', __name__)
 logger = logging.getLogger(__name__)
 
+MAX_JOB_WAIT_SECONDS = 30
+HISTORY_BATCH_SIZE = 100
+
 
 def get_current_user():
     """Parse JWT identity and return user dict."""
@@ -23,128 +36,398 @@ def get_current_user():
     return identity
 
 
-@reports_bp.route('/prescription/<prescription_id>', methods=['GET'])
-@jwt_required()
-def generate_prescription_report(prescription_id):
-    """Generate and download a PDF report for a prescription."""
-    current_user = get_current_user()
-    
+def _prescription_report_input(current_user, prescription_id):
+    """Load and authorize a prescription report.
+
+    Returns ``((payload, filename), None)`` or ``(None, error_response)``.
+    """
     # Only patients can generate reports
     if current_user['role'] != 'patient':
-        return jsonify({'error': 'Only patients can generate prescription reports'}), 403
+        return None, (jsonify({'error': 'Only patients can generate prescription reports'}), 403)
     
     # Get prescription
     prescription = Prescription.find_by_id(prescription_id)
     if not prescription:
-        return jsonify({'error': 'Prescription not found'}), 404
+        return None, (jsonify({'error': 'Prescription not found'}), 404)
     
     # Prescriptions store user_id as patient_id (from appointment)
     # Verify ownership by comparing with current user's id
     user_id = current_user['id']
     if str(prescription['patient_id']) != user_id:
-        return jsonify({'error': 'Access denied'}), 403
+        return None, (jsonify({'error': 'Access denied'}), 403)
     
     # Get patient profile for name/email
     patient = Patient.find_by_user_id(user_id)
     if not patient:
-        return jsonify({'error': 'Patient profile not found'}), 404
+        return None, (jsonify({'error': 'Patient profile not found'}), 404)
     
     # Get doctor info
     doctor = Doctor.find_by_id(prescription['doctor_id'])
-    doctor_name = doctor['name'] if doctor else 'Unknown Doctor'
-    doctor_specialty = doctor['specialty'] if doctor else 'General Practice'
     
     # Get appointment date
     appointment = None
     if prescription.get('appointment_id'):
         appointment = Appointment.find_by_id(prescription['appointment_id'])
     appointment_date = appointment.get('date', 'N/A') if appointment else 'N/A'
-    
-    # Patient info
-    patient_name = f"{patient.get('firstName', '')} {patient.get('lastName', '')}".strip() or 'Patient'
-    patient_email = patient.get('email', 'N/A')
-    
-    try:
-        # Generate PDF
-        pdf_buffer = generate_prescription_pdf(
-            prescription=Prescription.to_dict(prescription),
-            patient_name=patient_name,
-            patient_email=patient_email,
-            doctor_name=doctor_name,
-            doctor_specialty=doctor_specialty,
-            appointment_date=appointment_date
-        )
-        
-        # Create filename
-        from datetime import datetime
-        date_str = datetime.now().strftime('%Y%m%d')
-        filename = f"prescription_report_{date_str}.pdf"
-        
-        return send_file(
-            pdf_buffer,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=filename
-        )
-        
-    except Exception:
-        logger.exception("Failed to generate prescription report")
-        return jsonify({'error': 'Failed to generate report. Please try again.'}), 500
 
+    payload = _prescription_payload(prescription, patient, doctor, appointment_date)
+    date_str = datetime.now().strftime('%Y%m%d')
+    return (payload, f"prescription_report_{date_str}.pdf"), None
 
-@reports_bp.route('/medical-record/<record_id>', methods=['GET'])
-@jwt_required()
-def generate_medical_record_report(record_id):
-    """Generate and download a PDF report for a medical record."""
-    current_user = get_current_user()
-    
+
+def _patient_identity(patient):
+    """Return ``(name, email)`` as printed on reports."""
+    return patient_display_name(patient), patient.get('email', 'N/A')
+
+
+def _prescription_payload(prescription, patient, doctor, appointment_date, regenerate=True):
+    patient_name, patient_email = _patient_identity(patient)
+    doctor_name = doctor['name'] if doctor else 'Unknown Doctor'
+    # The AI summary is generated when the prescription is created; until it
+    # is stored (or while it is outdated, e.g. after a rename) the template
+    # text is printed. Single downloads queue a regeneration; history bundles
+    # (``regenerate=False``) would queue one per prescription, so they don't.
+    ai_summary = stored_summary(prescription, patient_name, doctor_name)
+    if ai_summary is None:
+        if regenerate:
+            schedule_prescription_summary(prescription['_id'])
+        ai_summary = template_summary(patient_name, doctor_name)
+    return {
+        'prescription': Prescription.to_dict(prescription),
+        'patient_name': patient_name,
+        'patient_email': patient_email,
+        'doctor_name': doctor_name,
+        'doctor_specialty': doctor['specialty'] if doctor else 'General Practice',
+        'appointment_date': appointment_date,
+        'ai_summary': ai_summary,
+        'report_date': format_report_date(),
+    }
+
+
+def _medical_record_payload(record, patient):
+    patient_name, patient_email = _patient_identity(patient)
+    return {
+        'record': MedicalRecord.to_dict(record),
+        'patient_name': patient_name,
+        'patient_email': patient_email,
+        'doctor_name': record.get('doctor', 'Unknown Doctor').replace('Dr. ', ''),
+        'report_date': format_report_date(),
+    }
+
+
+def _medical_record_report_input(current_user, record_id):
+    """Load and authorize a medical record report.
+
+    Returns ``((payload, filename), None)`` or ``(None, error_response)``.
+    """
     # Only patients can generate reports
     if current_user['role'] != 'patient':
-        return jsonify({'error': 'Only patients can generate medical records'}), 403
+        return None, (jsonify({'error': 'Only patients can generate medical records'}), 403)
     
     user_id = current_user['id']
     
     # Get patient profile first
     patient = Patient.find_by_user_id(user_id)
     if not patient:
-        return jsonify({'error': 'Patient profile not found'}), 404
+        return None, (jsonify({'error': 'Patient profile not found'}), 404)
     
     # Get medical record
     record = MedicalRecord.find_by_id(record_id)
     if not record:
-        return jsonify({'error': 'Medical record not found'}), 404
+        return None, (jsonify({'error': 'Medical record not found'}), 404)
     
     # Verify ownership - compare patient ObjectId
     if str(record.get('patient_id')) != str(patient['_id']):
-        return jsonify({'error': 'Access denied'}), 403
+        return None, (jsonify({'error': 'Access denied'}), 403)
     
-    # Patient info
-    patient_name = f"{patient.get('firstName', '')} {patient.get('lastName', '')}".strip() or 'Patient'
-    patient_email = patient.get('email', 'N/A')
-    doctor_name = record.get('doctor', 'Unknown Doctor').replace('Dr. ', '')
+    payload = _medical_record_payload(record, patient)
+    date_str = datetime.now().strftime('%Y%m%d')
+    record_type = record.get('type', 'record').replace(' ', '_').lower()
+    return (payload, f"medical_record_{record_type}_{date_str}.pdf"), None
+
+
+def _pdf_response(pdf, filename, etag):
+    """Send a PDF (path, open file or bytes) that clients may revalidate with If-None-Match."""
+    response = send_file(
+        io.BytesIO(pdf) if isinstance(pdf, bytes) else pdf,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=filename,
+        etag=etag,
+        conditional=True
+    )
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _cached_report_response(kind, source_id, payload, filename):
+    """Serve a report from the content-addressed cache, rendering it on a miss."""
+    key = report_cache.report_key(kind, source_id, payload)
+    if key in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(key)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    handle = report_cache.open_cached(key)
+    if handle is not None:
+        return _pdf_response(handle, filename, key)
+    # Send the rendered bytes, not the stored file, which another worker may evict.
+    pdf_bytes = render_pdf(kind, payload)
+    report_cache.put(key, pdf_bytes)
+    return _pdf_response(pdf_bytes, filename, key)
+
+
+def _job_accepted(job_id):
+    return jsonify({
+        'jobId': job_id,
+        'status': 'pending',
+        'statusUrl': url_for('reports.get_report_job', job_id=job_id)
+    }), 202
+
+
+@reports_bp.route('/prescription/<prescription_id>', methods=['GET'])
+@jwt_required()
+def generate_prescription_report(prescription_id):
+    """Generate and download a PDF report for a prescription."""
+    report_input, error = _prescription_report_input(get_current_user(), prescription_id)
+    if error:
+        return error
+    payload, filename = report_input
     
     try:
-        # Generate PDF
-        pdf_buffer = generate_medical_record_pdf(
-            record=MedicalRecord.to_dict(record),
-            patient_name=patient_name,
-            patient_email=patient_email,
-            doctor_name=doctor_name
+        return _cached_report_response(
+            'prescription', prescription_id, payload, filename
         )
         
-        # Create filename
-        from datetime import datetime
-        date_str = datetime.now().strftime('%Y%m%d')
-        record_type = record.get('type', 'record').replace(' ', '_').lower()
-        filename = f"medical_record_{record_type}_{date_str}.pdf"
-        
-        return send_file(
-            pdf_buffer,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=filename
-        )
+    except Exception:
+        logger.exception("Failed to generate prescription report")
+        return jsonify({'error': 'Failed to generate report. Please try again.'}), 500
+
+
+@reports_bp.route('/prescription/<prescription_id>/jobs', methods=['POST'])
+@jwt_required()
+def enqueue_prescription_report(prescription_id):
+    """Queue a prescription PDF; poll GET /jobs/<job_id> for the result."""
+    current_user = get_current_user()
+    report_input, error = _prescription_report_input(current_user, prescription_id)
+    if error:
+        return error
+    payload, filename = report_input
+    job_id = submit_job(
+        current_user['id'], 'prescription', payload, filename,
+        cache_key=report_cache.report_key('prescription', prescription_id, payload)
+    )
+    return _job_accepted(job_id)
+
+
+@reports_bp.route('/medical-record/<record_id>', methods=['GET'])
+@jwt_required()
+def generate_medical_record_report(record_id):
+    """Generate and download a PDF report for a medical record."""
+    report_input, error = _medical_record_report_input(get_current_user(), record_id)
+    if error:
+        return error
+    payload, filename = report_input
+    
+    try:
+        return _cached_report_response('medical_record', record_id, payload, filename)
         
     except Exception:
         logger.exception("Failed to generate medical record report")
         return jsonify({'error': 'Failed to generate report. Please try again.'}), 500
+
+
+@reports_bp.route('/medical-record/<record_id>/jobs', methods=['POST'])
+@jwt_required()
+def enqueue_medical_record_report(record_id):
+    """Queue a medical record PDF; poll GET /jobs/<job_id> for the result."""
+    current_user = get_current_user()
+    report_input, error = _medical_record_report_input(current_user, record_id)
+    if error:
+        return error
+    payload, filename = report_input
+    job_id = submit_job(
+        current_user['id'], 'medical_record', payload, filename,
+        cache_key=report_cache.report_key('medical_record', record_id, payload)
+    )
+    return _job_accepted(job_id)
+
+
+@reports_bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_report_job(job_id):
+    """Poll a report job; returns the PDF once it is done.
+
+    ``?wait=<seconds>`` (max 30) holds the request until the job finishes.
+    """
+    current_user = get_current_user()
+    job = get_job(job_id, current_user['id'])
+    if not job:
+        return jsonify({'error': 'Report job not found'}), 404
+
+    wait_seconds = min(max(request.args.get('wait', 0, type=float), 0), MAX_JOB_WAIT_SECONDS)
+    if wait_seconds:
+        futures_wait([job['future']], timeout=wait_seconds)
+
+    status = job_status(job)
+    if status == 'pending':
+        return jsonify({'jobId': job_id, 'status': status}), 202
+    if status == 'failed':
+        logger.error("Report job %s failed", job_id, exc_info=job['future'].exception())
+        return jsonify({
+            'jobId': job_id,
+            'status': status,
+            'error': 'Failed to generate report. Please try again.'
+        }), 500
+    if job['kind'] == 'bundle':
+        response = send_file(
+            job['future'].result(),
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=job['filename'],
+            etag=False,
+        )
+        response.headers['Cache-Control'] = 'private, no-store'
+        return response
+    return _pdf_response(job['future'].result(), job['filename'], job['cache_key'])
+
+
+def _batches(cursor, size):
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _history_documents(patient, user_id):
+    """Yield ``(kind, source_id, payload, filename)`` for a patient's full history.
+
+    Both collections are read through batched cursors, and doctors and
+    appointments are looked up once per batch of prescriptions.
+    """
+    for record in MedicalRecord.iter_by_patient_id(patient['_id'], HISTORY_BATCH_SIZE):
+        record_id = str(record['_id'])
+        record_type = record.get('type', 'record').replace(' ', '_').lower()
+        yield (
+            'medical_record', record_id, _medical_record_payload(record, patient),
+            f"medical_record_{record_type}_{record_id}.pdf"
+        )
+
+    cursor = Prescription.iter_by_patient_id(user_id, HISTORY_BATCH_SIZE)
+    for batch in _batches(cursor, HISTORY_BATCH_SIZE):
+        doctors = {
+            doctor['_id']: doctor
+            for doctor in Doctor.find_by_ids(
+                {p['doctor_id'] for p in batch}, {'name': 1, 'specialty': 1}
+            )
+        }
+        appointment_dates = {
+            appointment['_id']: appointment.get('date', 'N/A')
+            for appointment in Appointment.find_by_ids(
+                {p.get('appointment_id') for p in batch}, {'date': 1}
+            )
+        }
+        for prescription in batch:
+            prescription_id = str(prescription['_id'])
+            payload = _prescription_payload(
+                prescription, patient,
+                doctors.get(prescription['doctor_id']),
+                appointment_dates.get(prescription.get('appointment_id'), 'N/A'),
+                regenerate=False
+            )
+            yield 'prescription', prescription_id, payload, f"prescription_{prescription_id}.pdf"
+
+
+def _bundle_entry_pdf(kind, source_id, payload):
+    """PDF bytes for one bundle entry, reusing a cached single-report render."""
+    handle = report_cache.open_cached(report_cache.report_key(kind, source_id, payload))
+    if handle is not None:
+        with handle:
+            return handle.read()
+    return render_pdf(kind, payload)
+
+
+class _ChunkSink:
+    """Write-only file object that collects bytes for a streaming response."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _stream_zip(documents):
+    """Yield a ZIP archive one rendered PDF at a time."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for kind, source_id, payload, filename in documents:
+            archive.writestr(filename, _bundle_entry_pdf(kind, source_id, payload))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _attachment(body, mimetype, filename):
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
+
+@reports_bp.route('/history', methods=['GET'])
+@jwt_required()
+def download_history_bundle():
+    """Download a patient's medical records and prescriptions.
+
+    ``?format=zip`` streams a ZIP with one PDF per document. ``?format=pdf``
+    (default) queues one PDF with a section per document and returns 202
+    with a job id; poll GET /jobs/<job_id> for the file.
+    """
+    current_user = get_current_user()
+    if current_user['role'] != 'patient':
+        return jsonify({'error': 'Only patients can download their history'}), 403
+
+    bundle_format = request.args.get('format', 'pdf').lower()
+    if bundle_format not in ('pdf', 'zip'):
+        return jsonify({'error': "format must be 'pdf' or 'zip'"}), 400
+
+    patient = Patient.find_by_user_id(current_user['id'])
+    if not patient:
+        return jsonify({'error': 'Patient profile not found'}), 404
+
+    documents = _history_documents(patient, current_user['id'])
+    first = next(documents, None)
+    if first is None:
+        return jsonify({'error': 'No medical records or prescriptions found'}), 404
+    documents = itertools.chain([first], documents)
+    date_str = datetime.now().strftime('%Y%m%d')
+
+    if bundle_format == 'zip':
+        return _attachment(
+            stream_with_context(_stream_zip(documents)),
+            'application/zip', f"medical_history_{date_str}.zip"
+        )
+
+    # One PDF needs every page laid out before the file is complete, so it
+    # is rendered by a job instead of holding the request open.
+    user_id = current_user['id']
+    job_id = submit_bundle_job(
+        user_id,
+        lambda: [(kind, payload) for kind, _, payload, _ in _history_documents(patient, user_id)],
+        f"medical_history_{date_str}.pdf"
+    )
+    return _job_accepted(job_id)
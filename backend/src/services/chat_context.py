@@ -0,0 +1,143 @@
+"""
+Bounded conversation context for the chatbot.
+
+Each prompt carries a rolling summary of older turns plus the newest
+messages verbatim, trimmed to a token budget, so prompt size stays flat as a
+conversation grows. Only the tail of the stored history is read. Once enough
+messages have fallen out of the verbatim window, ``summarize_older_turns``
+folds them into the stored summary; after a turn the same model call is
+queued on the LLM executor in the background.
+"""
+
+import logging
+from typing import List, NamedTuple
+
+from flask import current_app
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from ..models.chat_history import ChatHistory
+from ..utils import metrics
+from . import llm_executor
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a patient and a
+medical assistant chatbot. Merge the previous summary with the new messages into one updated
+summary. Keep symptoms, their duration and severity, doctors or specialties already suggested,
+and open questions. Drop greetings and small talk. Write at most 120 words in the third person."""
+
+
+class ChatContext(NamedTuple):
+    summary: str
+    messages: List[dict]
+    # Messages older than the verbatim window that are not yet summarized.
+    pending: int
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)."""
+    return len(text or "") // 4 + 1
+
+
+def _settings():
+    config = current_app.config
+    return (
+        int(config.get("CHATBOT_CONTEXT_TURNS", 6)) * 2,
+        int(config.get("CHATBOT_SUMMARY_BATCH_MESSAGES", 10)),
+        int(config.get("CHATBOT_CONTEXT_TOKEN_BUDGET", 3000)),
+    )
+
+
+def _unsummarized(window):
+    """Stored messages of a window that the summary does not cover yet."""
+    messages = window["messages"]
+    first_index = window["message_count"] - len(messages)
+    return messages[max(0, window["summary_through"] - first_index):]
+
+
+def build_context(user_id) -> ChatContext:
+    """Summary plus the newest messages that fit the token budget."""
+    verbatim_messages, batch, budget = _settings()
+    window = ChatHistory.get_context_window(user_id, verbatim_messages + batch)
+    if not window:
+        return ChatContext("", [], 0)
+
+    summary = window["summary"]
+    remaining = budget - (estimate_tokens(summary) if summary else 0)
+    kept = []
+    for message in reversed(_unsummarized(window)):
+        cost = estimate_tokens(message.get("content", ""))
+        if cost > remaining:
+            break
+        kept.append(message)
+        remaining -= cost
+    kept.reverse()
+
+    pending = window["message_count"] - verbatim_messages - window["summary_through"]
+    return ChatContext(summary, kept, max(0, pending))
+
+
+def needs_summary(context: ChatContext, new_messages: int = 2) -> bool:
+    """Whether enough messages will have left the verbatim window to summarize."""
+    _, batch, _ = _settings()
+    return context.pending + new_messages >= batch
+
+
+class SummaryJob(NamedTuple):
+    prompt: list
+    # Messages [through, end) are folded into the summary.
+    through: int
+    end: int
+
+
+def prepare_summary(user_id):
+    """The summary prompt for messages that left the verbatim window.
+
+    Returns None when there is not yet a full batch to fold.
+    """
+    verbatim_messages, batch, _ = _settings()
+    state = ChatHistory.get_context_window(user_id, 1)
+    if not state:
+        return None
+    through = state["summary_through"]
+    end = state["message_count"] - verbatim_messages
+    if end - through < batch:
+        return None
+
+    window = ChatHistory.get_context_window(user_id, state["message_count"] - through)
+    first_index = window["message_count"] - len(window["messages"])
+    to_fold = _unsummarized(window)[: max(0, end - max(through, first_index))]
+    if not to_fold:
+        return None
+
+    transcript = "\n".join(
+        f"{message['role'].capitalize()}: {message.get('content', '')}" for message in to_fold
+    )
+    previous = window["summary"] or "(none)"
+    prompt = [
+        SystemMessage(content=SUMMARY_PROMPT),
+        HumanMessage(content=f"Previous summary:\n{previous}\n\nNew messages:\n{transcript}"),
+    ]
+    return SummaryJob(prompt, through, end)
+
+
+def store_summary(user_id, job: SummaryJob, summary: str):
+    """Store a generated summary; None if another worker updated it first."""
+    if not ChatHistory.set_summary(user_id, summary, job.end, job.through):
+        return None
+    metrics.increment("chatbot.summaries_generated")
+    return summary
+
+
+def summarize_older_turns(user_id, llm):
+    """Fold messages that left the verbatim window into the stored summary.
+
+    The model call goes through the LLM executor as ``chat_summary``. Returns
+    the new summary, or None when there is not yet a full batch or another
+    worker updated the summary first.
+    """
+    job = prepare_summary(user_id)
+    if job is None:
+        return None
+    response = llm_executor.call("chat_summary", llm.invoke, job.prompt)
+    return store_summary(user_id, job, response.content)
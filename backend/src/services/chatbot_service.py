@@ -1,59 +1,80 @@
-import os
+import logging
 import time
-import threading
-from functools import lru_cache
+from concurrent.futures import CancelledError
 from flask import current_app
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from ..models.doctor import Doctor
 from ..models.chat_history import ChatHistory
+from ..utils import metrics
+from ..utils.cache import TTLCache
+from ..invalidation import subscribe, DOCTOR_CHANGED, RATING_CREATED
+from . import llm_executor
+from .chat_context import build_context, needs_summary, prepare_summary, store_summary
+from .doctor_index import DIRECTORY_PROJECTION, DoctorIndex, tokenize
+from .llm_providers import ModelSettings, create_llm
+from .triage import triage, format_triage_answer
 
-_doctors_cache_lock = threading.Lock()
-_CHAT_MODEL_CACHE = None
-_DOCTORS_CONTEXT_CACHE = {
-    "value": None,
-    "expires_at": 0.0,
-}
+logger = logging.getLogger(__name__)
 
+RESPONSE_CACHE_MAX_ENTRIES = 2048
+# Expired index may be served for a few minutes while one thread rebuilds it.
+_doctor_index_cache = TTLCache(
+    "chatbot_doctor_index", max_entries=1, stale_seconds=10 * 60
+)
+# First-turn answers keyed by '<directory version>:<normalized message>'.
+_response_cache = TTLCache("chatbot_responses", max_entries=RESPONSE_CACHE_MAX_ENTRIES)
 
-def get_doctors_context():
-    """Get formatted doctors information for the LLM context."""
-    global _DOCTORS_CONTEXT_CACHE
-    now_ts = time.time()
-    ttl_seconds = int(
-        current_app.config.get("CHATBOT_DOCTORS_CONTEXT_CACHE_TTL_SECONDS", 120)
+
+@subscribe(DOCTOR_CHANGED)
+def _on_doctor_changed(event):
+    _doctor_index_cache.invalidate("doctors")
+    # Cached answers recommend doctors from the old directory.
+    _response_cache.invalidate_prefix("")
+
+
+@subscribe(RATING_CREATED)
+def _on_rating_created(event):
+    # Answers stay cached: their keys carry the directory version, which
+    # changes only when a rating rounded to whole stars does.
+    _doctor_index_cache.invalidate("doctors")
+
+
+def _build_doctor_index():
+    return DoctorIndex(Doctor.find_all(projection=DIRECTORY_PROJECTION))
+
+
+def format_doctor(doctor):
+    return (
+        f"- Dr. {doctor['name']}: {doctor['specialty']} specialist, "
+        f"located at {doctor['location']}, rating: {doctor.get('rating', 0)}/5"
     )
 
-    with _doctors_cache_lock:
-        if (
-            _DOCTORS_CONTEXT_CACHE["value"]
-            and now_ts < _DOCTORS_CONTEXT_CACHE["expires_at"]
-        ):
-            return _DOCTORS_CONTEXT_CACHE["value"]
 
-    doctors = Doctor.find_all()
-    if not doctors:
-        return "No doctors available in the system."
+def _doctor_index():
+    ttl_seconds = int(
+        current_app.config.get("CHATBOT_DOCTORS_CONTEXT_CACHE_TTL_SECONDS", 21600)
+    )
+    return _doctor_index_cache.get_or_load(
+        "doctors", _build_doctor_index, ttl_seconds=ttl_seconds
+    )
 
-    doctors_info = []
-    for doc in doctors:
-        doc_dict = Doctor.to_dict(doc)
-        doctors_info.append(
-            f"- Dr. {doc_dict['name']}: {doc_dict['specialty']} specialist, "
-            f"located at {doc_dict['location']}, rating: {doc_dict['rating']}/5"
-        )
 
-    context = "\n".join(doctors_info)
+def get_doctors_context(query=""):
+    """Get the doctors most relevant to ``query``, formatted for the LLM context.
 
-    with _doctors_cache_lock:
-        _DOCTORS_CONTEXT_CACHE["value"] = context
-        _DOCTORS_CONTEXT_CACHE["expires_at"] = now_ts + max(1, ttl_seconds)
-    return context
+    Only the top ``CHATBOT_DOCTORS_TOP_K`` matches from the directory index
+    are included, so the prompt does not grow with the directory.
+    """
+    top_k = int(current_app.config.get("CHATBOT_DOCTORS_TOP_K", 8))
+    doctors = _doctor_index().search(query, top_k)
+    if not doctors:
+        return "No doctors available in the system."
+    return "\n".join(format_doctor(doctor) for doctor in doctors)
 
 
-def get_system_prompt():
-    """Get the system prompt for the chatbot."""
-    doctors_context = get_doctors_context()
+def get_system_prompt(query=""):
+    """Get the system prompt for the chatbot, with doctors relevant to ``query``."""
+    doctors_context = get_doctors_context(query)
 
     return f"""You are a helpful medical assistant chatbot for a healthcare platform. Your role is to:
 
@@ -62,7 +83,7 @@ def get_system_prompt():
 3. Provide helpful health information (but always remind them to consult a doctor)
 4. Be empathetic and supportive
 
-AVAILABLE DOCTORS:
+AVAILABLE DOCTORS (the most relevant matches from our directory):
 {doctors_context}
 
 GUIDELINES:
@@ -70,6 +91,7 @@ GUIDELINES:
 - Always provide the doctor's name, specialty, and location when recommending
 - If symptoms are unclear, ask clarifying questions
 - For emergencies, always advise to call emergency services or go to the nearest hospital
+- If someone mentions suicide or self-harm, respond with care, urge them to contact a local crisis line or emergency services now, and suggest a Psychiatry doctor for ongoing support
 - Never diagnose conditions - only suggest appropriate specialists
 - Be concise but thorough in your responses
 - If symptoms could match multiple specialties, list all relevant options
@@ -77,50 +99,12 @@ GUIDELINES:
 Remember: You are NOT a replacement for professional medical advice. Always encourage patients to book an appointment with the recommended doctor."""
 
 
-@lru_cache(maxsize=1)
-def _create_chat_model_uncached():
-    """Create and configure the Gemini chat model (uncached)."""
-    api_key = current_app.config.get("GOOGLE_API_KEY") or os.environ.get(
-        "GOOGLE_API_KEY"
-    )
-
-    if not api_key:
-        if getattr(current_app, "testing", False):
-            api_key = "test-key"
-        else:
-            raise ValueError(
-                "GOOGLE_API_KEY is not configured. Please set it in environment variables."
-            )
-
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        google_api_key=api_key,
-        temperature=0.7,
-        convert_system_message_to_human=True,
-    )
+CHAT_MODEL_SETTINGS = ModelSettings(temperature=0.7)
 
 
 def create_chat_model():
-    """Get or create the Gemini chat model with caching."""
-    global _CHAT_MODEL_CACHE
-    if _CHAT_MODEL_CACHE is None:
-        _CHAT_MODEL_CACHE = _create_chat_model_uncached()
-    return _CHAT_MODEL_CACHE
-
-    if not api_key:
-        if getattr(current_app, "testing", False):
-            api_key = "test-key"
-        else:
-            raise ValueError(
-                "GOOGLE_API_KEY is not configured. Please set it in environment variables."
-            )
-
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        google_api_key=api_key,
-        temperature=0.7,
-        convert_system_message_to_human=True,
-    )
+    """Get the configured provider's chat model (built once per process)."""
+    return create_llm(CHAT_MODEL_SETTINGS)
 
 
 def build_messages_from_history(history_messages):
@@ -136,33 +120,208 @@ def build_messages_from_history(history_messages):
     return messages
 
 
+def _build_prompt(user_id, user_message, context=None):
+    """Return the LangChain messages for a turn and the context they used.
+
+    The prompt carries the rolling summary and the newest turns within the
+    token budget instead of the whole stored history.
+    """
+    if context is None:
+        context = build_context(user_id)
+
+    system_prompt = get_system_prompt(user_message)
+    if context.summary:
+        system_prompt += f"\n\nEARLIER IN THIS CONVERSATION (summary):\n{context.summary}"
+    messages = [SystemMessage(content=system_prompt)]
+    messages.extend(build_messages_from_history(context.messages))
+    messages.append(HumanMessage(content=user_message))
+    return messages, context
+
+
+def _schedule_summary(user_id, llm):
+    """Queue a rolling-summary update on the LLM executor.
+
+    Skipped while the executor is busy; the backlog is picked up after a
+    later turn.
+    """
+    job = prepare_summary(user_id)
+    if job is None:
+        return None
+    try:
+        future = llm_executor.submit("chat_summary", llm.invoke, job.prompt)
+    except llm_executor.LLMBusyError:
+        metrics.increment("chatbot.summaries_deferred")
+        return None
+    app = current_app._get_current_object()
+
+    def _store(done):
+        try:
+            summary = done.result().content
+            with app.app_context():
+                store_summary(user_id, job, summary)
+        except (Exception, CancelledError):
+            metrics.increment("chatbot.summary_failures")
+            logger.exception("Failed to summarize chat history for %s", user_id)
+
+    future.add_done_callback(_store)
+    return future
+
+
+def _save_turn(user_id, user_message, ai_response, context=None, llm=None):
+    ChatHistory.add_turn(user_id, user_message, ai_response)
+    # Locally answered turns have no model to summarize with; the next LLM
+    # turn picks up the backlog.
+    if llm is not None and needs_summary(context):
+        _schedule_summary(user_id, llm)
+
+
+def _triage_answer(user_message):
+    """Answer a confident routing question locally, or return None for the LLM.
+
+    Hits and misses are counted so the fast-path hit rate can be monitored.
+    """
+    if not current_app.config.get("CHATBOT_TRIAGE_ENABLED", True):
+        return None
+    threshold = float(current_app.config.get("CHATBOT_TRIAGE_THRESHOLD", 0.7))
+    result = triage(user_message)
+    doctors = []
+    if result.specialty and result.confidence >= threshold:
+        top_k = int(current_app.config.get("CHATBOT_DOCTORS_TOP_K", 8))
+        doctors = _doctor_index().search(user_message, min(top_k, 5), specialty=result.specialty)
+    if not doctors:
+        metrics.increment("chatbot.triage.misses")
+        return None
+    metrics.increment("chatbot.triage.hits")
+    return format_triage_answer(result.specialty, [format_doctor(doctor) for doctor in doctors])
+
+
+def _response_cache_key(user_message, context):
+    """Cache key for a stateless first-turn message, or None if not cacheable.
+
+    Case, punctuation, stopwords and plurals are normalized away, and the
+    doctor directory version is part of the key.
+    """
+    if not current_app.config.get("CHATBOT_RESPONSE_CACHE_ENABLED", True):
+        return None
+    if context.summary or context.messages:
+        return None
+    normalized = " ".join(tokenize(user_message))
+    if not normalized:
+        return None
+    return f"{_doctor_index().version}:{normalized}"
+
+
+def _cached_response(cache_key):
+    if cache_key is None:
+        return None
+    answer = _response_cache.get(cache_key)
+    metrics.increment(
+        "chatbot.response_cache.hits" if answer is not None else "chatbot.response_cache.misses"
+    )
+    return answer
+
+
+def _cache_response(cache_key, ai_response):
+    if cache_key is not None and ai_response:
+        ttl_seconds = int(current_app.config.get("CHATBOT_RESPONSE_CACHE_TTL_SECONDS", 3600))
+        _response_cache.set(cache_key, ai_response, ttl_seconds=ttl_seconds)
+
+
 def process_message(user_id, user_message):
     """Process a user message and return AI response."""
+    answer = _triage_answer(user_message)
+    if answer is not None:
+        _save_turn(user_id, user_message, answer)
+        return answer
+
+    context = build_context(user_id)
+    cache_key = _response_cache_key(user_message, context)
+    answer = _cached_response(cache_key)
+    if answer is not None:
+        _save_turn(user_id, user_message, answer)
+        return answer
+
     # Get the chat model
     llm = create_chat_model()
-
-    # Get existing chat history
-    history_messages = ChatHistory.get_messages(user_id)
-
-    # Build the message list
-    messages = [SystemMessage(content=get_system_prompt())]
-    messages.extend(build_messages_from_history(history_messages))
-    messages.append(HumanMessage(content=user_message))
+    messages, context = _build_prompt(user_id, user_message, context)
 
     # Get AI response
-    response = llm.invoke(messages)
+    with metrics.timer("chatbot.response_seconds"):
+        response = llm_executor.call("chatbot", llm.invoke, messages)
     ai_response = response.content
 
     # Store messages in history
-    ChatHistory.add_message(user_id, "user", user_message)
-    ChatHistory.add_message(user_id, "assistant", ai_response)
+    _save_turn(user_id, user_message, ai_response, context, llm)
+    _cache_response(cache_key, ai_response)
 
     return ai_response
 
 
-def get_chat_history(user_id):
-    """Get formatted chat history for a user."""
-    return ChatHistory.get_messages(user_id)
+def _chunk_text(chunk):
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    # Some providers stream a list of content parts.
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part) for part in content
+    )
+
+
+def stream_message(user_id, user_message):
+    """Start answering a user message and return an iterator of text chunks.
+
+    The model and prompt are prepared and the call is admitted to the LLM
+    executor before this returns, so configuration errors and
+    ``LLMBusyError`` surface to the caller. The turn is stored in the chat history
+    once the stream completes; an abandoned or failed stream stores nothing.
+    Time to first token and total response time are recorded as histograms.
+    Confident routing questions and cached first-turn answers are sent as a
+    single chunk without calling the model.
+    """
+    answer = _triage_answer(user_message)
+    if answer is None:
+        context = build_context(user_id)
+        cache_key = _response_cache_key(user_message, context)
+        answer = _cached_response(cache_key)
+    if answer is not None:
+        _save_turn(user_id, user_message, answer)
+        return (text for text in (answer,))
+
+    llm = create_chat_model()
+    messages, context = _build_prompt(user_id, user_message, context)
+    started = time.perf_counter()
+    chunks = llm_executor.stream("chatbot", lambda: llm.stream(messages))
+
+    def _generate():
+        parts = []
+        completed = False
+        try:
+            for chunk in chunks:
+                text = _chunk_text(chunk)
+                if not text:
+                    continue
+                if not parts:
+                    metrics.observe(
+                        "chatbot.time_to_first_token_seconds", time.perf_counter() - started
+                    )
+                parts.append(text)
+                yield text
+            completed = True
+        finally:
+            metrics.observe("chatbot.response_seconds", time.perf_counter() - started)
+            if completed:
+                ai_response = "".join(parts)
+                _save_turn(user_id, user_message, ai_response, context, llm)
+                _cache_response(cache_key, ai_response)
+            else:
+                metrics.increment("chatbot.streams_aborted")
+
+    return _generate()
+
+
+def get_chat_history(user_id, before=None, limit=50):
+    """Get one page of a user's chat history as ``(messages, next_cursor)``."""
+    return ChatHistory.get_page(user_id, before=before, limit=limit)
 
 
 def clear_chat_history(user_id):
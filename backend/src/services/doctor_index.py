@@ -0,0 +1,147 @@
+"""
+In-memory BM25 index over the doctor directory for chatbot retrieval.
+
+Each doctor is indexed by specialty, the symptom keywords of that specialty
+(``symptom_specialties``) and location. ``search`` returns the top-k doctors
+for a message so the chatbot prompt stays the same size however large the
+directory gets. The chatbot service builds the index from a projected
+directory read and caches it until doctors or ratings change.
+"""
+
+import hashlib
+import math
+import re
+from collections import Counter, defaultdict
+from typing import List
+
+from .symptom_specialties import SPECIALTY_SYMPTOMS
+
+DIRECTORY_PROJECTION = {'name': 1, 'specialty': 1, 'location': 1, 'rating': 1}
+
+# Query terms added for a specialty whose symptom phrase appears in a message.
+SPECIALTY_BOOST = 2
+
+_STOPWORDS = frozenset(
+    'a an and are as at be been but by can do does for from have having i im in is it '
+    'its me my of on or so that the this to was what who with you your should see need'.split()
+)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords and with a plural 's' stripped."""
+    tokens = []
+    for token in _TOKEN_RE.findall((text or '').lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _phrase_tokens(phrase):
+    return tuple(tokenize(phrase))
+
+
+_SPECIALTY_PHRASES = {
+    specialty: [tokens for tokens in map(_phrase_tokens, phrases) if tokens]
+    for specialty, phrases in SPECIALTY_SYMPTOMS.items()
+}
+
+
+def _contains(tokens, phrase):
+    width = len(phrase)
+    return any(tuple(tokens[i:i + width]) == phrase for i in range(len(tokens) - width + 1))
+
+
+def matched_specialties(tokens: List[str]) -> Counter:
+    """Count symptom phrases per specialty found in a tokenized message."""
+    matches = Counter()
+    for specialty, phrases in _SPECIALTY_PHRASES.items():
+        hits = sum(1 for phrase in phrases if _contains(tokens, phrase))
+        if hits:
+            matches[specialty] = hits
+    return matches
+
+
+def _version_entry(doctor):
+    # Rounded so most new reviews leave the version unchanged.
+    rating = doctor.get('rating') or 0
+    return (
+        str(doctor.get('_id')),
+        doctor.get('name'),
+        doctor.get('specialty'),
+        doctor.get('location'),
+        round(rating),
+    )
+
+
+class DoctorIndex:
+    """BM25 (k1=1.2, b=0.75) over per-doctor term bags.
+
+    ``version`` is a hash of the indexed directory; it changes when doctors
+    are added or removed, when a name, specialty or location changes, or when
+    a rating rounded to whole stars does.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, doctors):
+        self.doctors = doctors
+        self._postings = defaultdict(list)
+        self._lengths = []
+        for position, doctor in enumerate(doctors):
+            terms = tokenize(doctor.get('specialty', '')) + tokenize(doctor.get('location', ''))
+            for phrase in _SPECIALTY_PHRASES.get(doctor.get('specialty'), []):
+                terms.extend(phrase)
+            for term, frequency in Counter(terms).items():
+                self._postings[term].append((position, frequency))
+            self._lengths.append(len(terms))
+        self._average_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        self.version = hashlib.sha1(
+            repr([_version_entry(doctor) for doctor in doctors]).encode()
+        ).hexdigest()[:16]
+
+    def _idf(self, term):
+        n = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self.doctors) - n + 0.5) / (n + 0.5))
+
+    def search(self, query: str, k: int, specialty: str = None) -> List[dict]:
+        """Return up to ``k`` doctors ranked for ``query``.
+
+        Without any matching term the best-rated doctors are returned,
+        General Practice first. ``specialty`` restricts results to it.
+        """
+        tokens = tokenize(query)
+        weights = Counter(tokens)
+        for matched in matched_specialties(tokens):
+            for term in tokenize(matched):
+                weights[term] += SPECIALTY_BOOST
+
+        scores = defaultdict(float)
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(term)
+            for position, frequency in postings:
+                norm = self.K1 * (1 - self.B + self.B * self._lengths[position] / self._average_length)
+                scores[position] += weight * idf * frequency * (self.K1 + 1) / (frequency + norm)
+
+        if not scores:
+            ranked = sorted(
+                range(len(self.doctors)),
+                key=lambda i: (
+                    self.doctors[i].get('specialty') != 'General Practice',
+                    -(self.doctors[i].get('rating') or 0),
+                ),
+            )
+        else:
+            ranked = sorted(
+                scores, key=lambda i: (-scores[i], -(self.doctors[i].get('rating') or 0))
+            )
+        if specialty is not None:
+            ranked = [i for i in ranked if self.doctors[i].get('specialty') == specialty]
+        return [self.doctors[i] for i in ranked[:k]]
@@ -0,0 +1,194 @@
+"""
+Bounded execution of LLM calls, isolated from the request threads.
+
+Model calls run on a dedicated pool of ``LLM_MAX_CONCURRENCY`` threads (0 runs
+them inline). At most ``LLM_MAX_QUEUE`` further calls may wait for a worker;
+past that ``LLMBusyError`` is raised at once, so routes answer 503 with
+``Retry-After`` instead of parking web threads behind a slow provider. Every
+call has a deadline (``LLM_CALL_TIMEOUT_SECONDS``): the caller stops waiting
+with ``LLMTimeoutError``, a queued call is cancelled and a running stream
+stops at its next chunk. Queue wait and execution time are recorded as
+``llm.queue_wait_seconds.<kind>`` and ``llm.exec_seconds.<kind>``.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from flask import current_app
+
+from ..utils import metrics
+
+_lock = threading.Lock()
+_pool = {"executor": None, "workers": None}
+_pending = {"count": 0}
+_END = object()
+
+
+class LLMBusyError(RuntimeError):
+    """Every worker is busy and the wait queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__("LLM executor is at capacity")
+        self.retry_after = retry_after
+
+
+class LLMTimeoutError(TimeoutError):
+    """The call missed its deadline."""
+
+
+def _settings():
+    config = current_app.config
+    return (
+        int(config.get("LLM_MAX_CONCURRENCY", 4)),
+        int(config.get("LLM_MAX_QUEUE", 16)),
+        float(config.get("LLM_CALL_TIMEOUT_SECONDS", 30)),
+        int(config.get("LLM_RETRY_AFTER_SECONDS", 5)),
+    )
+
+
+def _get_executor(workers):
+    with _lock:
+        if _pool["executor"] is None or _pool["workers"] != workers:
+            if _pool["executor"] is not None:
+                _pool["executor"].shutdown(wait=False)
+            _pool["executor"] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="llm"
+            )
+            _pool["workers"] = workers
+        return _pool["executor"]
+
+
+def _release(_future=None):
+    with _lock:
+        _pending["count"] -= 1
+
+
+def _submit(kind, func, cancelled):
+    """Admit ``func`` to the pool or raise ``LLMBusyError``; returns the future."""
+    workers, max_queue, _, retry_after = _settings()
+    with _lock:
+        if _pending["count"] >= workers + max_queue:
+            metrics.increment(f"llm.rejected.{kind}")
+            raise LLMBusyError(retry_after)
+        _pending["count"] += 1
+    submitted = time.perf_counter()
+
+    def _run():
+        metrics.observe(f"llm.queue_wait_seconds.{kind}", time.perf_counter() - submitted)
+        if cancelled.is_set():
+            raise LLMTimeoutError(f"{kind} call expired in the queue")
+        with metrics.timer(f"llm.exec_seconds.{kind}"):
+            return func()
+
+    try:
+        future = _get_executor(workers).submit(_run)
+    except Exception:
+        _release()
+        raise
+    # Also fires for calls cancelled before they started.
+    future.add_done_callback(_release)
+    return future
+
+
+def _expire(kind, future, cancelled):
+    cancelled.set()
+    future.cancel()
+    metrics.increment(f"llm.timeouts.{kind}")
+    return LLMTimeoutError(f"{kind} call exceeded its deadline")
+
+
+def call(kind, func, *args, timeout=None):
+    """Run ``func(*args)`` on the LLM pool and wait up to ``timeout`` seconds."""
+    workers, _, default_timeout, _ = _settings()
+    if workers <= 0:
+        with metrics.timer(f"llm.exec_seconds.{kind}"):
+            return func(*args)
+    cancelled = threading.Event()
+    future = _submit(kind, lambda: func(*args), cancelled)
+    try:
+        return future.result(timeout=default_timeout if timeout is None else timeout)
+    except FutureTimeoutError:
+        raise _expire(kind, future, cancelled) from None
+
+
+def submit(kind, func, *args, timeout=None):
+    """Admit ``func(*args)`` to the pool and return its future without waiting.
+
+    For background calls. ``LLMBusyError`` is raised at once when the pool
+    is full, and a call still queued after ``timeout`` seconds fails with
+    ``LLMTimeoutError`` instead of running.
+    """
+    workers, _, default_timeout, _ = _settings()
+    if workers <= 0:
+        future = Future()
+        try:
+            with metrics.timer(f"llm.exec_seconds.{kind}"):
+                future.set_result(func(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+    deadline = time.monotonic() + (default_timeout if timeout is None else timeout)
+    cancelled = threading.Event()
+
+    def _run():
+        if time.monotonic() > deadline:
+            metrics.increment(f"llm.timeouts.{kind}")
+            raise LLMTimeoutError(f"{kind} call expired in the queue")
+        return func(*args)
+
+    return _submit(kind, _run, cancelled)
+
+
+def stream(kind, open_stream, timeout=None):
+    """Iterate ``open_stream()`` on the LLM pool and return a generator of its items.
+
+    Admission happens before this returns, so ``LLMBusyError`` reaches the
+    caller before any response is started. Closing the generator early stops
+    the worker at the next chunk.
+    """
+    workers, _, default_timeout, _ = _settings()
+    if workers <= 0:
+        return open_stream()
+    deadline = time.monotonic() + (default_timeout if timeout is None else timeout)
+    cancelled = threading.Event()
+    items = queue.Queue()
+
+    def _produce():
+        source = None
+        try:
+            source = open_stream()
+            for item in source:
+                if cancelled.is_set():
+                    break
+                items.put(item)
+        except BaseException as exc:
+            items.put(exc)
+            raise
+        else:
+            items.put(_END)
+        finally:
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()
+
+    future = _submit(kind, _produce, cancelled)
+
+    def _consume():
+        try:
+            while True:
+                try:
+                    item = items.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    raise _expire(kind, future, cancelled) from None
+                if item is _END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+
+    return _consume()
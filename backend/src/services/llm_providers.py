@@ -0,0 +1,174 @@
+"""
+Chat model providers selected by the ``LLM_PROVIDER`` setting.
+
+Callers describe what they need with ``ModelSettings`` and get a chat model
+from ``create_llm``; every provider returns an object with LangChain's
+``invoke(messages)`` and ``stream(messages)``. ``gemini`` is the production
+provider. ``fake`` answers locally with sampled latency, token streaming and
+injected failures, so the chatbot and report paths can be load-tested without
+network access. Models are built once per provider, settings and config.
+"""
+
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from flask import current_app
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+# name -> (factory(settings, options), config keys passed as ``options``)
+_PROVIDERS = {}
+
+
+class ModelSettings(NamedTuple):
+    temperature: float
+    timeout: Optional[float] = None
+    max_retries: Optional[int] = None
+
+
+def register_provider(name, config_keys=()):
+    """Register ``factory(settings, options)`` as provider ``name``.
+
+    ``options`` holds the listed config keys; a change to any of them builds
+    a new model.
+    """
+    def decorator(factory):
+        _PROVIDERS[name] = (factory, tuple(config_keys))
+        return factory
+    return decorator
+
+
+def create_llm(settings: ModelSettings):
+    """Return the configured provider's chat model for ``settings``."""
+    config = current_app.config
+    name = config.get("LLM_PROVIDER") or "gemini"
+    if name not in _PROVIDERS:
+        raise ValueError(
+            f"Unknown LLM_PROVIDER {name!r}. Expected one of: {', '.join(sorted(_PROVIDERS))}."
+        )
+    options = tuple((key, config.get(key)) for key in _PROVIDERS[name][1])
+    return _cached_llm(name, settings, options)
+
+
+@lru_cache(maxsize=16)
+def _cached_llm(name, settings, options):
+    factory, _ = _PROVIDERS[name]
+    return factory(settings, dict(options))
+
+
+@register_provider("gemini", ("GOOGLE_API_KEY", "LLM_GEMINI_MODEL", "TESTING"))
+def _gemini(settings, options):
+    api_key = options["GOOGLE_API_KEY"] or os.environ.get("GOOGLE_API_KEY")
+    if not api_key:
+        if options["TESTING"]:
+            api_key = "test-key"
+        else:
+            raise ValueError(
+                "GOOGLE_API_KEY is not configured. Please set it in environment variables."
+            )
+
+    extra = {}
+    if settings.timeout is not None:
+        extra["timeout"] = settings.timeout
+    if settings.max_retries is not None:
+        extra["max_retries"] = settings.max_retries
+    return ChatGoogleGenerativeAI(
+        model=options["LLM_GEMINI_MODEL"] or "gemini-2.5-flash",
+        google_api_key=api_key,
+        temperature=settings.temperature,
+        convert_system_message_to_human=True,
+        **extra,
+    )
+
+
+_FILLER = (
+    "please book an appointment with the recommended specialist and keep a note of "
+    "when your symptoms started how often they occur and anything that makes them "
+    "better or worse so the doctor can help you quickly"
+).split()
+
+
+class FakeChatModel:
+    """Local stand-in for a chat model.
+
+    Time to first token is log-normal around ``median_latency`` seconds with
+    shape ``latency_sigma``; each further token takes ``token_delay`` seconds.
+    A call fails with probability ``failure_rate`` (streams fail part-way).
+    Replies depend only on the last message, so identical prompts get
+    identical text.
+    """
+
+    def __init__(self, median_latency=0.6, latency_sigma=0.4, token_delay=0.015,
+                 reply_tokens=60, failure_rate=0.0, seed=0):
+        self.median_latency = median_latency
+        self.latency_sigma = latency_sigma
+        self.token_delay = token_delay
+        self.reply_tokens = max(1, reply_tokens)
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _plan(self):
+        """Sample (first token latency, token index to fail at or None)."""
+        with self._lock:
+            latency = 0.0
+            if self.median_latency > 0:
+                latency = self._random.lognormvariate(
+                    math.log(self.median_latency), self.latency_sigma
+                )
+            fail_at = None
+            if self._random.random() < self.failure_rate:
+                fail_at = self._random.randrange(self.reply_tokens)
+            return latency, fail_at
+
+    def _reply_tokens(self, messages):
+        prompt = messages[-1].content if messages else ""
+        digest = hashlib.sha1(str(prompt).encode()).hexdigest()
+        words = ["Thanks", "for", "the", "details", f"(ref {digest[:8]})."]
+        offset = int(digest[8:12], 16)
+        while len(words) < self.reply_tokens:
+            words.append(_FILLER[(offset + len(words)) % len(_FILLER)])
+        return [word if i == 0 else f" {word}" for i, word in enumerate(words[: self.reply_tokens])]
+
+    def invoke(self, messages, **kwargs):
+        latency, fail_at = self._plan()
+        tokens = self._reply_tokens(messages)
+        time.sleep(latency + self.token_delay * (len(tokens) - 1))
+        if fail_at is not None:
+            raise RuntimeError("Injected fake LLM failure")
+        return AIMessage(content="".join(tokens))
+
+    def stream(self, messages, **kwargs):
+        latency, fail_at = self._plan()
+        time.sleep(latency)
+        for index, token in enumerate(self._reply_tokens(messages)):
+            if index == fail_at:
+                raise RuntimeError("Injected fake LLM failure")
+            if index:
+                time.sleep(self.token_delay)
+            yield AIMessageChunk(content=token)
+
+
+@register_provider("fake", (
+    "LLM_FAKE_LATENCY_MEDIAN_MS", "LLM_FAKE_LATENCY_SIGMA", "LLM_FAKE_TOKEN_DELAY_MS",
+    "LLM_FAKE_REPLY_TOKENS", "LLM_FAKE_FAILURE_RATE", "LLM_FAKE_SEED",
+))
+def _fake(settings, options):
+    def _number(key, default):
+        value = options[key]
+        return default if value is None else float(value)
+
+    return FakeChatModel(
+        median_latency=_number("LLM_FAKE_LATENCY_MEDIAN_MS", 600) / 1000,
+        latency_sigma=_number("LLM_FAKE_LATENCY_SIGMA", 0.4),
+        token_delay=_number("LLM_FAKE_TOKEN_DELAY_MS", 15) / 1000,
+        reply_tokens=int(_number("LLM_FAKE_REPLY_TOKENS", 60)),
+        failure_rate=_number("LLM_FAKE_FAILURE_RATE", 0.0),
+        seed=int(_number("LLM_FAKE_SEED", 0)),
+    )
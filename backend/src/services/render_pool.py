@@ -0,0 +1,203 @@
+"""
+Report rendering off the request threads.
+
+ReportLab rendering is CPU-bound pure Python and holds the GIL, so PDFs are
+built in a small process pool (``REPORTS_RENDER_WORKERS``; 0 renders inline).
+Async jobs are driven from a job thread and render through the same pool;
+results are kept for ``REPORTS_JOB_TTL_SECONDS`` (in memory, or as a temporary
+file for history bundles).
+"""
+
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+
+from . import report_cache
+from .report_service import render_bundle, render_report
+from ..utils import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_JOBS = 500
+JOB_THREADS = 4
+
+_lock = threading.Lock()
+_pool = {"executor": None, "workers": None}
+_job_runner = {"executor": None}
+_jobs = OrderedDict()
+
+
+def _get_pool(workers):
+    with _lock:
+        if _pool["executor"] is None or _pool["workers"] != workers:
+            if _pool["executor"] is not None:
+                _pool["executor"].shutdown(wait=False)
+            # spawn: forking a threaded server with an open Mongo client is unsafe.
+            _pool["executor"] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool["workers"] = workers
+        return _pool["executor"]
+
+
+def _reset_pool(executor):
+    with _lock:
+        if _pool["executor"] is executor:
+            _pool["executor"] = None
+    executor.shutdown(wait=False)
+
+
+def _run_rendering(app, metric, timeout, func, *args):
+    workers = int(app.config.get("REPORTS_RENDER_WORKERS", 2))
+    with metrics.timer(metric):
+        if workers <= 0:
+            return func(*args)
+        executor = _get_pool(workers)
+        try:
+            return executor.submit(func, *args).result(timeout=timeout)
+        except BrokenProcessPool:
+            # A crashed worker poisons the pool; start a fresh one next time.
+            _reset_pool(executor)
+            raise
+
+
+def render_pdf(kind, payload, app=None):
+    """Render a report to PDF bytes in the process pool and wait for it."""
+    app = app or current_app._get_current_object()
+    timeout = float(app.config.get("REPORTS_RENDER_TIMEOUT_SECONDS", 30))
+    return _run_rendering(
+        app, f"reports.render_seconds.{kind}", timeout, render_report, kind, payload
+    )
+
+
+def render_bundle_file(documents, path, app=None):
+    """Render ``(kind, payload)`` documents into one PDF file at ``path``.
+
+    The worker writes the file directly so large bundles never cross the
+    process boundary as one bytes object.
+    """
+    app = app or current_app._get_current_object()
+    timeout = float(app.config.get("REPORTS_BUNDLE_TIMEOUT_SECONDS", 300))
+    return _run_rendering(
+        app, "reports.render_seconds.bundle", timeout, render_bundle, documents, path
+    )
+
+
+def _get_job_runner():
+    with _lock:
+        if _job_runner["executor"] is None:
+            _job_runner["executor"] = ThreadPoolExecutor(
+                max_workers=JOB_THREADS, thread_name_prefix="report-job"
+            )
+        return _job_runner["executor"]
+
+
+def _discard_job(job):
+    """Delete a finished bundle job's file."""
+    future = job["future"]
+    if job["kind"] == "bundle" and future.done() and future.exception() is None:
+        try:
+            os.remove(future.result())
+        except FileNotFoundError:
+            pass
+
+
+def _prune_jobs(now_ts, ttl_seconds):
+    """Drop finished jobs past their TTL and the oldest beyond the cap."""
+    for job_id in list(_jobs):
+        job = _jobs[job_id]
+        if job["future"].done() and now_ts - job["created_at"] > ttl_seconds:
+            _discard_job(_jobs.pop(job_id))
+    while len(_jobs) > MAX_TRACKED_JOBS:
+        _discard_job(_jobs.popitem(last=False)[1])
+
+
+def _track_job(app, user_id, kind, filename, cache_key, future):
+    ttl_seconds = int(app.config.get("REPORTS_JOB_TTL_SECONDS", 600))
+    job_id = uuid.uuid4().hex
+    now_ts = time.monotonic()
+    with _lock:
+        _prune_jobs(now_ts, ttl_seconds)
+        _jobs[job_id] = {
+            "user_id": str(user_id),
+            "kind": kind,
+            "filename": filename,
+            "cache_key": cache_key,
+            "future": future,
+            "created_at": now_ts,
+        }
+    metrics.increment(f"reports.jobs_submitted.{kind}")
+    return job_id
+
+
+def submit_job(user_id, kind, payload, filename, cache_key=None):
+    """Queue a report render and return its job id.
+
+    With a ``cache_key`` the report cache is consulted first and filled
+    afterwards.
+    """
+    app = current_app._get_current_object()
+
+    def _run():
+        with app.app_context():
+            if cache_key:
+                handle = report_cache.open_cached(cache_key)
+                if handle is not None:
+                    with handle:
+                        return handle.read()
+            pdf_bytes = render_pdf(kind, payload, app=app)
+            if cache_key:
+                report_cache.put(cache_key, pdf_bytes)
+            return pdf_bytes
+
+    return _track_job(app, user_id, kind, filename, cache_key, _get_job_runner().submit(_run))
+
+
+def submit_bundle_job(user_id, load_documents, filename):
+    """Queue a combined PDF of several documents and return its job id.
+
+    ``load_documents()`` runs on the job thread inside an app context and
+    returns the ``(kind, payload)`` list. The job's result is the path of a
+    temporary file, deleted when the job is pruned.
+    """
+    app = current_app._get_current_object()
+
+    def _run():
+        with app.app_context():
+            documents = load_documents()
+        fd, path = tempfile.mkstemp(prefix="history-", suffix=".pdf")
+        os.close(fd)
+        try:
+            render_bundle_file(documents, path, app=app)
+        except Exception:
+            os.remove(path)
+            raise
+        return path
+
+    return _track_job(app, user_id, "bundle", filename, None, _get_job_runner().submit(_run))
+
+
+def get_job(job_id, user_id):
+    """Return a job owned by user_id, or None."""
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None or job["user_id"] != str(user_id):
+        return None
+    return job
+
+
+def job_status(job):
+    """Return 'pending', 'done' or 'failed' for a job."""
+    future = job["future"]
+    if not future.done():
+        return "pending"
+    return "failed" if future.exception() is not None else "done"
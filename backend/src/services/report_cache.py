@@ -0,0 +1,157 @@
+"""
+Content-addressed on-disk cache for rendered report PDFs.
+
+A report's key is ``<source_id>-<sha256 of its render inputs>``, so any change
+to the prescription/record, patient, doctor or date strings (including the
+printed report date) yields a new key and a stale PDF is never served. Files
+live in ``REPORTS_CACHE_DIR`` and are evicted least-recently-used (by mtime,
+touched on every hit) once the directory exceeds ``REPORTS_CACHE_MAX_BYTES``.
+The directory is re-scanned on every store, so several workers may share it.
+Edits to a source document also delete its files eagerly via the invalidation
+bus.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from flask import current_app, has_app_context
+
+from ..invalidation import subscribe, MEDICAL_RECORD_CHANGED
+from ..utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bump when the report layout changes so previously rendered PDFs are not reused.
+RENDER_VERSION = "2"
+
+_lock = threading.Lock()
+
+
+def _cache_dir():
+    directory = current_app.config.get("REPORTS_CACHE_DIR") or os.path.join(
+        tempfile.gettempdir(), "medicare-report-cache"
+    )
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _max_bytes():
+    return int(current_app.config.get("REPORTS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+def _path(directory, key):
+    return os.path.join(directory, f"{key}.pdf")
+
+
+def _entries(directory):
+    """List (path, size, mtime) for cached PDFs."""
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith(".pdf"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((path, stat.st_size, stat.st_mtime))
+    return entries
+
+
+def report_key(kind, source_id, payload):
+    """Derive the cache key (also used as the ETag) for a report's inputs."""
+    canonical = json.dumps(
+        {"version": RENDER_VERSION, "kind": kind, "payload": payload},
+        sort_keys=True,
+        default=str,
+    )
+    digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    return f"{source_id}-{digest}"
+
+
+def get(key):
+    """Return the path of a cached PDF (marking it recently used), or None."""
+    path = _path(_cache_dir(), key)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        metrics.increment("reports.cache_misses")
+        return None
+    metrics.increment("reports.cache_hits")
+    return path
+
+
+def open_cached(key):
+    """Open a cached PDF for reading (marking it recently used), or return None.
+
+    The handle stays readable even if the file is evicted before it is sent.
+    """
+    path = _path(_cache_dir(), key)
+    try:
+        handle = open(path, "rb")
+    except FileNotFoundError:
+        metrics.increment("reports.cache_misses")
+        return None
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    metrics.increment("reports.cache_hits")
+    return handle
+
+
+def put(key, pdf_bytes):
+    """Store a rendered PDF and evict least recently used files over the limit."""
+    directory = _cache_dir()
+    path = _path(directory, key)
+    # Write-then-rename so concurrent readers never see a partial file.
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as handle:
+        handle.write(pdf_bytes)
+    with _lock:
+        os.replace(tmp_path, path)
+        _evict(directory, _max_bytes(), keep=path)
+    return path
+
+
+def _evict(directory, max_bytes, keep=None):
+    # Scanned rather than tracked in memory: other workers write here too.
+    entries = _entries(directory)
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        return
+    entries.sort(key=lambda entry: entry[2])
+    for path, size, _ in entries:
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        metrics.increment("reports.cache_evictions")
+
+
+def invalidate_source(source_id):
+    """Delete every cached PDF rendered from one source document."""
+    directory = _cache_dir()
+    prefix = f"{source_id}-"
+    with _lock:
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name.endswith(".pdf"):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+
+@subscribe(MEDICAL_RECORD_CHANGED)
+def _on_medical_record_changed(event):
+    if event.get("record_id") and has_app_context():
+        invalidate_source(event["record_id"])
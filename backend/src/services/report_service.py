@@ -1,55 +1,105 @@
 """Report generation service using LangChain and ReportLab."""
-import os
+import copy
+import hashlib
+import json
+import logging
 import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from typing import Any, NamedTuple
 from flask import current_app
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
-from langchain_google_genai import ChatGoogleGenerativeAI
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable, PageBreak
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
 from langchain_core.messages import HumanMessage, SystemMessage
 
+from ..models.doctor import Doctor
+from ..models.patient import Patient
+from ..models.prescription import Prescription
+from ..utils import metrics
+from . import llm_executor
+from .llm_providers import ModelSettings, create_llm
+
+
+logger = logging.getLogger(__name__)
+
+_summary_lock = threading.Lock()
+_summary_runner = {"executor": None}
+# Prescription ids with a summary job queued or running.
+_summaries_pending = set()
+
 
 def get_llm():
-    """Create and configure the Gemini chat model."""
-    api_key = current_app.config.get('GOOGLE_API_KEY') or os.environ.get('GOOGLE_API_KEY')
-    
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY is not configured.")
-    
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        google_api_key=api_key,
+    """Return the shared chat model used for report summaries.
+
+    The model comes from the configured provider, built once per process with
+    ``REPORTS_LLM_TIMEOUT_SECONDS`` and ``REPORTS_LLM_MAX_RETRIES`` applied.
+    """
+    return create_llm(ModelSettings(
         temperature=0.3,
-        convert_system_message_to_human=True
+        timeout=float(current_app.config.get('REPORTS_LLM_TIMEOUT_SECONDS', 20)),
+        max_retries=int(current_app.config.get('REPORTS_LLM_MAX_RETRIES', 1)),
+    ))
+
+
+def template_summary(patient_name: str, doctor_name: str) -> str:
+    """The summary used when AI summaries are disabled."""
+    return (
+        f"This prescription was issued by Dr. {doctor_name} for {patient_name}. "
+        "Please follow medication and follow-up instructions exactly as prescribed."
     )
 
 
-def generate_ai_summary(prescription_data: dict, patient_name: str, doctor_name: str) -> str:
-    """Use LangChain to generate an AI-enhanced summary of the prescription."""
-    if not current_app.config.get("REPORTS_ENABLE_AI_SUMMARY", False):
-        return (
-            f"This prescription was issued by Dr. {doctor_name} for {patient_name}. "
-            "Please follow medication and follow-up instructions exactly as prescribed."
-        )
+def format_report_date(when: datetime = None) -> str:
+    """The report date as printed on PDFs; part of the render inputs."""
+    return (when or datetime.now()).strftime('%B %d, %Y')
 
-    try:
-        llm = get_llm()
-        
-        medications_text = "\n".join([
-            f"- {med['name']}: {med['dosage']}, {med.get('frequency', 'as directed')}, for {med.get('duration', 'as prescribed')}"
-            for med in prescription_data.get('medications', [])
-        ])
-        
-        system_prompt = """You are a medical report assistant. Generate a brief, professional summary paragraph 
+
+def patient_display_name(patient: dict) -> str:
+    """A patient's name as printed on reports."""
+    return f"{patient.get('firstName', '')} {patient.get('lastName', '')}".strip() or 'Patient'
+
+
+def summary_inputs_hash(prescription_data: dict, patient_name: str, doctor_name: str) -> str:
+    """Hash of everything a prescription summary is generated from."""
+    inputs = {
+        'diagnosis': prescription_data.get('diagnosis', ''),
+        'medications': prescription_data.get('medications', []),
+        'notes': prescription_data.get('notes', ''),
+        'patient_name': patient_name,
+        'doctor_name': doctor_name,
+    }
+    canonical = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def stored_summary(prescription: dict, patient_name: str, doctor_name: str):
+    """Return the persisted AI summary if it matches the current inputs, else None."""
+    stored = prescription.get('ai_summary') or {}
+    if stored.get('inputs_hash') != summary_inputs_hash(prescription, patient_name, doctor_name):
+        return None
+    return stored.get('text')
+
+
+def _invoke_summary_llm(prescription_data: dict, patient_name: str, doctor_name: str) -> str:
+    llm = get_llm()
+    
+    medications_text = "\n".join([
+        f"- {med['name']}: {med['dosage']}, {med.get('frequency', 'as directed')}, for {med.get('duration', 'as prescribed')}"
+        for med in prescription_data.get('medications', [])
+    ])
+    
+    system_prompt = """You are a medical report assistant. Generate a brief, professional summary paragraph 
 for a patient's medical report based on the prescription details provided. 
 The summary should be clear, reassuring, and easy to understand for the patient.
 Keep it concise (2-3 sentences max). Do not include any medical advice beyond what's in the prescription."""
 
-        user_prompt = f"""
+    user_prompt = f"""
 Patient: {patient_name}
 Doctor: {doctor_name}
 Diagnosis: {prescription_data.get('diagnosis', 'General consultation')}
@@ -59,368 +109,414 @@ Doctor's notes: {prescription_data.get('notes', 'No additional notes')}
 
 Generate a brief professional summary for this prescription report.
 """
-        
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ]
-        
-        response = llm.invoke(messages)
-        return response.content
-        
+    
+    messages = [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=user_prompt)
+    ]
+    
+    response = llm_executor.call("report_summary", llm.invoke, messages)
+    return response.content
+
+
+def refresh_prescription_summary(prescription_id):
+    """Generate and store a prescription's AI summary unless the stored one is current.
+
+    Returns the summary text, or None if the prescription is gone or the
+    model call failed (downloads then keep using the template).
+    """
+    prescription = Prescription.find_by_id(prescription_id)
+    if not prescription:
+        return None
+    patient = Patient.find_by_user_id(prescription['patient_id'])
+    doctor = Doctor.find_by_id(prescription['doctor_id'])
+    patient_name = patient_display_name(patient) if patient else 'Patient'
+    doctor_name = doctor['name'] if doctor else 'Unknown Doctor'
+
+    text = stored_summary(prescription, patient_name, doctor_name)
+    if text is not None:
+        return text
+    try:
+        with metrics.timer('reports.ai_summary_seconds'):
+            text = _invoke_summary_llm(prescription, patient_name, doctor_name)
     except Exception:
-        # Fallback to a simple summary if AI fails
-        return f"This prescription was issued for {prescription_data.get('diagnosis', 'your medical condition')}. Please follow the medication instructions as directed by your doctor."
+        metrics.increment('reports.ai_summary_failures')
+        logger.exception("AI summary generation failed for prescription %s", prescription_id)
+        return None
+    Prescription.set_ai_summary(
+        prescription['_id'], text, summary_inputs_hash(prescription, patient_name, doctor_name)
+    )
+    return text
 
 
-def generate_prescription_pdf(
-    prescription: dict,
-    patient_name: str,
-    patient_email: str,
-    doctor_name: str,
-    doctor_specialty: str,
-    appointment_date: str
-) -> io.BytesIO:
-    """Generate a PDF report for a prescription."""
-    
-    buffer = io.BytesIO()
+def _get_summary_runner(app):
+    with _summary_lock:
+        if _summary_runner["executor"] is None:
+            _summary_runner["executor"] = ThreadPoolExecutor(
+                max_workers=int(app.config.get('REPORTS_SUMMARY_WORKERS', 2)),
+                thread_name_prefix="ai-summary"
+            )
+        return _summary_runner["executor"]
+
+
+def schedule_prescription_summary(prescription_id):
+    """Generate a prescription's AI summary off the request thread.
+
+    Returns the Future, or None when AI summaries are disabled, a job for
+    the prescription is already queued, or ``REPORTS_SUMMARY_MAX_PENDING``
+    jobs are (a later download or the CLI command retries).
+    """
+    if not current_app.config.get("REPORTS_ENABLE_AI_SUMMARY", False):
+        return None
+    app = current_app._get_current_object()
+    max_pending = int(app.config.get("REPORTS_SUMMARY_MAX_PENDING", 32))
+    pending_key = str(prescription_id)
+    with _summary_lock:
+        if pending_key in _summaries_pending:
+            return None
+        if len(_summaries_pending) >= max_pending:
+            metrics.increment("reports.ai_summary_deferred")
+            return None
+        _summaries_pending.add(pending_key)
+
+    def _run():
+        try:
+            with app.app_context():
+                return refresh_prescription_summary(prescription_id)
+        finally:
+            with _summary_lock:
+                _summaries_pending.discard(pending_key)
+
+    return _get_summary_runner(app).submit(_run)
+
+
+# ---------------------------------------------------------------------------
+# Report templates
+#
+# Styles, table styles and the static flowables are built once per process by
+# ``_template()``. Each report is declared as a list of ``Section`` specs and
+# laid out by ``_render_report``.
+# ---------------------------------------------------------------------------
+
+BRAND_BLUE = colors.HexColor('#1e40af')
+HEADING_BLUE = colors.HexColor('#1e3a5f')
+LABEL_GREY = colors.HexColor('#374151')
+PANEL_BACKGROUND = colors.HexColor('#f8fafc')
+BORDER_GREY = colors.HexColor('#e2e8f0')
+
+INFO_GRID_WIDTHS = [1.3*inch, 2.2*inch, 1.3*inch, 2.2*inch]
+LABEL_VALUE_WIDTHS = [1.3*inch, 5.7*inch]
+MEDICATION_WIDTHS = [1.4*inch, 1*inch, 1.2*inch, 1*inch, 2.2*inch]
+
+PRESCRIPTION_DISCLAIMER = """
+    <b>Disclaimer:</b> This report is generated based on your consultation and prescription details. 
+    It is for informational purposes only. Always follow your doctor's instructions and consult 
+    them if you have any questions or concerns about your treatment. This report was generated 
+    with AI-assisted technology.
+    """
+
+MEDICAL_RECORD_DISCLAIMER = """
+    <b>Disclaimer:</b> This report is generated based on your medical records. 
+    It is for informational purposes only. Please consult your doctor if you have 
+    any questions about your medical history.
+    """
+
+
+class Section(NamedTuple):
+    """One titled block of a report.
+
+    ``kind`` is ``'text'`` (``content`` is a string), ``'table'`` (``content``
+    is a list of rows laid out with the named ``table`` style and
+    ``col_widths``) or ``'empty'`` (nothing is rendered).
+    """
+    heading: str
+    kind: str
+    content: Any
+    space_after: float = 10
+    table: str = None
+    col_widths: list = None
+
+
+class _ReportTemplate:
+    """Styles and static flowables shared by every report in this process."""
+
+    def __init__(self):
+        styles = getSampleStyleSheet()
+        self.title = ParagraphStyle(
+            'CustomTitle', parent=styles['Heading1'], fontSize=22,
+            alignment=TA_CENTER, spaceAfter=6, textColor=BRAND_BLUE
+        )
+        self.subtitle = ParagraphStyle(
+            'Subtitle', parent=styles['Normal'], fontSize=10,
+            alignment=TA_CENTER, textColor=colors.gray, spaceAfter=20
+        )
+        self.section_header = ParagraphStyle(
+            'SectionHeader', parent=styles['Heading2'], fontSize=14,
+            textColor=HEADING_BLUE, spaceBefore=15, spaceAfter=10, borderPadding=5
+        )
+        self.body = ParagraphStyle(
+            'BodyText', parent=styles['Normal'], fontSize=11,
+            alignment=TA_JUSTIFY, spaceAfter=8, leading=14
+        )
+        self.small = ParagraphStyle(
+            'SmallText', parent=styles['Normal'], fontSize=9,
+            textColor=colors.gray, alignment=TA_CENTER
+        )
+
+        panel = [
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('TEXTCOLOR', (0, 0), (0, -1), LABEL_GREY),
+            ('BACKGROUND', (0, 0), (-1, -1), PANEL_BACKGROUND),
+            ('BOX', (0, 0), (-1, -1), 1, BORDER_GREY),
+            ('INNERGRID', (0, 0), (-1, -1), 0.5, BORDER_GREY),
+        ]
+        self.table_styles = {
+            # Two label/value column pairs (patient panel).
+            'info_grid': TableStyle(panel + [
+                ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+                ('TEXTCOLOR', (2, 0), (2, -1), LABEL_GREY),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ]),
+            'label_value': TableStyle(panel + [
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ]),
+            # Header row plus striped body rows.
+            'striped': TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), BRAND_BLUE),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 10),
+                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+                ('FONTSIZE', (0, 1), (-1, -1), 9),
+                ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+                ('TOPPADDING', (0, 0), (-1, -1), 8),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, PANEL_BACKGROUND]),
+                ('GRID', (0, 0), (-1, -1), 0.5, BORDER_GREY),
+            ]),
+        }
+
+        self.brand = Paragraph("MediCare AI", self.title)
+        self.header_rule = HRFlowable(width="100%", thickness=2, color=BRAND_BLUE, spaceAfter=20)
+        self.footer_rule = HRFlowable(
+            width="100%", thickness=1, color=BORDER_GREY, spaceBefore=10, spaceAfter=10
+        )
+        self.subtitles = {}
+        self.disclaimers = {}
+
+    def subtitle_for(self, text):
+        if text not in self.subtitles:
+            self.subtitles[text] = Paragraph(text, self.subtitle)
+        return self.subtitles[text]
+
+    def disclaimer_for(self, text):
+        if text not in self.disclaimers:
+            self.disclaimers[text] = Paragraph(text, self.small)
+        return self.disclaimers[text]
+
+
+@lru_cache(maxsize=1)
+def _template() -> _ReportTemplate:
+    return _ReportTemplate()
+
+
+def _static(flowable):
+    # Layout stores per-build state on flowables; copy the shared, already
+    # parsed instance so concurrent renders never share that state.
+    return copy.copy(flowable)
+
+
+def _build(output, story: list) -> None:
+    """Write ``story`` as a letter-size PDF to a path or binary file object."""
     doc = SimpleDocTemplate(
-        buffer,
+        output,
         pagesize=letter,
         rightMargin=0.75*inch,
         leftMargin=0.75*inch,
         topMargin=0.75*inch,
         bottomMargin=0.75*inch
     )
-    
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=22,
-        alignment=TA_CENTER,
-        spaceAfter=6,
-        textColor=colors.HexColor('#1e40af')
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'Subtitle',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_CENTER,
-        textColor=colors.gray,
-        spaceAfter=20
-    )
-    
-    section_header_style = ParagraphStyle(
-        'SectionHeader',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#1e3a5f'),
-        spaceBefore=15,
-        spaceAfter=10,
-        borderPadding=5
-    )
-    
-    body_style = ParagraphStyle(
-        'BodyText',
-        parent=styles['Normal'],
-        fontSize=11,
-        alignment=TA_JUSTIFY,
-        spaceAfter=8,
-        leading=14
-    )
-    
-    small_style = ParagraphStyle(
-        'SmallText',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=colors.gray,
-        alignment=TA_CENTER
-    )
-    
-    story = []
-    
-    # Header
-    story.append(Paragraph("MediCare AI", title_style))
-    story.append(Paragraph("Medical Prescription Report", subtitle_style))
-    story.append(HRFlowable(width="100%", thickness=2, color=colors.HexColor('#1e40af'), spaceAfter=20))
-    
-    # Patient Information
-    story.append(Paragraph("Patient Information", section_header_style))
-    
-    patient_data = [
-        ['Patient Name:', patient_name, 'Report Date:', datetime.now().strftime('%B %d, %Y')],
-        ['Email:', patient_email, 'Consultation Date:', appointment_date or 'N/A'],
-    ]
-    
-    patient_table = Table(patient_data, colWidths=[1.3*inch, 2.2*inch, 1.3*inch, 2.2*inch])
-    patient_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#374151')),
-        ('TEXTCOLOR', (2, 0), (2, -1), colors.HexColor('#374151')),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fafc')),
-        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-    ]))
-    story.append(patient_table)
-    story.append(Spacer(1, 15))
-    
-    # Doctor Information
-    story.append(Paragraph("Attending Physician", section_header_style))
-    
-    doctor_data = [
-        ['Doctor:', f"Dr. {doctor_name}"],
-        ['Specialty:', doctor_specialty],
+    doc.build(story)
+
+
+def _report_story(subtitle: str, sections: list, disclaimer: str, report_date: str) -> list:
+    """Flowables for a header, the given sections and the standard footer.
+
+    ``report_date`` is passed in rather than read from the clock so a cached
+    PDF always shows the date it was rendered for.
+    """
+    template = _template()
+    story = [
+        _static(template.brand),
+        _static(template.subtitle_for(subtitle)),
+        _static(template.header_rule),
     ]
-    
-    doctor_table = Table(doctor_data, colWidths=[1.3*inch, 5.7*inch])
-    doctor_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#374151')),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fafc')),
-        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-    ]))
-    story.append(doctor_table)
-    story.append(Spacer(1, 15))
-    
-    # Diagnosis
-    story.append(Paragraph("Diagnosis", section_header_style))
-    diagnosis = prescription.get('diagnosis', 'General consultation')
-    story.append(Paragraph(diagnosis, body_style))
-    story.append(Spacer(1, 10))
-    
-    # AI Summary
-    story.append(Paragraph("Summary", section_header_style))
-    ai_summary = generate_ai_summary(prescription, patient_name, doctor_name)
-    story.append(Paragraph(ai_summary, body_style))
-    story.append(Spacer(1, 10))
-    
-    # Medications
-    story.append(Paragraph("Prescribed Medications", section_header_style))
-    
+    for section in sections:
+        if section.kind == 'empty':
+            continue
+        story.append(Paragraph(section.heading, template.section_header))
+        if section.kind == 'table':
+            table = Table(section.content, colWidths=section.col_widths)
+            table.setStyle(template.table_styles[section.table])
+            story.append(table)
+        else:
+            story.append(Paragraph(section.content, template.body))
+        story.append(Spacer(1, section.space_after))
+
+    generated_text = f"Generated on {report_date} | MediCare AI Platform"
+    story.extend([
+        Spacer(1, 30),
+        _static(template.footer_rule),
+        _static(template.disclaimer_for(disclaimer)),
+        Spacer(1, 10),
+        Paragraph(generated_text, template.small),
+    ])
+    return story
+
+
+def _render_report(subtitle: str, sections: list, disclaimer: str, report_date: str) -> io.BytesIO:
+    buffer = io.BytesIO()
+    _build(buffer, _report_story(subtitle, sections, disclaimer, report_date))
+    buffer.seek(0)
+    return buffer
+
+
+def _optional(heading: str, text: str, space_after: float = 10) -> Section:
+    """A text section that is skipped when ``text`` is empty."""
+    if not text:
+        return Section(heading, 'empty', None)
+    return Section(heading, 'text', text, space_after)
+
+
+def _medication_rows(medications: list) -> list:
+    rows = [['Medication', 'Dosage', 'Frequency', 'Duration', 'Instructions']]
+    for med in medications:
+        rows.append([
+            med.get('name', '-'),
+            med.get('dosage', '-'),
+            med.get('frequency', 'As directed'),
+            med.get('duration', 'As prescribed'),
+            med.get('instructions', '-')[:50] + ('...' if len(med.get('instructions', '')) > 50 else '')
+        ])
+    return rows
+
+
+def generate_prescription_pdf(
+    prescription: dict,
+    patient_name: str,
+    patient_email: str,
+    doctor_name: str,
+    doctor_specialty: str,
+    appointment_date: str,
+    ai_summary: str,
+    report_date: str = None
+) -> io.BytesIO:
+    """Generate a PDF report for a prescription.
+
+    ``ai_summary`` is the stored summary (or ``template_summary``); no model
+    is called while rendering. ``report_date`` defaults to today.
+    """
+    report_date = report_date or format_report_date()
+    return _render_report(*_prescription_report(
+        prescription, patient_name, patient_email, doctor_name,
+        doctor_specialty, appointment_date, ai_summary, report_date
+    ), report_date)
+
+
+def _prescription_report(
+    prescription, patient_name, patient_email, doctor_name,
+    doctor_specialty, appointment_date, ai_summary, report_date
+):
+    """Return ``(subtitle, sections, disclaimer)`` for a prescription."""
     medications = prescription.get('medications', [])
     if medications:
-        med_data = [['Medication', 'Dosage', 'Frequency', 'Duration', 'Instructions']]
-        
-        for med in medications:
-            med_data.append([
-                med.get('name', '-'),
-                med.get('dosage', '-'),
-                med.get('frequency', 'As directed'),
-                med.get('duration', 'As prescribed'),
-                med.get('instructions', '-')[:50] + ('...' if len(med.get('instructions', '')) > 50 else '')
-            ])
-        
-        med_table = Table(med_data, colWidths=[1.4*inch, 1*inch, 1.2*inch, 1*inch, 2.2*inch])
-        med_table.setStyle(TableStyle([
-            # Header
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            # Body
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            # Alternating row colors
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-        ]))
-        story.append(med_table)
+        medications_section = Section(
+            "Prescribed Medications", 'table', _medication_rows(medications), 15,
+            table='striped', col_widths=MEDICATION_WIDTHS
+        )
     else:
-        story.append(Paragraph("No medications prescribed.", body_style))
-    
-    story.append(Spacer(1, 15))
-    
-    # Doctor's Notes
-    notes = prescription.get('notes', '')
-    if notes:
-        story.append(Paragraph("Doctor's Notes", section_header_style))
-        story.append(Paragraph(notes, body_style))
-        story.append(Spacer(1, 15))
-    
-    # Footer
-    story.append(Spacer(1, 30))
-    story.append(HRFlowable(width="100%", thickness=1, color=colors.HexColor('#e2e8f0'), spaceBefore=10, spaceAfter=10))
-    
-    disclaimer = """
-    <b>Disclaimer:</b> This report is generated based on your consultation and prescription details. 
-    It is for informational purposes only. Always follow your doctor's instructions and consult 
-    them if you have any questions or concerns about your treatment. This report was generated 
-    with AI-assisted technology.
-    """
-    story.append(Paragraph(disclaimer, small_style))
-    
-    generated_text = f"Generated on {datetime.now().strftime('%B %d, %Y at %I:%M %p')} | MediCare AI Platform"
-    story.append(Spacer(1, 10))
-    story.append(Paragraph(generated_text, small_style))
-    
-    # Build PDF
-    doc.build(story)
-    buffer.seek(0)
-    
-    return buffer
+        medications_section = Section("Prescribed Medications", 'text', "No medications prescribed.", 15)
+
+    sections = [
+        Section("Patient Information", 'table', [
+            ['Patient Name:', patient_name, 'Report Date:', report_date],
+            ['Email:', patient_email, 'Consultation Date:', appointment_date or 'N/A'],
+        ], 15, table='info_grid', col_widths=INFO_GRID_WIDTHS),
+        Section("Attending Physician", 'table', [
+            ['Doctor:', f"Dr. {doctor_name}"],
+            ['Specialty:', doctor_specialty],
+        ], 15, table='label_value', col_widths=LABEL_VALUE_WIDTHS),
+        Section("Diagnosis", 'text', prescription.get('diagnosis', 'General consultation')),
+        Section("Summary", 'text', ai_summary),
+        medications_section,
+        _optional("Doctor's Notes", prescription.get('notes', ''), 15),
+    ]
+    return "Medical Prescription Report", sections, PRESCRIPTION_DISCLAIMER
 
 
 def generate_medical_record_pdf(
     record: dict,
     patient_name: str,
     patient_email: str,
-    doctor_name: str
+    doctor_name: str,
+    report_date: str = None
 ) -> io.BytesIO:
-    """Generate a PDF report for a medical record."""
-    
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=letter,
-        rightMargin=0.75*inch,
-        leftMargin=0.75*inch,
-        topMargin=0.75*inch,
-        bottomMargin=0.75*inch
-    )
-    
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=22,
-        alignment=TA_CENTER,
-        spaceAfter=6,
-        textColor=colors.HexColor('#1e40af')
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'Subtitle',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_CENTER,
-        textColor=colors.gray,
-        spaceAfter=20
-    )
-    
-    section_header_style = ParagraphStyle(
-        'SectionHeader',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#1e3a5f'),
-        spaceBefore=15,
-        spaceAfter=10,
-        borderPadding=5
-    )
-    
-    body_style = ParagraphStyle(
-        'BodyText',
-        parent=styles['Normal'],
-        fontSize=11,
-        alignment=TA_JUSTIFY,
-        spaceAfter=8,
-        leading=14
-    )
-    
-    small_style = ParagraphStyle(
-        'SmallText',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=colors.gray,
-        alignment=TA_CENTER
-    )
-    
-    story = []
-    
-    # Header
-    story.append(Paragraph("MediCare AI", title_style))
-    story.append(Paragraph("Medical Record Report", subtitle_style))
-    story.append(HRFlowable(width="100%", thickness=2, color=colors.HexColor('#1e40af'), spaceAfter=20))
-    
-    # Patient Information
-    story.append(Paragraph("Patient Information", section_header_style))
-    
+    """Generate a PDF report for a medical record. ``report_date`` defaults to today."""
+    report_date = report_date or format_report_date()
+    return _render_report(*_medical_record_report(
+        record, patient_name, patient_email, doctor_name, report_date
+    ), report_date)
+
+
+def _medical_record_report(record, patient_name, patient_email, doctor_name, report_date):
+    """Return ``(subtitle, sections, disclaimer)`` for a medical record."""
     record_date = record.get('date', 'N/A')
     if isinstance(record_date, datetime):
         record_date = record_date.strftime('%B %d, %Y')
-    
-    patient_data = [
-        ['Patient Name:', patient_name, 'Report Date:', datetime.now().strftime('%B %d, %Y')],
-        ['Email:', patient_email, 'Record Date:', record_date],
+
+    sections = [
+        Section("Patient Information", 'table', [
+            ['Patient Name:', patient_name, 'Report Date:', report_date],
+            ['Email:', patient_email, 'Record Date:', record_date],
+        ], 15, table='info_grid', col_widths=INFO_GRID_WIDTHS),
+        Section("Attending Physician", 'text', f"Dr. {doctor_name}", 15),
+        Section("Record Type", 'text', record.get('type', 'General')),
+        Section("Description", 'text', record.get('description', 'No description available')),
+        _optional("Result", record.get('result', '')),
+        _optional("Notes", record.get('notes', ''), 15),
     ]
-    
-    patient_table = Table(patient_data, colWidths=[1.3*inch, 2.2*inch, 1.3*inch, 2.2*inch])
-    patient_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#374151')),
-        ('TEXTCOLOR', (2, 0), (2, -1), colors.HexColor('#374151')),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fafc')),
-        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-    ]))
-    story.append(patient_table)
-    story.append(Spacer(1, 15))
-    
-    # Attending Doctor
-    story.append(Paragraph("Attending Physician", section_header_style))
-    story.append(Paragraph(f"Dr. {doctor_name}", body_style))
-    story.append(Spacer(1, 15))
-    
-    # Record Type
-    record_type = record.get('type', 'General')
-    story.append(Paragraph("Record Type", section_header_style))
-    story.append(Paragraph(record_type, body_style))
-    story.append(Spacer(1, 10))
-    
-    # Description
-    description = record.get('description', 'No description available')
-    story.append(Paragraph("Description", section_header_style))
-    story.append(Paragraph(description, body_style))
-    story.append(Spacer(1, 10))
-    
-    # Result (if available)
-    result = record.get('result', '')
-    if result:
-        story.append(Paragraph("Result", section_header_style))
-        story.append(Paragraph(result, body_style))
-        story.append(Spacer(1, 10))
-    
-    # Notes (if available)
-    notes = record.get('notes', '')
-    if notes:
-        story.append(Paragraph("Notes", section_header_style))
-        story.append(Paragraph(notes, body_style))
-        story.append(Spacer(1, 15))
-    
-    # Footer
-    story.append(Spacer(1, 30))
-    story.append(HRFlowable(width="100%", thickness=1, color=colors.HexColor('#e2e8f0'), spaceBefore=10, spaceAfter=10))
-    
-    disclaimer = """
-    <b>Disclaimer:</b> This report is generated based on your medical records. 
-    It is for informational purposes only. Please consult your doctor if you have 
-    any questions about your medical history.
+    return "Medical Record Report", sections, MEDICAL_RECORD_DISCLAIMER
+
+
+def render_report(kind: str, payload: dict) -> bytes:
+    """Render a report to PDF bytes from plain data (runs in render workers)."""
+    if kind == 'prescription':
+        return generate_prescription_pdf(**payload).getvalue()
+    if kind == 'medical_record':
+        return generate_medical_record_pdf(**payload).getvalue()
+    raise ValueError(f"Unknown report kind: {kind}")
+
+
+_REPORT_SPECS = {
+    'prescription': _prescription_report,
+    'medical_record': _medical_record_report,
+}
+
+
+def render_bundle(documents: list, path: str) -> str:
+    """Render ``(kind, payload)`` documents into one PDF at ``path``.
+
+    Each document keeps its own header and footer and starts on a new page.
+    Prescription payloads must include ``ai_summary`` and every payload
+    ``report_date``.
     """
-    story.append(Paragraph(disclaimer, small_style))
-    
-    generated_text = f"Generated on {datetime.now().strftime('%B %d, %Y at %I:%M %p')} | MediCare AI Platform"
-    story.append(Spacer(1, 10))
-    story.append(Paragraph(generated_text, small_style))
-    
-    # Build PDF
-    doc.build(story)
-    buffer.seek(0)
-    
-    return buffer
+    story = []
+    for kind, payload in documents:
+        if kind not in _REPORT_SPECS:
+            raise ValueError(f"Unknown report kind: {kind}")
+        if story:
+            story.append(PageBreak())
+        story.extend(_report_story(*_REPORT_SPECS[kind](**payload), payload['report_date']))
+    _build(path, story)
+    return path
@@ -0,0 +1,80 @@
+"""
+Bundled symptom to specialty table used by chatbot retrieval and triage.
+
+Keys are the specialties doctors can register with (``VALID_SPECIALTIES`` in
+``routes/auth.py``); values are lowercase symptom keywords and phrases that
+usually call for that specialty.
+"""
+
+SPECIALTY_SYMPTOMS = {
+    'General Practice': [
+        'fever', 'cold', 'cough', 'flu', 'sore throat', 'runny nose', 'fatigue',
+        'tiredness', 'body ache', 'checkup', 'check up', 'general', 'weakness',
+    ],
+    'Cardiology': [
+        'chest pain', 'chest tightness', 'palpitations', 'heart', 'heartbeat',
+        'irregular heartbeat', 'high blood pressure', 'hypertension', 'shortness of breath on exertion',
+        'swollen ankles', 'cholesterol',
+    ],
+    'Dermatology': [
+        'rash', 'skin rash', 'itching', 'itchy skin', 'acne', 'eczema', 'psoriasis',
+        'hives', 'mole', 'skin', 'hair loss', 'dandruff', 'pimples',
+    ],
+    'Neurology': [
+        'headache', 'migraine', 'seizure', 'numbness', 'tingling', 'dizziness',
+        'memory loss', 'tremor', 'fainting', 'vertigo', 'stroke',
+    ],
+    'Orthopedics': [
+        'back pain', 'knee pain', 'joint pain', 'fracture', 'broken bone', 'sprain',
+        'shoulder pain', 'neck pain', 'hip pain', 'bone', 'ligament', 'sports injury',
+    ],
+    'Pediatrics': [
+        'child', 'baby', 'infant', 'toddler', 'my son', 'my daughter', 'kid',
+        'vaccination', 'newborn',
+    ],
+    'Psychiatry': [
+        'anxiety', 'depression', 'panic attack', 'insomnia', 'stress', 'mood swings',
+        'suicidal', 'hallucinations', 'sleep problems', 'mental health',
+    ],
+    'Ophthalmology': [
+        'eye', 'eyes', 'blurred vision', 'vision', 'red eye', 'eye pain',
+        'itchy eyes', 'cataract', 'glaucoma',
+    ],
+    'Gynecology': [
+        'period', 'periods', 'menstrual', 'pregnancy', 'pregnant', 'pelvic pain',
+        'vaginal', 'menopause', 'pcos', 'fertility',
+    ],
+    'Urology': [
+        'urination', 'urine', 'painful urination', 'frequent urination', 'kidney stone',
+        'prostate', 'bladder', 'blood in urine', 'uti',
+    ],
+    'Oncology': [
+        'cancer', 'tumor', 'tumour', 'lump', 'chemotherapy', 'unexplained weight loss',
+        'biopsy',
+    ],
+    'Endocrinology': [
+        'diabetes', 'blood sugar', 'thyroid', 'hormone', 'excessive thirst',
+        'weight gain', 'insulin',
+    ],
+    'Gastroenterology': [
+        'stomach pain', 'abdominal pain', 'stomach ache', 'nausea', 'vomiting', 'diarrhea',
+        'constipation', 'acid reflux', 'heartburn', 'bloating', 'indigestion', 'stomach',
+    ],
+    'Pulmonology': [
+        'shortness of breath', 'breathing difficulty', 'wheezing', 'asthma',
+        'chronic cough', 'lungs', 'lung', 'coughing blood', 'breathless',
+    ],
+    'Nephrology': [
+        'kidney', 'kidneys', 'kidney disease', 'swelling', 'dialysis', 'creatinine',
+        'foamy urine',
+    ],
+    'Rheumatology': [
+        'arthritis', 'joint swelling', 'joint stiffness', 'lupus', 'gout',
+        'morning stiffness', 'autoimmune',
+    ],
+    'Emergency Medicine': [
+        'severe chest pain', 'unconscious', 'unresponsive', 'severe bleeding',
+        'can not breathe', 'cannot breathe', 'choking',
+        'swallowed poison',
+    ],
+}
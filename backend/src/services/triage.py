@@ -0,0 +1,118 @@
+"""
+Deterministic symptom triage that answers simple routing questions locally.
+
+Messages such as "I have a skin rash, which doctor should I see?" are
+matched against the bundled symptom table (``symptom_specialties``). When
+one specialty clearly wins and the user is asking who to see, the chatbot
+replies with matching doctors straight from the directory; anything less
+certain goes to the LLM.
+"""
+
+import re
+from typing import List, NamedTuple, Optional
+
+from .doctor_index import matched_specialties, tokenize
+
+EMERGENCY = 'Emergency Medicine'
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+# Matched on raw words: most of these are stopwords to the retrieval tokenizer.
+_ROUTING_PHRASES = [
+    tuple(_WORD_RE.findall(phrase)) for phrase in (
+        'who should i see', 'which doctor', 'what doctor', 'what kind of doctor',
+        'which specialist', 'what specialist', 'recommend a doctor', 'suggest a doctor',
+        'should i see', 'need a doctor', 'find a doctor', 'which department',
+    )
+]
+
+# Self-harm messages always go to the LLM, which is prompted to give crisis
+# guidance; a canned referral is not an appropriate reply to them.
+_CRISIS_PHRASES = [
+    tuple(_WORD_RE.findall(phrase)) for phrase in (
+        'suicidal', 'suicide', 'kill myself', 'killing myself', 'end my life',
+        'want to die', 'self harm', 'harm myself', 'hurt myself', 'cutting myself',
+        'overdose', 'overdosed',
+    )
+]
+
+# Long messages usually describe several problems or ask more than routing.
+MAX_TRIAGE_TOKENS = 40
+
+
+class TriageResult(NamedTuple):
+    specialty: Optional[str]
+    confidence: float
+    matched: List[str]
+
+
+def _contains_phrase(message, phrases):
+    tokens = _WORD_RE.findall((message or '').lower())
+    return any(
+        tuple(tokens[i:i + len(phrase)]) == phrase
+        for phrase in phrases
+        for i in range(len(tokens) - len(phrase) + 1)
+    )
+
+
+def _has_routing_intent(message):
+    return _contains_phrase(message, _ROUTING_PHRASES)
+
+
+def is_crisis_message(message: str) -> bool:
+    """Whether a message mentions suicide or self-harm."""
+    return _contains_phrase(message, _CRISIS_PHRASES)
+
+
+def triage(message: str) -> TriageResult:
+    """Score the most likely specialty for a message.
+
+    Confidence is the winning specialty's share of all symptom matches,
+    discounted for a single match, for messages that do not ask who to see,
+    and for long messages. An emergency symptom takes precedence over the
+    specialties it overlaps (severe chest pain is also chest pain) but gets
+    the same discounts, so it is only answered locally for routing questions.
+    Self-harm messages score zero so the LLM always answers them.
+    """
+    if is_crisis_message(message):
+        return TriageResult(None, 0.0, [])
+    tokens = tokenize(message)
+    matches = matched_specialties(tokens)
+    if not matches:
+        return TriageResult(None, 0.0, [])
+
+    if EMERGENCY in matches:
+        specialty, hits = EMERGENCY, matches[EMERGENCY]
+        confidence = 1.0
+    else:
+        specialty, hits = matches.most_common(1)[0]
+        confidence = hits / sum(matches.values())
+    if hits == 1:
+        confidence *= 0.75
+    if not _has_routing_intent(message):
+        confidence *= 0.6
+    if len(tokens) > MAX_TRIAGE_TOKENS:
+        confidence *= 0.5
+    return TriageResult(specialty, round(confidence, 3), sorted(matches))
+
+
+def format_triage_answer(specialty: str, doctor_lines: List[str]) -> str:
+    """The reply sent for a confident triage match."""
+    if specialty == EMERGENCY:
+        opening = (
+            "What you describe may be a medical emergency. Please call your local emergency "
+            "number or go to the nearest hospital right away."
+        )
+        follow_up = "Once you are safe, these emergency medicine doctors on our platform can help:"
+    else:
+        opening = f"Based on what you describe, a {specialty} specialist is the right place to start."
+        follow_up = "Here are doctors from our directory you can book:"
+    return "\n".join([
+        opening,
+        "",
+        follow_up,
+        *doctor_lines,
+        "",
+        "This is general guidance, not a diagnosis. Please consult a doctor, and seek "
+        "emergency care if your symptoms get worse.",
+    ])
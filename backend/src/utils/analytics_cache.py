@@ -0,0 +1,25 @@
+"""
+Per-patient dashboard analytics cache, invalidated from model write paths.
+"""
+
+from .cache import TTLCache
+from ..invalidation import subscribe, APPOINTMENT_CHANGED, PRESCRIPTION_CREATED
+
+PATIENT_ANALYTICS_CACHE_MAX_ENTRIES = 10000
+
+patient_analytics_cache = TTLCache(
+    "patient_analytics", max_entries=PATIENT_ANALYTICS_CACHE_MAX_ENTRIES
+)
+
+
+def invalidate_patient_analytics(patient_id) -> None:
+    """Drop a patient's cached analytics after their appointments/prescriptions change."""
+    if not patient_id:
+        return
+    patient_analytics_cache.invalidate(str(patient_id))
+
+
+@subscribe(APPOINTMENT_CHANGED)
+@subscribe(PRESCRIPTION_CREATED)
+def _on_patient_data_changed(event):
+    invalidate_patient_analytics(event.get("patient_id"))
@@ -0,0 +1,230 @@
+"""
+Bounded in-process cache shared by routes and services.
+
+``TTLCache`` combines size-bounded LRU eviction, per-entry TTLs, single-flight
+loading (one loader call per key at a time), stale-while-revalidate and
+invalidation by exact key or key prefix. Every cache registers itself by name
+so its counters can be inspected through ``cache_stats()``.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+_registry_lock = threading.Lock()
+_registry = {}
+
+_MISSING = object()
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "stale_until")
+
+    def __init__(self, value, expires_at, stale_until):
+        self.value = value
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+
+
+class _Flight:
+    """A load in progress; waiters block on ``done`` and read the outcome."""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTLs.
+
+    Entries are fresh for ``ttl_seconds``. With ``stale_seconds`` > 0 an expired
+    entry may still be served for that long while a single background load
+    replaces it; past that window (or with ``stale_seconds`` = 0) callers load
+    synchronously, and concurrent callers for the same key wait for that one load.
+    """
+
+    def __init__(self, name, max_entries=1024, ttl_seconds=300, stale_seconds=0):
+        self.name = name
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "loads": 0,
+            "load_errors": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+        with _registry_lock:
+            _registry[name] = self
+
+    def _lookup(self, key, now_ts):
+        """Return (entry, is_fresh); drops entries past their stale window."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+        if now_ts < entry.expires_at:
+            self._entries.move_to_end(key)
+            return entry, True
+        if now_ts < entry.stale_until:
+            self._entries.move_to_end(key)
+            return entry, False
+        del self._entries[key]
+        return None, False
+
+    def _store(self, key, value, ttl_seconds):
+        ttl = max(1, int(self.ttl_seconds if ttl_seconds is None else ttl_seconds))
+        expires_at = time.monotonic() + ttl
+        self._entries[key] = _Entry(value, expires_at, expires_at + max(0, self.stale_seconds))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def get(self, key, default=None):
+        """Return a fresh cached value, or ``default``."""
+        with self._lock:
+            entry, fresh = self._lookup(key, time.monotonic())
+            if entry is not None and fresh:
+                self._counters["hits"] += 1
+                return entry.value
+            self._counters["misses"] += 1
+            return default
+
+    def set(self, key, value, ttl_seconds=None):
+        """Store a value, evicting the least recently used entries if full."""
+        with self._lock:
+            self._store(key, value, ttl_seconds)
+
+    def get_or_load(self, key, loader, ttl_seconds=None):
+        """Return the cached value for ``key``, calling ``loader()`` at most once
+        concurrently to fill or refresh it."""
+        with self._lock:
+            entry, fresh = self._lookup(key, time.monotonic())
+            if entry is not None and fresh:
+                self._counters["hits"] += 1
+                return entry.value
+
+            flight = self._flights.get(key)
+            if entry is not None:
+                # Stale but servable: refresh once in the background.
+                self._counters["stale_hits"] += 1
+                if flight is None:
+                    flight = self._flights[key] = _Flight()
+                    self._spawn_refresh(key, loader, ttl_seconds, flight)
+                return entry.value
+
+            self._counters["misses"] += 1
+            owner = flight is None
+            if owner:
+                flight = self._flights[key] = _Flight()
+
+        if not owner:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        self._run_load(key, loader, ttl_seconds, flight)
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _run_load(self, key, loader, ttl_seconds, flight):
+        try:
+            value = loader()
+        except Exception as exc:
+            with self._lock:
+                self._counters["load_errors"] += 1
+                # After an invalidation the key may already have a newer flight.
+                if self._flights.get(key) is flight:
+                    self._flights.pop(key, None)
+            flight.error = exc
+        else:
+            with self._lock:
+                self._counters["loads"] += 1
+                # An invalidation during the load drops the flight; don't
+                # resurrect data that may predate it.
+                if self._flights.get(key) is flight:
+                    self._store(key, value, ttl_seconds)
+                    self._flights.pop(key, None)
+            flight.value = value
+        finally:
+            flight.done.set()
+
+    def _spawn_refresh(self, key, loader, ttl_seconds, flight):
+        app = current_app._get_current_object() if has_app_context() else None
+
+        def _run():
+            if app is not None:
+                with app.app_context():
+                    self._run_load(key, loader, ttl_seconds, flight)
+            else:
+                self._run_load(key, loader, ttl_seconds, flight)
+            if flight.error is not None:
+                logger.warning(
+                    "Background refresh of %s[%r] failed: %s", self.name, key, flight.error
+                )
+
+        threading.Thread(
+            target=_run, name=f"cache-refresh-{self.name}", daemon=True
+        ).start()
+
+    def invalidate(self, key):
+        """Drop one key; returns True if an entry was removed."""
+        with self._lock:
+            self._flights.pop(key, None)
+            removed = self._entries.pop(key, _MISSING) is not _MISSING
+            if removed:
+                self._counters["invalidations"] += 1
+            return removed
+
+    def invalidate_prefix(self, prefix):
+        """Drop every string key starting with ``prefix``; returns the count."""
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if isinstance(key, str) and key.startswith(prefix)
+            ]
+            for key in keys:
+                del self._entries[key]
+            for key in [
+                key for key in self._flights
+                if isinstance(key, str) and key.startswith(prefix)
+            ]:
+                self._flights.pop(key, None)
+            self._counters["invalidations"] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        """Drop all entries and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self._flights.clear()
+            for name in self._counters:
+                self._counters[name] = 0
+
+    def stats(self):
+        """Return counters plus the current and maximum entry counts."""
+        with self._lock:
+            return dict(self._counters, size=len(self._entries), max_entries=self.max_entries)
+
+
+def cache_stats():
+    """Return ``stats()`` for every registered cache, keyed by cache name."""
+    with _registry_lock:
+        caches = list(_registry.values())
+    return {cache.name: cache.stats() for cache in caches}
@@ -0,0 +1,85 @@
+"""
+Minimal in-process metrics: counters and latency histograms.
+
+Values live in this worker's memory only and are exposed to admins through
+``GET /api/admin/metrics``.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+def increment(name, value=1):
+    """Add value to a counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name, seconds):
+    """Record a duration (in seconds) in a latency histogram."""
+    seconds = max(0.0, float(seconds))
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = {
+                "count": 0,
+                "sum": 0.0,
+                "max": 0.0,
+                "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+            }
+            _histograms[name] = histogram
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+        histogram["max"] = max(histogram["max"], seconds)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][index] += 1
+                break
+        else:
+            histogram["buckets"][-1] += 1
+
+
+@contextmanager
+def timer(name):
+    """Observe the wall time of the wrapped block under ``name``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+def snapshot():
+    """Return a JSON-serializable copy of all counters and histograms."""
+    with _lock:
+        histograms = {}
+        for name, histogram in _histograms.items():
+            count = histogram["count"]
+            buckets = {
+                str(bound): hits
+                for bound, hits in zip(LATENCY_BUCKETS, histogram["buckets"])
+            }
+            buckets["+Inf"] = histogram["buckets"][-1]
+            histograms[name] = {
+                "count": count,
+                "sum": round(histogram["sum"], 6),
+                "avg": round(histogram["sum"] / count, 6) if count else 0.0,
+                "max": round(histogram["max"], 6),
+                "buckets": buckets,
+            }
+        return {"counters": dict(_counters), "histograms": histograms}
+
+
+def reset():
+    """Clear all metrics (used by tests)."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
@@ -2,7 +2,10 @@
 Pagination utilities for API responses
 """
 
-from typing import List, Dict, Any, Optional
+import base64
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from bson import ObjectId
 from flask import request
 
 
@@ -146,3 +149,52 @@ def create_pagination_response(
             "prev_page": page - 1 if page > 1 else None,
         },
     }
+
+
+def encode_keyset_cursor(created_at: Optional[datetime], object_id: ObjectId) -> str:
+    """
+    Encode the sort key of the last item on a page as an opaque cursor.
+
+    Args:
+        created_at: The item's created_at (None for legacy rows without one)
+        object_id: The item's _id, used as a tie-breaker
+
+    Returns:
+        URL-safe cursor string
+    """
+    timestamp = created_at.isoformat() if created_at else ""
+    raw = f"{timestamp}|{object_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_keyset_cursor(cursor: str) -> Tuple[Optional[datetime], ObjectId]:
+    """
+    Decode a cursor produced by encode_keyset_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        timestamp, object_id = raw.split("|", 1)
+        created_at = datetime.fromisoformat(timestamp) if timestamp else None
+        return created_at, ObjectId(object_id)
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def keyset_after(created_at: Optional[datetime], object_id: ObjectId) -> Dict[str, Any]:
+    """
+    Build the filter for items after a cursor in (created_at desc, _id desc) order.
+
+    Rows without created_at sort last, after every dated row.
+    """
+    if created_at is None:
+        return {"created_at": None, "_id": {"$lt": object_id}}
+    return {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": object_id}},
+            {"created_at": None},
+        ]
+    }
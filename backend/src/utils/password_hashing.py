@@ -0,0 +1,111 @@
+"""
+Password hashing off the request threads.
+
+Hashing and verification are deliberately CPU-heavy and hold the GIL, so they
+run in a small process pool (``PASSWORD_HASH_WORKERS``; 0 hashes inline) and
+a login burst no longer stalls every other request on the worker. New hashes
+use ``PASSWORD_HASH_METHOD`` (any werkzeug method string, e.g.
+``scrypt:32768:8:1`` or ``pbkdf2:sha256:600000``); ``needs_rehash`` reports
+hashes made with other parameters so logins can upgrade them. A call still
+queued after ``PASSWORD_HASH_TIMEOUT_SECONDS`` raises ``PasswordHashBusyError``.
+"""
+
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from . import metrics
+
+DEFAULT_METHOD = "scrypt:32768:8:1"
+
+_lock = threading.Lock()
+_pool = {"executor": None, "workers": None}
+
+
+class PasswordHashBusyError(RuntimeError):
+    """The hashing pool did not finish the call within its timeout."""
+
+    def __init__(self, retry_after):
+        super().__init__("Password hashing pool is at capacity")
+        self.retry_after = retry_after
+
+
+def _settings():
+    if not has_app_context():
+        return DEFAULT_METHOD, 0, None
+    config = current_app.config
+    return (
+        config.get("PASSWORD_HASH_METHOD") or DEFAULT_METHOD,
+        int(config.get("PASSWORD_HASH_WORKERS", 2)),
+        float(config.get("PASSWORD_HASH_TIMEOUT_SECONDS", 10)),
+    )
+
+
+def _get_pool(workers):
+    with _lock:
+        if _pool["executor"] is None or _pool["workers"] != workers:
+            if _pool["executor"] is not None:
+                _pool["executor"].shutdown(wait=False)
+            # spawn: forking a threaded server with an open Mongo client is unsafe.
+            _pool["executor"] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool["workers"] = workers
+        return _pool["executor"]
+
+
+def _reset_pool(executor):
+    with _lock:
+        if _pool["executor"] is executor:
+            _pool["executor"] = None
+    executor.shutdown(wait=False)
+
+
+def _run(metric, func, *args):
+    _, workers, timeout = _settings()
+    with metrics.timer(metric):
+        if workers <= 0:
+            return func(*args)
+        executor = _get_pool(workers)
+        future = executor.submit(func, *args)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Drop the call if it is still queued; a running one cannot be stopped.
+            future.cancel()
+            metrics.increment("auth.password_hash_timeouts")
+            raise PasswordHashBusyError(max(1, math.ceil(timeout))) from None
+        except BrokenProcessPool:
+            _reset_pool(executor)
+            raise
+
+
+def hash_password(password):
+    """Hash ``password`` with the configured method."""
+    method, _, _ = _settings()
+    return _run("auth.password_hash_seconds", generate_password_hash, password, method)
+
+
+def verify_password(password_hash, password):
+    """Whether ``password`` matches ``password_hash``."""
+    if not password_hash or not isinstance(password, str):
+        return False
+    return _run("auth.password_verify_seconds", check_password_hash, password_hash, password)
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    # werkzeug fills in default parameters (e.g. "scrypt" -> "scrypt:32768:8:1").
+    return generate_password_hash("", method).split("$", 1)[0]
+
+
+def needs_rehash(password_hash):
+    """Whether a stored hash was made with other than the configured method."""
+    method, _, _ = _settings()
+    return password_hash.split("$", 1)[0] != _method_prefix(method)
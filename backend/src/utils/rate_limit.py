@@ -0,0 +1,85 @@
+"""
+Request rate limiters keyed by client.
+
+``TokenBucketLimiter`` keeps one token bucket per key in this worker: each
+key may spend ``limit`` requests at once, refilled evenly over
+``window_seconds``. Buckets sit in LRU order, so every check is amortized
+O(1): the touched key moves to the end and idle buckets (fully refilled,
+hence equivalent to no bucket) or ones beyond ``max_keys`` are evicted from
+the front. ``MongoRateLimiter`` counts per (key, fixed window) in a shared
+collection with one atomic update, so the limit holds across workers.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+
+class TokenBucketLimiter:
+    """Thread-safe in-process token buckets in LRU order."""
+
+    def __init__(self, max_keys=5000):
+        self.max_keys = max(1, int(max_keys))
+        self._lock = threading.Lock()
+        # key -> (tokens, updated_at)
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def hit(self, key, limit, window_seconds, now=None):
+        """Spend a token for ``key``; returns True when it has none left."""
+        now = time.monotonic() if now is None else now
+        rate = limit / window_seconds
+        with self._lock:
+            state = self._buckets.pop(key, None)
+            tokens = float(limit)
+            if state is not None:
+                tokens = min(tokens, state[0] + (now - state[1]) * rate)
+            limited = tokens < 1
+            if not limited:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+
+            while self._buckets:
+                oldest_key, (_, updated_at) = next(iter(self._buckets.items()))
+                if len(self._buckets) <= self.max_keys and now - updated_at < window_seconds:
+                    break
+                del self._buckets[oldest_key]
+        return limited
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class MongoRateLimiter:
+    """Fixed-window counters shared by every worker through one collection.
+
+    Documents expire through a TTL index on ``expires_at``.
+    """
+
+    def __init__(self, get_collection):
+        self._get_collection = get_collection
+
+    def hit(self, key, limit, window_seconds, now=None):
+        """Count a request for ``key``; returns True once over ``limit``."""
+        now = time.time() if now is None else now
+        window = int(now // window_seconds)
+        counter = self._get_collection().find_one_and_update(
+            {'_id': f'{key}:{window}'},
+            {
+                '$inc': {'count': 1},
+                '$setOnInsert': {
+                    'expires_at': datetime.utcnow()
+                    + timedelta(seconds=(window + 1) * window_seconds - now),
+                },
+            },
+            projection={'count': 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return counter['count'] > limit
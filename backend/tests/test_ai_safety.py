@@ -12,7 +12,7 @@ def test_system_prompt_contains_disclaimer(mock_find_all, app):
         assert "Disclaimer: You are an AI assistant" in prompt or "consult a doctor" in prompt
         assert "Do not provide definitive medical diagnoses" in prompt or "medical advice" in prompt or "book an appointment" in prompt
 
-@patch('src.services.chatbot_service.ChatGoogleGenerativeAI')
+@patch('src.services.llm_providers.ChatGoogleGenerativeAI')
 @patch('src.services.chatbot_service.ChatHistory')
 def test_process_message_with_disclaimer_response(MockChatHistory, MockChatModel, app):
     """Test that the chatbot service correctly returns a response containing a disclaimer."""
@@ -0,0 +1,235 @@
+import json
+from bson import ObjectId
+from flask_jwt_extended import create_access_token
+
+from src.models.appointment import Appointment
+from src.models.doctor import Doctor
+from src.models.doctor_stats import DoctorStats
+from src.models.prescription import Prescription
+from src.models.rating import Rating
+
+
+def _non_zero(value):
+    if isinstance(value, dict):
+        return {key: count for key, count in value.items() if count}
+    return value
+
+
+def _doctor_token(app, user_id):
+    with app.app_context():
+        return create_access_token(
+            identity=json.dumps({'id': str(user_id), 'role': 'doctor'})
+        )
+
+
+def test_doctor_stats_follow_write_paths(client, app, db):
+    user_id = ObjectId()
+    doctor = Doctor.create(user_id, 'Dr. Stats', 'Cardiology', 'Pune', [], 0, '')
+    # First read creates the stats document from (empty) raw data.
+    DoctorStats.get(doctor['_id'])
+
+    patient_a, patient_b = ObjectId(), ObjectId()
+    first = Appointment.create(patient_a, doctor['_id'], 'Dr. Stats', '2099-01-01', '9:00 AM')
+    Appointment.create(patient_a, doctor['_id'], 'Dr. Stats', '2099-01-02', '9:00 AM')
+    third = Appointment.create(patient_b, doctor['_id'], 'Dr. Stats', '2099-01-03', '9:00 AM')
+
+    Appointment.update_status(first['_id'], 'confirmed')
+    Appointment.update_status(first['_id'], 'completed')
+    Appointment.update(third['_id'], {'status': 'rejected', 'rejection_reason': 'Busy'})
+    Prescription.create(doctor['_id'], patient_a, first['_id'], [{'name': 'A', 'dosage': '1'}])
+    Rating.create(patient_a, doctor['_id'], first['_id'], 4)
+    Appointment.delete(third['_id'])
+
+    incremental = db.doctor_stats.find_one({'_id': doctor['_id']})
+    rebuilt = DoctorStats.rebuild(doctor['_id'])
+    for field in ('total', 'status_counts', 'created_by_month', 'unique_patients',
+                  'prescriptions'):
+        assert _non_zero(incremental[field]) == _non_zero(rebuilt[field]), field
+
+    response = client.get(
+        '/api/analytics/doctor',
+        headers={'Authorization': f'Bearer {_doctor_token(app, user_id)}'},
+    )
+    assert response.status_code == 200, response.data
+    data = response.get_json()
+    assert data['totalAppointments'] == 2
+    assert data['appointmentsByStatus']['completed'] == 1
+    assert data['appointmentsByStatus']['pending'] == 1
+    assert data['uniquePatients'] == 1
+    assert data['prescriptionsWritten'] == 1
+    assert data['rating'] == 4.0
+    assert data['ratingCount'] == 1
+
+
+def test_doctor_stats_rebuilt_lazily_for_legacy_data(client, app, db):
+    user_id = ObjectId()
+    doctor = Doctor.create(user_id, 'Dr. Legacy', 'Neurology', 'Delhi', [], 0, '')
+    db.appointments.insert_many([
+        {'doctor_id': doctor['_id'], 'patient_id': ObjectId(), 'status': 'completed',
+         'date': '2099-02-01', 'time': '9:00 AM'},
+        {'doctor_id': doctor['_id'], 'patient_id': ObjectId(), 'status': 'pending',
+         'date': '2099-02-02', 'time': '9:00 AM'},
+    ])
+
+    response = client.get(
+        '/api/analytics/doctor',
+        headers={'Authorization': f'Bearer {_doctor_token(app, user_id)}'},
+    )
+    assert response.status_code == 200, response.data
+    data = response.get_json()
+    assert data['totalAppointments'] == 2
+    assert data['uniquePatients'] == 2
+    assert db.doctor_stats.count_documents({'_id': doctor['_id']}) == 1
+
+
+def test_doctor_stats_rebuild_upserts_patient_pairs(app, db):
+    user_id = ObjectId()
+    doctor = Doctor.create(user_id, 'Dr. Pairs', 'Cardiology', 'Pune', [], 0, '')
+    patient = ObjectId()
+    Appointment.create(patient, doctor['_id'], 'Dr. Pairs', '2099-03-01', '9:00 AM')
+    # A pair left behind by an appointment that no longer exists.
+    db.doctor_patients.insert_one({'doctor_id': doctor['_id'], 'patient_id': ObjectId(),
+                                   'appointments': 1})
+
+    # Overlapping rebuilds (e.g. two first reads) must not hit the unique pair index.
+    DoctorStats.rebuild(doctor['_id'])
+    stats = DoctorStats.rebuild(doctor['_id'])
+
+    pairs = list(db.doctor_patients.find({'doctor_id': doctor['_id']}))
+    assert [(pair['patient_id'], pair['appointments']) for pair in pairs] == [(patient, 1)]
+    assert stats['unique_patients'] == 1
+    assert 'rating_sum' not in db.doctor_stats.find_one({'_id': doctor['_id']})
+
+
+def test_doctor_chart_reads_daily_rollups_for_range(client, app, db):
+    from datetime import datetime, timedelta
+
+    user_id = ObjectId()
+    doctor = Doctor.create(user_id, 'Dr. Chart', 'Dermatology', 'Goa', [], 0, '')
+    DoctorStats.get(doctor['_id'])
+
+    today = datetime.utcnow().date()
+    old_day = (today - timedelta(days=20)).strftime('%Y-%m-%d')
+    appt = Appointment.create(ObjectId(), doctor['_id'], 'Dr. Chart', old_day, '9:00 AM')
+    Appointment.create(ObjectId(), doctor['_id'], 'Dr. Chart', old_day, '9:30 AM')
+    Appointment.update_status(appt['_id'], 'confirmed')
+
+    rollup = db.daily_appointment_rollups.find_one({'doctor_id': doctor['_id'], 'date': old_day})
+    assert rollup['total'] == 2
+    assert rollup['status_counts'] == {'pending': 1, 'confirmed': 1}
+
+    headers = {'Authorization': f'Bearer {_doctor_token(app, user_id)}'}
+    week = client.get('/api/analytics/doctor/chart', headers=headers).get_json()
+    assert len(week['appointmentsData']) == 7
+    assert sum(day['appointments'] for day in week['appointmentsData']) == 0
+
+    month = client.get('/api/analytics/doctor/chart?range=30', headers=headers).get_json()
+    assert len(month['appointmentsData']) == 30
+    by_date = {day['date']: day['appointments'] for day in month['appointmentsData']}
+    assert by_date[old_day] == 2
+
+    response = client.get('/api/analytics/doctor/chart?range=14', headers=headers)
+    assert response.status_code == 400
+
+
+def test_patient_analytics_cached_and_invalidated_on_writes(client, app, db):
+    patient_id = ObjectId()
+    doctor_id = ObjectId()
+    with app.app_context():
+        token = create_access_token(
+            identity=json.dumps({'id': str(patient_id), 'role': 'patient'})
+        )
+    headers = {'Authorization': f'Bearer {token}'}
+
+    first = Appointment.create(patient_id, doctor_id, 'Dr. One', '2099-03-02', '9:00 AM')
+    Appointment.create(patient_id, doctor_id, 'Dr. One', '2099-03-01', '9:00 AM')
+    Appointment.update_status(first['_id'], 'completed')
+
+    data = client.get('/api/analytics/patient', headers=headers).get_json()
+    assert data['totalAppointments'] == 2
+    assert data['upcomingAppointments'] == 1
+    assert data['completedAppointments'] == 1
+    assert data['doctorsVisited'] == 1
+    assert data['prescriptionsReceived'] == 0
+    assert data['nextAppointment']['date'] == '2099-03-01'
+
+    # Raw writes bypass invalidation, so the cached payload is served.
+    db.appointments.insert_one({'patient_id': patient_id, 'doctor_id': doctor_id, 'status': 'pending'})
+    assert client.get('/api/analytics/patient', headers=headers).get_json()['totalAppointments'] == 2
+
+    # Model writes invalidate the patient's entry.
+    Prescription.create(doctor_id, patient_id, first['_id'], [{'name': 'A', 'dosage': '1'}])
+    data = client.get('/api/analytics/patient', headers=headers).get_json()
+    assert data['totalAppointments'] == 3
+    assert data['prescriptionsReceived'] == 1
+
+
+def _expire(cache, key):
+    """Age an entry past its TTL, keeping any stale window."""
+    import time
+
+    with cache._lock:
+        entry = cache._entries[key]
+        shift = entry.expires_at - time.monotonic() + 0.001
+        entry.expires_at -= shift
+        entry.stale_until -= shift
+
+
+def test_admin_stats_served_stale_while_refreshing(client, app, db):
+    from src.routes import admin
+
+    admin._stats_cache.clear()
+    admin_id = db.users.insert_one({'email': 'admin@example.com', 'role': 'admin'}).inserted_id
+    with app.app_context():
+        token = create_access_token(identity=json.dumps({'id': str(admin_id), 'role': 'admin'}))
+    headers = {'Authorization': f'Bearer {token}'}
+
+    db.doctors.insert_many([
+        {'name': 'A', 'verified': True, 'verification_status': 'approved'},
+        {'name': 'B', 'verified': False, 'verification_status': 'pending'},
+        {'name': 'C', 'verified': False, 'verification_status': 'rejected'},
+    ])
+    db.appointments.insert_many([
+        {'doctor_id': ObjectId(), 'date': '2099-04-01', 'time': '9:00 AM', 'status': status}
+        for status in ('completed', 'pending', 'cancelled')
+    ])
+
+    data = client.get('/api/admin/stats', headers=headers).get_json()
+    assert data['doctors'] == {'total': 3, 'verified': 1, 'pending': 1, 'rejected': 1}
+    assert data['appointments'] == {'total': 3, 'completed': 1, 'pending': 1}
+
+    db.appointments.insert_one(
+        {'doctor_id': ObjectId(), 'date': '2099-04-01', 'time': '9:00 AM', 'status': 'pending'}
+    )
+    # Fresh cache: the new appointment is not visible yet.
+    assert client.get('/api/admin/stats', headers=headers).get_json()['appointments']['total'] == 3
+
+    # Expired cache: the stale payload is returned and a refresh runs behind it.
+    _expire(admin._stats_cache, 'stats')
+    assert client.get('/api/admin/stats', headers=headers).get_json()['appointments']['total'] == 3
+    with admin._stats_cache._lock:
+        flight = admin._stats_cache._flights.get('stats')
+    if flight is not None:
+        assert flight.done.wait(timeout=5)
+    assert client.get('/api/admin/stats', headers=headers).get_json()['appointments']['pending'] == 2
+
+    caches = client.get('/api/admin/metrics', headers=headers).get_json()['caches']
+    assert caches['admin_stats']['stale_hits'] == 1
+
+
+def test_public_stats_prewarm_fills_cache(client, app, db):
+    import time
+    from src.routes import analytics
+
+    analytics._public_stats_cache.clear()
+    db.doctors.insert_one({'name': 'D', 'verified': True})
+
+    analytics.prewarm_public_stats(app)
+    deadline = time.monotonic() + 5
+    while analytics._public_stats_cache.get('public') is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert analytics._public_stats_cache.stats()['loads'] == 1
+
+    # Served from the pre-warmed entry.
+    db.doctors.insert_one({'name': 'E', 'verified': True})
+    assert client.get('/api/analytics/public-stats').get_json()['licensedDoctors'] == 1
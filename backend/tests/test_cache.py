@@ -0,0 +1,157 @@
+import threading
+import time
+
+import pytest
+
+from src.utils.cache import TTLCache, cache_stats
+
+
+def _expire(cache, key):
+    """Age an entry past its TTL, keeping any stale window."""
+    with cache._lock:
+        entry = cache._entries[key]
+        shift = entry.expires_at - time.monotonic() + 0.001
+        entry.expires_at -= shift
+        entry.stale_until -= shift
+
+
+def test_lru_eviction_keeps_recently_used_entries():
+    cache = TTLCache('test_lru', max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['size'] == 2
+
+
+def test_expired_entries_are_dropped_without_stale_window():
+    cache = TTLCache('test_ttl', ttl_seconds=60)
+    cache.set('a', 1)
+    _expire(cache, 'a')
+
+    assert cache.get('a') is None
+    assert cache.get_or_load('a', lambda: 2) == 2
+    assert cache.stats()['loads'] == 1
+
+
+def test_single_flight_loads_once_for_concurrent_callers():
+    cache = TTLCache('test_single_flight')
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(timeout=5)
+        return 'value'
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_load('k', loader)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert results == ['value'] * 8
+    assert len(calls) == 1
+
+
+def test_loader_errors_propagate_and_are_not_cached():
+    cache = TTLCache('test_errors')
+
+    def failing():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load('k', failing)
+    assert cache.get_or_load('k', lambda: 'ok') == 'ok'
+    assert cache.stats()['load_errors'] == 1
+
+
+def test_stale_entries_served_while_refreshing_in_background():
+    cache = TTLCache('test_swr', stale_seconds=60)
+    cache.set('k', 'old')
+    _expire(cache, 'k')
+    release = threading.Event()
+
+    def loader():
+        release.wait(timeout=5)
+        return 'new'
+
+    assert cache.get_or_load('k', loader) == 'old'
+    assert cache.get_or_load('k', loader) == 'old'
+    with cache._lock:
+        flight = cache._flights['k']
+    release.set()
+    assert flight.done.wait(timeout=5)
+
+    assert cache.get_or_load('k', loader) == 'new'
+    assert cache.stats()['stale_hits'] == 2
+    assert cache.stats()['loads'] == 1
+
+
+def test_invalidate_by_key_and_prefix():
+    cache = TTLCache('test_invalidate')
+    cache.set('doc1:7', 1)
+    cache.set('doc1:30', 2)
+    cache.set('doc2:7', 3)
+
+    assert cache.invalidate('doc2:7') is True
+    assert cache.invalidate('missing') is False
+    assert cache.invalidate_prefix('doc1:') == 2
+    assert cache.stats()['size'] == 0
+    assert cache_stats()['test_invalidate']['invalidations'] == 3
+
+
+def test_failed_load_keeps_a_newer_flight_after_invalidation():
+    cache = TTLCache('test_flight_ownership')
+    first_started, fail_first = threading.Event(), threading.Event()
+    second_started, finish_second = threading.Event(), threading.Event()
+    calls = []
+
+    def failing():
+        first_started.set()
+        fail_first.wait(timeout=5)
+        raise RuntimeError('boom')
+
+    def slow():
+        calls.append(1)
+        second_started.set()
+        finish_second.wait(timeout=5)
+        return 'fresh'
+
+    def expect_error():
+        with pytest.raises(RuntimeError):
+            cache.get_or_load('k', failing)
+
+    first = threading.Thread(target=expect_error)
+    first.start()
+    first_started.wait(timeout=5)
+    cache.invalidate('k')
+    results = []
+    second = threading.Thread(target=lambda: results.append(cache.get_or_load('k', slow)))
+    second.start()
+    second_started.wait(timeout=5)
+    fail_first.set()
+    first.join(timeout=5)
+
+    # The failed load must not drop the second flight, or this caller would load again.
+    third = threading.Thread(target=lambda: results.append(cache.get_or_load('k', slow)))
+    third.start()
+    time.sleep(0.05)
+    finish_second.set()
+    for thread in (second, third):
+        thread.join(timeout=5)
+
+    assert results == ['fresh', 'fresh']
+    assert len(calls) == 1
+    assert cache.get_or_load('k', slow) == 'fresh'
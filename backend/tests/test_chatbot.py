@@ -0,0 +1,515 @@
+import json
+
+import pytest
+from flask_jwt_extended import create_access_token
+from langchain_core.messages import AIMessageChunk
+
+from src.models.chat_history import ChatHistory
+from src.services import chatbot_service
+from src.utils import metrics
+
+USER_ID = '507f1f77bcf86cd799439012'
+
+
+class _StreamingLLM:
+    def __init__(self, chunks, fail_after=None):
+        self.chunks = chunks
+        self.fail_after = fail_after
+
+    def stream(self, messages):
+        for index, text in enumerate(self.chunks):
+            if self.fail_after is not None and index == self.fail_after:
+                raise RuntimeError('model connection dropped')
+            yield AIMessageChunk(content=text)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_response_cache():
+    chatbot_service._response_cache.invalidate_prefix('')
+    yield
+    chatbot_service._response_cache.invalidate_prefix('')
+
+
+@pytest.fixture
+def auth_headers(app):
+    token = create_access_token(identity=json.dumps({'id': USER_ID, 'role': 'patient'}))
+    return {'Authorization': f'Bearer {token}'}
+
+
+def _sse_events(body):
+    events = []
+    for block in body.decode().strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_stream_relays_tokens_and_persists_final_message(client, app, auth_headers, monkeypatch):
+    app.config['CHATBOT_RATE_LIMIT_USE_DB'] = False
+    monkeypatch.setattr(
+        chatbot_service, 'create_chat_model', lambda: _StreamingLLM(['See a ', 'neurologist', '.'])
+    )
+    monkeypatch.setattr(chatbot_service, 'get_doctors_context', lambda query='': 'No doctors.')
+    metrics.reset()
+
+    response = client.post(
+        '/api/chatbot/message/stream', json={'message': 'I get migraines'}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events = _sse_events(response.data)
+    assert [event for event, _ in events] == ['token', 'token', 'token', 'done']
+    assert events[-1][1]['response'] == 'See a neurologist.'
+
+    history = ChatHistory.get_messages(USER_ID)
+    assert [(m['role'], m['content']) for m in history] == [
+        ('user', 'I get migraines'),
+        ('assistant', 'See a neurologist.'),
+    ]
+    histograms = metrics.snapshot()['histograms']
+    assert histograms['chatbot.time_to_first_token_seconds']['count'] == 1
+    assert histograms['chatbot.response_seconds']['count'] == 1
+
+
+def test_failed_stream_sends_error_event_and_stores_nothing(client, app, auth_headers, monkeypatch):
+    app.config['CHATBOT_RATE_LIMIT_USE_DB'] = False
+    monkeypatch.setattr(
+        chatbot_service, 'create_chat_model', lambda: _StreamingLLM(['Partial', 'reply'], fail_after=1)
+    )
+    monkeypatch.setattr(chatbot_service, 'get_doctors_context', lambda query='': 'No doctors.')
+
+    response = client.post('/api/chatbot/message/stream', json={'message': 'Hi'}, headers=auth_headers)
+    events = _sse_events(response.data)
+    assert [event for event, _ in events] == ['token', 'error']
+    assert ChatHistory.get_messages(USER_ID) == []
+
+
+def test_stream_validates_before_streaming(client, auth_headers):
+    response = client.post('/api/chatbot/message/stream', json={'message': '  '}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def _seed_history(db, count, **extra):
+    from bson import ObjectId
+    db.chat_history.insert_one(dict({
+        'user_id': ObjectId(USER_ID),
+        'messages': [
+            {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f'message {i}'}
+            for i in range(count)
+        ],
+        'message_count': count,
+    }, **extra))
+
+
+class _SummaryLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, messages):
+        self.prompts.append(messages[-1].content)
+        return AIMessageChunk(content=f'summary #{len(self.prompts)}')
+
+
+def test_context_reads_bounded_tail_within_token_budget(app, db):
+    from src.services.chat_context import build_context
+
+    app.config.update(CHATBOT_CONTEXT_TURNS=3, CHATBOT_SUMMARY_BATCH_MESSAGES=4)
+    _seed_history(db, 150)
+    context = build_context(USER_ID)
+    assert [m['content'] for m in context.messages] == [f'message {i}' for i in range(140, 150)]
+    assert context.pending == 144
+
+    app.config['CHATBOT_CONTEXT_TOKEN_BUDGET'] = 12
+    trimmed = build_context(USER_ID)
+    assert [m['content'] for m in trimmed.messages] == ['message 146', 'message 147', 'message 148', 'message 149']
+
+
+def test_rolling_summary_folds_old_turns_incrementally(app, db):
+    from src.services.chat_context import build_context, summarize_older_turns
+
+    app.config.update(CHATBOT_CONTEXT_TURNS=2, CHATBOT_SUMMARY_BATCH_MESSAGES=4)
+    _seed_history(db, 10)
+    llm = _SummaryLLM()
+
+    assert summarize_older_turns(USER_ID, llm) == 'summary #1'
+    assert 'message 0' in llm.prompts[0] and 'message 5' in llm.prompts[0]
+    assert 'message 6' not in llm.prompts[0]
+
+    context = build_context(USER_ID)
+    assert context.summary == 'summary #1'
+    assert [m['content'] for m in context.messages] == [f'message {i}' for i in range(6, 10)]
+    # Nothing new has left the verbatim window yet.
+    assert summarize_older_turns(USER_ID, llm) is None
+
+    from src.models.chat_history import ChatHistory
+    for i in range(10, 14):
+        ChatHistory.add_message(USER_ID, 'user', f'message {i}')
+    assert summarize_older_turns(USER_ID, llm) == 'summary #2'
+    assert 'Previous summary:\nsummary #1' in llm.prompts[1]
+    assert 'message 6' in llm.prompts[1] and 'message 9' in llm.prompts[1]
+    assert 'message 5' not in llm.prompts[1]
+
+
+def test_background_summary_runs_on_the_llm_executor(app, db, monkeypatch):
+    import time
+    from src.services import llm_executor
+
+    app.config.update(CHATBOT_CONTEXT_TURNS=2, CHATBOT_SUMMARY_BATCH_MESSAGES=4)
+    _seed_history(db, 10)
+    metrics.reset()
+
+    monkeypatch.setitem(llm_executor._pending, 'count', 10_000)
+    assert chatbot_service._schedule_summary(USER_ID, _SummaryLLM()) is None
+    assert metrics.snapshot()['counters']['chatbot.summaries_deferred'] == 1
+    monkeypatch.setitem(llm_executor._pending, 'count', 0)
+
+    future = chatbot_service._schedule_summary(USER_ID, _SummaryLLM())
+    future.result(timeout=10)
+    deadline = time.monotonic() + 10
+    while ChatHistory.get_context_window(USER_ID, 1)['summary'] != 'summary #1':
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert 'llm.exec_seconds.chat_summary' in metrics.snapshot()['histograms']
+
+
+def test_prompt_size_stays_flat_as_history_grows(app, db, monkeypatch):
+    monkeypatch.setattr(chatbot_service, 'get_doctors_context', lambda query='': 'No doctors.')
+    app.config.update(CHATBOT_CONTEXT_TURNS=3, CHATBOT_SUMMARY_BATCH_MESSAGES=4)
+    _seed_history(db, 200, summary='Patient reported migraines.', summary_through=190)
+
+    messages, context = chatbot_service._build_prompt(USER_ID, 'Any update?')
+    assert 'Patient reported migraines.' in messages[0].content
+    assert len(messages) == 1 + 10 + 1
+
+
+def test_doctor_context_is_top_k_relevant_doctors(app, db):
+    from bson import ObjectId
+    from src.models.doctor import Doctor
+
+    app.config['CHATBOT_DOCTORS_TOP_K'] = 3
+    for i in range(20):
+        Doctor.create(ObjectId(), f'Derm {i}', 'Dermatology', 'Pune', [], 0, '')
+    Doctor.create(ObjectId(), 'Heart Pune', 'Cardiology', 'Pune', [], 0, '')
+    Doctor.create(ObjectId(), 'Heart Goa', 'Cardiology', 'Goa', [], 0, '')
+    Doctor.create(ObjectId(), 'Family', 'General Practice', 'Goa', [], 0, '')
+
+    context = chatbot_service.get_doctors_context('I have chest pain and palpitations, I live in Goa')
+    lines = context.splitlines()
+    assert len(lines) == 3
+    assert lines[0].startswith('- Dr. Heart Goa: Cardiology')
+    assert 'Heart Pune' in context
+
+    assert 'Dermatology' in chatbot_service.get_doctors_context('itchy skin rashes')
+    # Nothing matches: fall back to general practice.
+    assert chatbot_service.get_doctors_context('hello there').startswith('- Dr. Family')
+
+
+def test_symptom_table_covers_registrable_specialties():
+    from src.routes.auth import VALID_SPECIALTIES
+    from src.services.symptom_specialties import SPECIALTY_SYMPTOMS
+
+    assert set(SPECIALTY_SYMPTOMS) == set(VALID_SPECIALTIES)
+
+
+def test_triage_scores_routing_questions():
+    from src.services.triage import triage
+
+    confident = triage('I have a skin rash and itching, which doctor should I see?')
+    assert confident.specialty == 'Dermatology'
+    assert confident.confidence >= 0.7
+
+    assert triage('I have a headache.').confidence < 0.7
+    assert triage('Tell me about my appointment').specialty is None
+
+    emergency = triage('My father is unconscious, which doctor should I see?')
+    assert emergency.specialty == 'Emergency Medicine'
+    assert emergency.confidence >= 0.7
+
+
+@pytest.mark.parametrize('message', [
+    'Is there an emergency contact number for the clinic?',
+    'How can I prevent food poisoning when travelling?',
+    'what is the difference between a heart attack and cardiac arrest?',
+    'I had a small accident two years ago and my knee still hurts, which doctor should I see?',
+    'My father is unconscious after a fall',
+    'I feel suicidal, who should I see?',
+    'I took an overdose, which doctor should I see?',
+])
+def test_triage_does_not_answer_emergencies_without_a_routing_question(message):
+    from src.services.triage import triage
+
+    assert triage(message).confidence < 0.7
+
+
+def test_confident_routing_question_skips_the_llm(client, app, db, auth_headers, monkeypatch):
+    from bson import ObjectId
+    from src.models.doctor import Doctor
+
+    app.config['CHATBOT_RATE_LIMIT_USE_DB'] = False
+    Doctor.create(ObjectId(), 'Skin', 'Dermatology', 'Pune', [], 0, '')
+    Doctor.create(ObjectId(), 'Heart', 'Cardiology', 'Pune', [], 0, '')
+
+    def _no_llm():
+        raise AssertionError('LLM should not be called')
+
+    monkeypatch.setattr(chatbot_service, 'create_chat_model', _no_llm)
+    metrics.reset()
+
+    message = 'I have a skin rash and itching, which doctor should I see?'
+    response = client.post('/api/chatbot/message', json={'message': message}, headers=auth_headers)
+    assert response.status_code == 200
+    reply = response.get_json()['response']
+    assert 'Dr. Skin' in reply and 'Dr. Heart' not in reply
+
+    history = ChatHistory.get_messages(USER_ID)
+    assert [(m['role'], m['content']) for m in history] == [('user', message), ('assistant', reply)]
+    assert metrics.snapshot()['counters']['chatbot.triage.hits'] == 1
+
+
+def test_self_harm_message_is_answered_by_the_llm(app, db, monkeypatch):
+    from src.services.triage import triage
+
+    class _LLM:
+        def invoke(self, messages):
+            return AIMessageChunk(content='Please reach out to a crisis line now.')
+
+    assert triage('I feel suicidal, who should I see?').specialty is None
+    monkeypatch.setattr(chatbot_service, 'create_chat_model', lambda: _LLM())
+    monkeypatch.setattr(chatbot_service, 'get_doctors_context', lambda query='': 'No doctors.')
+
+    reply = chatbot_service.process_message(USER_ID, 'I feel suicidal, who should I see?')
+    assert reply == 'Please reach out to a crisis line now.'
+
+
+def test_uncertain_message_is_deferred_to_the_llm(app, db, monkeypatch):
+    class _LLM:
+        def invoke(self, messages):
+            return AIMessageChunk(content='Tell me more.')
+
+    monkeypatch.setattr(chatbot_service, 'create_chat_model', lambda: _LLM())
+    monkeypatch.setattr(chatbot_service, 'get_doctors_context', lambda query='': 'No doctors.')
+    metrics.reset()
+
+    assert chatbot_service.process_message(USER_ID, 'I have a headache.') == 'Tell me more.'
+    assert metrics.snapshot()['counters']['chatbot.triage.misses'] == 1
+
+
+class _CountingLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return AIMessageChunk(content=f'answer #{self.calls}')
+
+
+def test_first_turn_answers_are_reused_for_normalized_questions(app, db, monkeypatch):
+    from bson import ObjectId
+    from src.models.doctor import Doctor
+    from src.models.rating import Rating
+
+    llm = _CountingLLM()
+    monkeypatch.setattr(chatbot_service, 'create_chat_model', lambda: llm)
+    other_user = '507f1f77bcf86cd799439013'
+
+    assert chatbot_service.process_message(USER_ID, 'What doctor for migraine') == 'answer #1'
+    assert chatbot_service.process_message(other_user, 'what  doctor for Migraines?') == 'answer #1'
+    assert llm.calls == 1
+    assert [m['content'] for m in ChatHistory.get_messages(other_user)] == [
+        'what  doctor for Migraines?', 'answer #1',
+    ]
+
+    # Follow-up turns depend on the conversation and are never cached.
+    assert chatbot_service.process_message(USER_ID, 'What doctor for migraine') == 'answer #2'
+
+    # A directory change drops answers that recommend the old doctors.
+    heart = Doctor.create(ObjectId(), 'Heart', 'Cardiology', 'Pune', [], 0, '')
+    assert chatbot_service.process_message(
+        '507f1f77bcf86cd799439014', 'what doctor for migraine'
+    ) == 'answer #3'
+
+    # Reviews only matter once they change a rating rounded to whole stars.
+    Rating.create(ObjectId(), heart['_id'], None, 4)
+    assert chatbot_service.process_message(
+        '507f1f77bcf86cd799439015', 'what doctor for migraine'
+    ) == 'answer #4'
+    Rating.create(ObjectId(), heart['_id'], None, 4)
+    assert chatbot_service.process_message(
+        '507f1f77bcf86cd799439016', 'what doctor for migraine'
+    ) == 'answer #4'
+    assert llm.calls == 4
+
+
+def test_llm_bulkhead_times_out_and_rejects_when_full(client, app, auth_headers, monkeypatch):
+    import threading
+    import time
+    from src.services import llm_executor
+
+    app.config.update(
+        CHATBOT_RATE_LIMIT_USE_DB=False, LLM_MAX_CONCURRENCY=1, LLM_MAX_QUEUE=0,
+        LLM_RETRY_AFTER_SECONDS=7,
+    )
+    monkeypatch.setattr(chatbot_service, 'create_chat_model', lambda: _CountingLLM())
+    monkeypatch.setattr(chatbot_service, 'get_doctors_context', lambda query='': 'No doctors.')
+    metrics.reset()
+    release = threading.Event()
+    try:
+        with pytest.raises(llm_executor.LLMTimeoutError):
+            llm_executor.call('test', release.wait, timeout=0.05)
+        # The stuck call still holds the only worker.
+        response = client.post('/api/chatbot/message', json={'message': 'Hello'}, headers=auth_headers)
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '7'
+    finally:
+        release.set()
+    deadline = time.monotonic() + 2
+    while llm_executor._pending['count'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    response = client.post('/api/chatbot/message', json={'message': 'Hello'}, headers=auth_headers)
+    assert response.get_json()['response'] == 'answer #1'
+    snapshot = metrics.snapshot()
+    assert snapshot['counters']['llm.rejected.chatbot'] == 1
+    assert snapshot['counters']['llm.timeouts.test'] == 1
+    assert snapshot['histograms']['llm.queue_wait_seconds.chatbot']['count'] == 1
+    assert snapshot['histograms']['llm.exec_seconds.chatbot']['count'] == 1
+
+
+def _use_fake_provider(app, **overrides):
+    app.config.update(
+        dict(
+            LLM_PROVIDER='fake', LLM_FAKE_LATENCY_MEDIAN_MS=0, LLM_FAKE_TOKEN_DELAY_MS=0,
+            LLM_FAKE_REPLY_TOKENS=5, LLM_FAKE_FAILURE_RATE=0,
+        ),
+        **overrides,
+    )
+
+
+def test_fake_provider_streams_deterministic_replies(client, app, auth_headers):
+    app.config['CHATBOT_RATE_LIMIT_USE_DB'] = False
+    _use_fake_provider(app)
+
+    llm = chatbot_service.create_chat_model()
+    assert llm is chatbot_service.create_chat_model()
+    from langchain_core.messages import HumanMessage
+    prompt = [HumanMessage(content='Hello')]
+    assert llm.invoke(prompt).content == ''.join(chunk.content for chunk in llm.stream(prompt))
+
+    response = client.post('/api/chatbot/message/stream', json={'message': 'Hello'}, headers=auth_headers)
+    events = _sse_events(response.data)
+    assert [event for event, _ in events] == ['token'] * 5 + ['done']
+    assert ChatHistory.get_messages(USER_ID)[-1]['content'] == events[-1][1]['response']
+
+
+def test_fake_provider_injects_failures(client, app, auth_headers):
+    app.config['CHATBOT_RATE_LIMIT_USE_DB'] = False
+    _use_fake_provider(app, LLM_FAKE_FAILURE_RATE=1)
+
+    response = client.post('/api/chatbot/message', json={'message': 'Hello'}, headers=auth_headers)
+    assert response.status_code == 500
+    response = client.post('/api/chatbot/message/stream', json={'message': 'Hello'}, headers=auth_headers)
+    assert _sse_events(response.data)[-1][0] == 'error'
+    assert ChatHistory.get_messages(USER_ID) == []
+
+
+def test_unknown_provider_is_reported_as_unavailable(client, app, auth_headers):
+    app.config.update(CHATBOT_RATE_LIMIT_USE_DB=False, LLM_PROVIDER='nope')
+    response = client.post('/api/chatbot/message', json={'message': 'Hello'}, headers=auth_headers)
+    assert response.status_code == 503
+
+
+def test_chatbot_rate_limit_uses_one_counter_per_window(client, app, db, monkeypatch):
+    from src.routes import chatbot as chatbot_routes
+
+    user_id = '507f1f77bcf86cd799439015'
+    token = create_access_token(identity=json.dumps({'id': user_id, 'role': 'patient'}))
+    headers = {'Authorization': f'Bearer {token}'}
+    app.config.update(
+        CHATBOT_RATE_LIMIT_USE_DB=True, CHATBOT_RATE_LIMIT_MAX_MESSAGES=3,
+        CHATBOT_RATE_LIMIT_WINDOW_SECONDS=24 * 60 * 60,
+    )
+    monkeypatch.setattr(chatbot_service, 'create_chat_model', lambda: _CountingLLM())
+    monkeypatch.setattr(chatbot_service, 'get_doctors_context', lambda query='': 'No doctors.')
+    metrics.reset()
+
+    statuses = [
+        client.post('/api/chatbot/message', json={'message': f'Hello {i}'}, headers=headers).status_code
+        for i in range(5)
+    ]
+    assert statuses == [200, 200, 200, 429, 429]
+
+    counters = list(db.chatbot_rate_limits.find({'user_id': user_id}))
+    assert len(counters) == 1
+    # The fifth message was rejected in-process without touching the counter.
+    assert counters[0]['count'] == 4
+    assert metrics.snapshot()['counters']['chatbot.rate_limit.local_rejections'] == 1
+    assert user_id in chatbot_routes._over_limit_until
+
+
+def test_turns_are_single_writes_into_fixed_size_buckets(app, db, monkeypatch):
+    monkeypatch.setattr(ChatHistory, 'BUCKET_SIZE', 4)
+    monkeypatch.setattr(ChatHistory, '_MAX_MESSAGES', 8)
+    for turn in range(7):
+        ChatHistory.add_turn(USER_ID, f'question {turn}', f'answer {turn}')
+
+    buckets = list(db.chat_history_buckets.find().sort('seq', 1))
+    # Retention keeps the newest full buckets plus the open one.
+    assert [(b['seq'], b['start'], b['count'], b['open']) for b in buckets] == [
+        (1, 4, 4, False), (2, 8, 4, False), (3, 12, 2, True),
+    ]
+    window = ChatHistory.get_context_window(USER_ID, 3)
+    assert window['message_count'] == 14
+    assert [m['content'] for m in window['messages']] == ['answer 5', 'question 6', 'answer 6']
+
+
+def test_history_pages_backwards_through_buckets(client, app, auth_headers, monkeypatch):
+    monkeypatch.setattr(ChatHistory, 'BUCKET_SIZE', 4)
+    for turn in range(5):
+        ChatHistory.add_turn(USER_ID, f'question {turn}', f'answer {turn}')
+
+    pages = []
+    cursor = None
+    while True:
+        query = f'?limit=2&cursor={cursor}' if cursor else '?limit=2'
+        body = client.get(f'/api/chatbot/history{query}', headers=auth_headers).get_json()
+        pages.append([m['content'] for m in body['history']])
+        cursor = body['nextCursor']
+        if cursor is None:
+            break
+    assert pages == [
+        ['question 4', 'answer 4'],
+        ['question 2', 'answer 2', 'question 3', 'answer 3'],
+        ['question 0', 'answer 0', 'question 1', 'answer 1'],
+    ]
+    # Smaller pages still return whole buckets until the limit is reached.
+    body = client.get('/api/chatbot/history?limit=3', headers=auth_headers).get_json()
+    assert len(body['history']) == 6
+
+
+def test_legacy_history_moves_into_buckets_on_next_turn(app, db):
+    _seed_history(db, 6, summary='Earlier.', summary_through=2)
+    assert len(ChatHistory.get_messages(USER_ID)) == 6
+
+    ChatHistory.add_turn(USER_ID, 'new question', 'new answer')
+    assert [m['content'] for m in ChatHistory.get_messages(USER_ID)][-3:] == [
+        'message 5', 'new question', 'new answer',
+    ]
+    window = ChatHistory.get_context_window(USER_ID, 10)
+    assert window['message_count'] == 8
+    assert window['summary'] == 'Earlier.' and window['summary_through'] == 2
+    assert 'messages' not in db.chat_history.find_one({})
+
+
+def test_concurrent_legacy_migration_appends_after_the_moved_buckets(app, db, monkeypatch):
+    monkeypatch.setattr(ChatHistory, 'BUCKET_SIZE', 4)
+    _seed_history(db, 6)
+    legacy = db.chat_history.find_one({})['messages']
+    user_id = ChatHistory._oid(USER_ID)
+    # Another request has moved the messages but not yet cleared the array
+    # when this one, which also found no buckets, starts the migration.
+    ChatHistory._insert_buckets(user_id, legacy, 0, 0)
+    assert ChatHistory._start_history(user_id) is True
+
+    ChatHistory.add_turn(USER_ID, 'new question', 'new answer')
+    contents = [m['content'] for m in ChatHistory.get_messages(USER_ID)]
+    assert contents == [f'message {i}' for i in range(6)] + ['new question', 'new answer']
@@ -0,0 +1,73 @@
+import json
+from bson import ObjectId
+from flask_jwt_extended import create_access_token
+
+from src import invalidation
+from src.models.appointment import Appointment
+from src.models.doctor import Doctor
+from src.models.doctor_stats import DoctorStats
+from src.services import chatbot_service
+
+
+def test_publish_dispatches_string_ids_to_subscribers(app):
+    received = []
+    handler = invalidation.subscribe('test.event', received.append)
+    try:
+        doctor_id = ObjectId()
+        invalidation.publish('test.event', doctor_id=doctor_id, patient_id=None)
+    finally:
+        invalidation._handlers['test.event'].remove(handler)
+    assert received == [{'doctor_id': str(doctor_id)}]
+
+
+def test_confirming_appointment_evicts_doctor_chart(client, app, db):
+    from datetime import datetime
+
+    user_id = ObjectId()
+    doctor = Doctor.create(user_id, 'Dr. Bus', 'Cardiology', 'Pune', [], 0, '')
+    DoctorStats.get(doctor['_id'])
+    with app.app_context():
+        token = create_access_token(identity=json.dumps({'id': str(user_id), 'role': 'doctor'}))
+    headers = {'Authorization': f'Bearer {token}'}
+
+    today = datetime.utcnow().strftime('%Y-%m-%d')
+    appt = Appointment.create(ObjectId(), doctor['_id'], 'Dr. Bus', today, '9:00 AM')
+    chart = client.get('/api/analytics/doctor/chart', headers=headers).get_json()
+    assert chart['statusData'][1] == {'name': 'Pending', 'value': 100, 'color': '#F59E0B'}
+
+    # Served from cache until a model write for this doctor evicts it.
+    other = Doctor.create(ObjectId(), 'Dr. Other', 'Neurology', 'Goa', [], 0, '')
+    Appointment.create(ObjectId(), other['_id'], 'Dr. Other', today, '9:00 AM')
+    from src.routes.analytics import _doctor_chart_cache
+    assert _doctor_chart_cache.get(f"{doctor['_id']}:7") is not None
+
+    Appointment.update_status(appt['_id'], 'confirmed')
+    assert _doctor_chart_cache.get(f"{doctor['_id']}:7") is None
+    chart = client.get('/api/analytics/doctor/chart', headers=headers).get_json()
+    assert chart['statusData'][0]['value'] == 100
+
+
+def test_doctor_changes_evict_chatbot_doctors_context(app, db):
+    doctor = Doctor.create(ObjectId(), 'Dr. Context', 'Dermatology', 'Goa', [], 0, '')
+    assert 'Dr. Dr. Context' in chatbot_service.get_doctors_context()
+
+    Doctor.update(doctor['_id'], {'location': 'Mumbai'})
+    assert 'Mumbai' in chatbot_service.get_doctors_context()
+
+
+def test_mongo_backend_broadcasts_events(app, db):
+    received = []
+    handler = invalidation.subscribe('test.broadcast', received.append)
+    previous = invalidation._backend['name']
+    invalidation._backend['name'] = 'mongo'
+    try:
+        doctor_id = ObjectId()
+        invalidation.publish('test.broadcast', doctor_id=doctor_id)
+    finally:
+        invalidation._backend['name'] = previous
+        invalidation._handlers['test.broadcast'].remove(handler)
+
+    assert received == [{'doctor_id': str(doctor_id)}]
+    event = db.cache_invalidations.find_one({'event': 'test.broadcast'})
+    assert event['payload'] == {'doctor_id': str(doctor_id)}
+    assert event['origin'] == invalidation._ORIGIN
@@ -15,3 +15,196 @@ def test_endpoint_latency(client):
     # This is a unit test on a mock app, so it measures overhead of Flask + Mock DB, not real DB.
     # But still useful validation of code path speed.
     assert latency < 500 # 500ms limit for unit test execution of login path
+
+
+@pytest.mark.slow
+def test_patient_dashboard_latency_with_1k_appointments(client, app, db):
+    """Benchmark patient analytics at 1k appointments: cold ($facet) vs cached."""
+    import json
+    from bson import ObjectId
+    from flask_jwt_extended import create_access_token
+    from src.utils.analytics_cache import invalidate_patient_analytics
+
+    patient_id = ObjectId()
+    statuses = ['pending', 'confirmed', 'completed', 'cancelled', 'rejected']
+    db.appointments.insert_many([
+        {
+            'patient_id': patient_id,
+            'doctor_id': ObjectId(),
+            'doctor_name': 'Dr. Bench',
+            'status': statuses[i % len(statuses)],
+            'date': f"2099-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}",
+            'time': '9:00 AM',
+        }
+        for i in range(1000)
+    ])
+    with app.app_context():
+        token = create_access_token(
+            identity=json.dumps({'id': str(patient_id), 'role': 'patient'})
+        )
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def timed_get():
+        start = time.perf_counter()
+        response = client.get('/api/analytics/patient', headers=headers)
+        assert response.status_code == 200
+        return (time.perf_counter() - start) * 1000
+
+    cold = []
+    for _ in range(5):
+        invalidate_patient_analytics(patient_id)
+        cold.append(timed_get())
+    warm = [timed_get() for _ in range(20)]
+
+    cold_ms = sorted(cold)[len(cold) // 2]
+    warm_ms = sorted(warm)[len(warm) // 2]
+    print(f"\npatient dashboard @1k appointments: cold p50={cold_ms:.1f}ms cached p50={warm_ms:.1f}ms")
+    assert warm_ms < cold_ms
+
+
+@pytest.mark.slow
+def test_report_render_time_and_allocations_with_shared_template():
+    """Benchmark per-PDF render cost: template rebuilt per render vs built once."""
+    import tracemalloc
+    from src.services import report_service
+
+    payload = {
+        'prescription': {
+            'diagnosis': 'Seasonal allergic rhinitis',
+            'notes': 'Review in two weeks.',
+            'medications': [
+                {'name': f'Medication {i}', 'dosage': '10mg', 'frequency': 'Once daily',
+                 'duration': '14 days', 'instructions': 'Take after food with water'}
+                for i in range(5)
+            ],
+        },
+        'patient_name': 'Bench Patient',
+        'patient_email': 'bench@example.com',
+        'doctor_name': 'Bench',
+        'doctor_specialty': 'General Practice',
+        'appointment_date': '2099-01-01',
+        'ai_summary': 'Summary text for the benchmark report.',
+    }
+
+    def measure(rebuild_template, runs=20):
+        times, allocated = [], []
+        for _ in range(runs):
+            if rebuild_template:
+                # What every render paid before templates were shared.
+                report_service._template.cache_clear()
+            tracemalloc.start()
+            start = time.perf_counter()
+            report_service.render_report('prescription', payload)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            times.append(elapsed * 1000)
+            allocated.append(peak)
+        return sorted(times)[runs // 2], sorted(allocated)[runs // 2]
+
+    measure(False, runs=3)  # import and font warm-up
+    before_ms, before_peak = measure(True)
+    after_ms, after_peak = measure(False)
+    print(
+        f"\nprescription PDF: per-render template p50={before_ms:.1f}ms peak={before_peak / 1024:.0f}KiB"
+        f" | shared template p50={after_ms:.1f}ms peak={after_peak / 1024:.0f}KiB"
+    )
+    assert after_peak < before_peak
+
+
+@pytest.mark.slow
+def test_chatbot_throughput_with_fake_provider(app):
+    """Benchmark the chatbot routes offline: rate limiting, history writes and streaming."""
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+    from bson import ObjectId
+    from flask_jwt_extended import create_access_token
+
+    app.config.update(
+        LLM_PROVIDER='fake', LLM_FAKE_LATENCY_MEDIAN_MS=50, LLM_FAKE_TOKEN_DELAY_MS=1,
+        LLM_FAKE_REPLY_TOKENS=40, LLM_FAKE_FAILURE_RATE=0.02, LLM_MAX_CONCURRENCY=8,
+        CHATBOT_RESPONSE_CACHE_ENABLED=False, CHATBOT_RATE_LIMIT_MAX_MESSAGES=1000,
+    )
+    headers = [
+        {'Authorization': 'Bearer ' + create_access_token(
+            identity=json.dumps({'id': str(ObjectId()), 'role': 'patient'})
+        )}
+        for _ in range(16)
+    ]
+
+    def conversation(index):
+        client = app.test_client()
+        latencies, failures = [], 0
+        for turn in range(5):
+            path = '/api/chatbot/message/stream' if turn % 2 else '/api/chatbot/message'
+            start = time.perf_counter()
+            response = client.post(
+                path, json={'message': f'I have had a cough for {turn + 1} days'},
+                headers=headers[index],
+            )
+            body = response.get_data()
+            latencies.append((time.perf_counter() - start) * 1000)
+            failures += response.status_code != 200 or b'event: error' in body
+        return latencies, failures
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(headers)) as executor:
+        results = list(executor.map(conversation, range(len(headers))))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(ms for turn_latencies, _ in results for ms in turn_latencies)
+    failures = sum(failed for _, failed in results)
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[int(len(latencies) * 0.95)]
+    print(
+        f"\nchatbot, fake provider, 16 users x 5 turns: {len(latencies) / elapsed:.1f} msg/s "
+        f"p50={p50:.0f}ms p95={p95:.0f}ms failed={failures}"
+    )
+    assert failures < len(latencies) // 4
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('workers', [0, 2])
+def test_login_throughput_and_concurrent_request_latency(client, app, db, workers):
+    """Benchmark logins/sec and non-auth latency during a login burst, inline vs process pool."""
+    import os
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from src.models.user import User
+
+    app.config.update(PASSWORD_HASH_METHOD='scrypt:32768:8:1', PASSWORD_HASH_WORKERS=workers)
+    User.create('bench@test.com', 'password123', 'patient')
+    client.post('/api/auth/login', json={'email': 'bench@test.com', 'password': 'password123'})
+
+    stop = threading.Event()
+    other_latencies = []
+
+    def other_requests():
+        other = app.test_client()
+        while not stop.is_set():
+            start = time.perf_counter()
+            other.get('/api/auth/specialties')
+            other_latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.005)
+
+    def login(_):
+        response = app.test_client().post(
+            '/api/auth/login', json={'email': 'bench@test.com', 'password': 'password123'}
+        )
+        assert response.status_code == 200
+
+    background = threading.Thread(target=other_requests)
+    background.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(login, range(32)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    background.join()
+
+    other_latencies.sort()
+    p95 = other_latencies[int(len(other_latencies) * 0.95)]
+    print(
+        f"\nlogin burst, {os.cpu_count()} cores, hash workers={workers}: "
+        f"{32 / elapsed:.1f} logins/s, non-auth p95={p95:.1f}ms"
+    )
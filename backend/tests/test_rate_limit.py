@@ -0,0 +1,76 @@
+import threading
+
+from src.utils.rate_limit import MongoRateLimiter, TokenBucketLimiter
+
+
+def test_token_bucket_allows_burst_then_refills():
+    limiter = TokenBucketLimiter()
+    assert [limiter.hit('login:a', 3, 60, now=0) for _ in range(4)] == [False, False, False, True]
+    # One token comes back every window / limit seconds.
+    assert limiter.hit('login:a', 3, 60, now=10) is True
+    assert limiter.hit('login:a', 3, 60, now=20) is False
+    assert limiter.hit('login:a', 3, 60, now=21) is True
+    assert limiter.hit('login:b', 3, 60, now=21) is False
+
+
+def test_idle_and_overflow_buckets_are_evicted_lazily():
+    limiter = TokenBucketLimiter(max_keys=3)
+    for i in range(3):
+        limiter.hit(f'k{i}', 5, 60, now=i)
+    limiter.hit('k3', 5, 60, now=3)
+    assert len(limiter) == 3
+    limiter.hit('k1', 5, 60, now=4)
+    # Only buckets idle for a whole window (fully refilled) are dropped.
+    limiter.hit('k4', 5, 60, now=63.5)
+    assert len(limiter) == 2
+
+
+def test_token_bucket_is_thread_safe():
+    limiter = TokenBucketLimiter()
+    results = []
+
+    def worker():
+        for _ in range(100):
+            results.append(limiter.hit('login:shared', 50, 3600, now=0))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(False) == 50
+
+
+def test_mongo_limiter_shares_one_counter_per_window(db):
+    first = MongoRateLimiter(lambda: db.auth_rate_limits)
+    second = MongoRateLimiter(lambda: db.auth_rate_limits)
+    hits = [limiter.hit('login:ip', 2, 60, now=120) for limiter in (first, second, first)]
+    assert hits == [False, False, True]
+    assert second.hit('login:ip', 2, 60, now=180) is False
+    assert db.auth_rate_limits.count_documents({}) == 2
+
+
+def test_login_rate_limit_uses_configured_backend(client, app, db):
+    app.testing = False
+    app.config.update(AUTH_RATE_LIMIT_BACKEND='mongo', AUTH_RATE_LIMIT_MAX_LOGIN=2)
+    try:
+        statuses = [
+            client.post('/api/auth/login', json={'email': 'x@y.com', 'password': 'wrong'}).status_code
+            for _ in range(3)
+        ]
+    finally:
+        app.testing = True
+    assert statuses[-1] == 429
+    assert db.auth_rate_limits.count_documents({}) == 1
+
+
+def test_memory_limiter_is_built_once_from_config(app, monkeypatch):
+    from src.routes import auth
+
+    monkeypatch.setitem(auth._RATE_LIMITER, 'limiter', None)
+    app.config.update(AUTH_RATE_LIMIT_BACKEND='memory', AUTH_RATE_LIMIT_MAX_BUCKETS=7)
+    with app.test_request_context():
+        limiter = auth._get_rate_limiter()
+        app.config['AUTH_RATE_LIMIT_MAX_BUCKETS'] = 9
+        assert auth._get_rate_limiter() is limiter
+    assert limiter.max_keys == 7
@@ -0,0 +1,127 @@
+import json
+from bson import ObjectId
+from flask_jwt_extended import create_access_token
+
+from src.models.appointment import Appointment
+from src.models.doctor import Doctor
+from src.models.rating import Rating
+
+
+def _token(app, user_id, role):
+    with app.app_context():
+        return create_access_token(identity=json.dumps({'id': str(user_id), 'role': role}))
+
+
+def _completed_appointment(doctor, patient_id, day):
+    appt = Appointment.create(patient_id, doctor['_id'], doctor['name'], day, '9:00 AM')
+    Appointment.update_status(appt['_id'], 'completed')
+    return appt
+
+
+def test_rating_aggregates_incremented_on_insert(client, app, db):
+    doctor = Doctor.create(ObjectId(), 'Dr. Stars', 'Cardiology', 'Pune', [], 0, '')
+    patient_id = ObjectId()
+    headers = {'Authorization': f'Bearer {_token(app, patient_id, "patient")}'}
+
+    for day, score in (('2099-05-01', 5), ('2099-05-02', 4), ('2099-05-03', 4)):
+        appt = _completed_appointment(doctor, patient_id, day)
+        response = client.post(
+            '/api/ratings/', json={'appointmentId': str(appt['_id']), 'score': score},
+            headers=headers,
+        )
+        assert response.status_code == 201, response.data
+
+    stored = db.doctors.find_one({'_id': doctor['_id']})
+    assert stored['rating_sum'] == 13
+    assert stored['rating_count'] == 3
+    assert stored['rating_histogram'] == {'1': 0, '2': 0, '3': 0, '4': 2, '5': 1}
+    assert stored['rating'] == 4.3
+    assert stored['review_count'] == 3
+
+    data = client.get(f"/api/ratings/doctor/{doctor['_id']}").get_json()
+    assert data['average'] == 4.3
+    assert data['count'] == 3
+    assert data['histogram']['4'] == 2
+    assert len(data['ratings']) == 3
+
+
+def test_legacy_doctor_aggregates_rebuilt_from_raw_ratings(client, app, db):
+    user_id = ObjectId()
+    doctor_id = db.doctors.insert_one({
+        'user_id': user_id, 'name': 'Dr. Legacy', 'specialty': 'Neurology',
+        'location': 'Delhi', 'rating': 3.0, 'rating_count': 1,
+    }).inserted_id
+    db.ratings.insert_one({
+        'doctor_id': doctor_id, 'patient_id': ObjectId(), 'appointment_id': ObjectId(),
+        'score': 2, 'comment': '',
+    })
+
+    # A new rating on a doctor without aggregates triggers a rebuild that includes it.
+    Rating.create(ObjectId(), doctor_id, ObjectId(), 5)
+    stored = db.doctors.find_one({'_id': doctor_id})
+    assert stored['rating_sum'] == 7
+    assert stored['rating_count'] == 2
+    assert stored['rating'] == 3.5
+
+    headers = {'Authorization': f'Bearer {_token(app, user_id, "doctor")}'}
+    data = client.get('/api/ratings/my-reviews', headers=headers).get_json()
+    assert data['average'] == 3.5
+    assert data['histogram'] == {'1': 0, '2': 1, '3': 0, '4': 0, '5': 1}
+
+
+def test_repair_command_recomputes_from_raw_ratings(runner, app, db):
+    doctor = Doctor.create(ObjectId(), 'Dr. Drift', 'Dermatology', 'Goa', [], 0, '')
+    Rating.create(ObjectId(), doctor['_id'], ObjectId(), 3)
+    db.doctors.update_one({'_id': doctor['_id']}, {'$set': {'rating_sum': 99, 'rating': 9.9}})
+
+    result = runner.invoke(args=['rebuild-rating-aggregates', '--doctor-id', str(doctor['_id'])])
+    assert result.exit_code == 0, result.output
+    stored = db.doctors.find_one({'_id': doctor['_id']})
+    assert stored['rating_sum'] == 3
+    assert stored['rating'] == 3.0
+
+
+def test_reviews_paginated_with_keyset_cursor(client, app, db):
+    from datetime import datetime, timedelta
+
+    user_id = ObjectId()
+    doctor = Doctor.create(user_id, 'Dr. Pages', 'Cardiology', 'Pune', [], 0, '')
+    patient_user = ObjectId()
+    db.patients.insert_one({'user_id': patient_user, 'firstName': 'Ana', 'lastName': 'Lee'})
+
+    base = datetime(2099, 1, 1)
+    for index in range(5):
+        rating = Rating.create(patient_user, doctor['_id'], ObjectId(), 5 if index % 2 else 3)
+        # Two ratings share a timestamp to exercise the _id tie-breaker.
+        created_at = base + timedelta(minutes=min(index, 3))
+        db.ratings.update_one({'_id': rating['_id']}, {'$set': {'created_at': created_at}})
+    db.ratings.insert_one({'doctor_id': doctor['_id'], 'patient_id': ObjectId(),
+                           'appointment_id': ObjectId(), 'score': 4})
+
+    headers = {'Authorization': f'Bearer {_token(app, user_id, "doctor")}'}
+    seen = []
+    cursor = None
+    while True:
+        url = '/api/ratings/my-reviews?limit=2' + (f'&cursor={cursor}' if cursor else '')
+        data = client.get(url, headers=headers).get_json()
+        assert len(data['reviews']) <= 2
+        seen.extend(data['reviews'])
+        cursor = data['nextCursor']
+        if not cursor:
+            break
+
+    assert len(seen) == 6
+    assert len({review['id'] for review in seen}) == 6
+    dated = [review['createdAt'] for review in seen if review['createdAt']]
+    assert dated == sorted(dated, reverse=True)
+    assert seen[-1]['createdAt'] == ''
+    assert seen[0]['patientName'] == 'Ana Lee'
+    # The raw insert bypassed the model, so it is not in the aggregates.
+    assert data['count'] == 5
+
+    filtered = client.get(f"/api/ratings/doctor/{doctor['_id']}?score=5").get_json()
+    assert [r['score'] for r in filtered['ratings']] == [5, 5]
+    assert filtered['nextCursor'] is None
+
+    assert client.get(f"/api/ratings/doctor/{doctor['_id']}?score=9").status_code == 400
+    assert client.get(f"/api/ratings/doctor/{doctor['_id']}?cursor=bogus").status_code == 400
@@ -0,0 +1,375 @@
+import json
+import os
+import time
+
+import pytest
+from bson import ObjectId
+from flask_jwt_extended import create_access_token
+
+from src.models.doctor import Doctor
+from src.models.medical_record import MedicalRecord
+from src.models.patient import Patient
+from src.models.prescription import Prescription
+from src.services import render_pool, report_cache
+
+
+@pytest.fixture
+def patient_setup(app, db, tmp_path):
+    app.config['REPORTS_CACHE_DIR'] = str(tmp_path)
+    user_id = ObjectId()
+    patient = Patient.create(user_id, 'ana@example.com', 'Ana', 'Lee')
+    doctor = Doctor.create(ObjectId(), 'Dr. Report', 'Cardiology', 'Pune', [], 0, '')
+    prescription = Prescription.create(
+        doctor['_id'], user_id, None,
+        [{'name': 'Amoxicillin', 'dosage': '500mg', 'frequency': 'Twice daily'}],
+        diagnosis='Sinusitis',
+    )
+    record = MedicalRecord.create(
+        patient['_id'], '2099-01-01', 'Lab Test', 'Dr. Report', 'CBC', 'Normal', ''
+    )
+    with app.app_context():
+        token = create_access_token(identity=json.dumps({'id': str(user_id), 'role': 'patient'}))
+    return {
+        'headers': {'Authorization': f'Bearer {token}'},
+        'prescription_id': str(prescription['_id']),
+        'record_id': str(record['_id']),
+        'user_id': str(user_id),
+    }
+
+
+def test_sync_report_rendered_in_process_pool(client, app, patient_setup):
+    app.config['REPORTS_RENDER_WORKERS'] = 1
+    response = client.get(
+        f"/api/reports/prescription/{patient_setup['prescription_id']}",
+        headers=patient_setup['headers'],
+    )
+    assert response.status_code == 200, response.data
+    assert response.mimetype == 'application/pdf'
+    assert response.data.startswith(b'%PDF')
+
+
+def test_async_report_job_enqueued_and_polled(client, app, patient_setup):
+    app.config['REPORTS_RENDER_WORKERS'] = 0
+    response = client.post(
+        f"/api/reports/medical-record/{patient_setup['record_id']}/jobs",
+        headers=patient_setup['headers'],
+    )
+    assert response.status_code == 202, response.data
+    job = response.get_json()
+    assert job['status'] == 'pending'
+    assert job['statusUrl'].endswith(job['jobId'])
+
+    result = client.get(f"{job['statusUrl']}?wait=10", headers=patient_setup['headers'])
+    assert result.status_code == 200, result.data
+    assert result.data.startswith(b'%PDF')
+    assert 'medical_record_lab_test_' in result.headers['Content-Disposition']
+
+    # Jobs are private to the user that created them.
+    with app.app_context():
+        other = create_access_token(identity=json.dumps({'id': str(ObjectId()), 'role': 'patient'}))
+    response = client.get(job['statusUrl'], headers={'Authorization': f'Bearer {other}'})
+    assert response.status_code == 404
+
+
+def test_async_prescription_job_reports_pending_then_done(client, app, patient_setup):
+    app.config['REPORTS_RENDER_WORKERS'] = 0
+    job = client.post(
+        f"/api/reports/prescription/{patient_setup['prescription_id']}/jobs",
+        headers=patient_setup['headers'],
+    ).get_json()
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        response = client.get(job['statusUrl'], headers=patient_setup['headers'])
+        if response.status_code != 202:
+            break
+        assert response.get_json()['status'] == 'pending'
+        time.sleep(0.05)
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF')
+
+
+def test_repeat_download_served_from_cache_with_etag(client, app, patient_setup, monkeypatch):
+    app.config['REPORTS_RENDER_WORKERS'] = 0
+    url = f"/api/reports/medical-record/{patient_setup['record_id']}"
+    first = client.get(url, headers=patient_setup['headers'])
+    assert first.status_code == 200
+    etag = first.headers['ETag'].strip('"')
+    assert etag.startswith(patient_setup['record_id'])
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    renders = []
+    original = report_cache.put
+    monkeypatch.setattr(report_cache, 'put', lambda key, data: renders.append(key) or original(key, data))
+    second = client.get(url, headers=patient_setup['headers'])
+    assert second.status_code == 200
+    assert second.data == first.data
+    assert renders == []
+
+    not_modified = client.get(
+        url, headers=dict(patient_setup['headers'], **{'If-None-Match': first.headers['ETag']})
+    )
+    assert not_modified.status_code == 304
+    assert not_modified.data == b''
+
+
+def test_cached_report_survives_eviction_before_send(client, app, patient_setup, tmp_path, monkeypatch):
+    app.config['REPORTS_RENDER_WORKERS'] = 0
+    url = f"/api/reports/medical-record/{patient_setup['record_id']}"
+    first = client.get(url, headers=patient_setup['headers'])
+
+    original = report_cache.open_cached
+
+    def open_then_evict(key):
+        handle = original(key)
+        for path in tmp_path.glob('*.pdf'):
+            path.unlink()
+        return handle
+    monkeypatch.setattr(report_cache, 'open_cached', open_then_evict)
+    second = client.get(url, headers=patient_setup['headers'])
+    assert second.status_code == 200
+    assert second.data == first.data
+
+
+def test_record_update_invalidates_cached_report(client, app, patient_setup, tmp_path):
+    app.config['REPORTS_RENDER_WORKERS'] = 0
+    url = f"/api/reports/medical-record/{patient_setup['record_id']}"
+    old_etag = client.get(url, headers=patient_setup['headers']).headers['ETag']
+    assert len(list(tmp_path.glob('*.pdf'))) == 1
+
+    MedicalRecord.update(patient_setup['record_id'], {'result': 'Low iron'})
+    assert list(tmp_path.glob('*.pdf')) == []
+
+    response = client.get(url, headers=dict(patient_setup['headers'], **{'If-None-Match': old_etag}))
+    assert response.status_code == 200
+    assert response.headers['ETag'] != old_etag
+
+
+def test_cache_evicts_least_recently_used_over_size_limit(app, tmp_path):
+    app.config['REPORTS_CACHE_DIR'] = str(tmp_path)
+    app.config['REPORTS_CACHE_MAX_BYTES'] = 250
+    report_cache.put('a-1', b'x' * 100)
+    time.sleep(0.01)
+    report_cache.put('b-1', b'x' * 100)
+    time.sleep(0.01)
+    assert report_cache.get('a-1') is not None  # now more recent than b-1
+    time.sleep(0.01)
+    report_cache.put('c-1', b'x' * 100)
+
+    assert report_cache.get('b-1') is None
+    assert report_cache.get('a-1') is not None
+    assert report_cache.get('c-1') is not None
+
+
+def test_report_rendered_on_another_day_is_not_reused(client, app, patient_setup, monkeypatch):
+    from src.routes import reports
+
+    app.config['REPORTS_RENDER_WORKERS'] = 0
+    url = f"/api/reports/medical-record/{patient_setup['record_id']}"
+    monkeypatch.setattr(reports, 'format_report_date', lambda: 'January 01, 2099')
+    first = client.get(url, headers=patient_setup['headers'])
+    monkeypatch.setattr(reports, 'format_report_date', lambda: 'January 02, 2099')
+    second = client.get(url, headers=dict(patient_setup['headers'], **{'If-None-Match': first.headers['ETag']}))
+
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+
+
+def test_cache_eviction_counts_files_written_by_other_workers(app, tmp_path):
+    app.config['REPORTS_CACHE_DIR'] = str(tmp_path)
+    app.config['REPORTS_CACHE_MAX_BYTES'] = 250
+    report_cache.put('a-1', b'x' * 100)
+    time.sleep(0.01)
+    # Written by another process sharing the directory.
+    (tmp_path / 'b-1.pdf').write_bytes(b'x' * 100)
+    time.sleep(0.01)
+    report_cache.put('c-1', b'x' * 100)
+
+    assert report_cache.get('a-1') is None
+    assert report_cache.get('b-1') is not None
+    assert report_cache.get('c-1') is not None
+
+
+def _zip_names(data):
+    import io
+    import zipfile
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        return archive.namelist()
+
+
+def test_history_bundle_streams_zip_of_every_document(client, app, patient_setup, db):
+    app.config['REPORTS_RENDER_WORKERS'] = 0
+    patient = db.patients.find_one({'email': 'ana@example.com'})
+    for i in range(3):
+        MedicalRecord.create(patient['_id'], f'2099-02-0{i + 1}', 'Visit', 'Dr. Report', 'Check', '', '')
+
+    response = client.get('/api/reports/history?format=zip', headers=patient_setup['headers'])
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'application/zip'
+    names = _zip_names(response.data)
+    assert len(names) == 5
+    assert f"prescription_{patient_setup['prescription_id']}.pdf" in names
+    assert sum(name.startswith('medical_record_') for name in names) == 4
+
+
+def test_history_bundle_as_single_pdf(client, app, patient_setup, tmp_path):
+    app.config['REPORTS_RENDER_WORKERS'] = 0
+    accepted = client.get('/api/reports/history', headers=patient_setup['headers'])
+    assert accepted.status_code == 202
+    job = accepted.get_json()
+    response = client.get(f"{job['statusUrl']}?wait=10", headers=patient_setup['headers'])
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    assert response.headers['Cache-Control'] == 'private, no-store'
+    assert response.data.startswith(b'%PDF')
+    assert response.data.count(b'/Type /Page\n') >= 2
+
+    bad = client.get('/api/reports/history?format=docx', headers=patient_setup['headers'])
+    assert bad.status_code == 400
+
+
+def test_pruned_bundle_job_removes_its_file(client, app, patient_setup):
+    app.config['REPORTS_RENDER_WORKERS'] = 0
+    accepted = client.get('/api/reports/history', headers=patient_setup['headers'])
+    job_id = accepted.get_json()['jobId']
+    job = render_pool.get_job(job_id, patient_setup['user_id'])
+    path = job['future'].result(timeout=10)
+    assert os.path.exists(path)
+
+    with render_pool._lock:
+        render_pool._prune_jobs(time.monotonic() + 3600, ttl_seconds=600)
+    assert render_pool.get_job(job_id, patient_setup['user_id']) is None
+    assert not os.path.exists(path)
+
+
+def test_history_bundle_empty_history_is_404(client, app, db):
+    user_id = ObjectId()
+    Patient.create(user_id, 'empty@example.com', 'Em', 'Pty')
+    token = create_access_token(identity=json.dumps({'id': str(user_id), 'role': 'patient'}))
+    response = client.get('/api/reports/history', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 404
+
+
+class _FakeLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+
+        class _Response:
+            content = 'Stored summary for Ana.'
+        return _Response()
+
+
+def _wait_for_summary(db, prescription_id, calls, llm):
+    deadline = time.monotonic() + 10
+    while llm.calls < calls and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert llm.calls == calls
+    # The job stores the text just after the model returns.
+    while time.monotonic() < deadline:
+        stored = db.prescriptions.find_one({'_id': ObjectId(prescription_id)}).get('ai_summary')
+        if stored:
+            return stored
+        time.sleep(0.02)
+    raise AssertionError('summary was not stored')
+
+
+def test_ai_summary_generated_off_the_request_and_read_on_download(
+    client, app, patient_setup, db, monkeypatch
+):
+    from src.routes import reports
+    from src.services import report_service
+
+    app.config['REPORTS_ENABLE_AI_SUMMARY'] = True
+    app.config['REPORTS_RENDER_WORKERS'] = 0
+    llm = _FakeLLM()
+    monkeypatch.setattr(report_service, 'get_llm', lambda: llm)
+    rendered = []
+    monkeypatch.setattr(
+        reports, 'render_pdf', lambda kind, payload: rendered.append(payload) or b'%PDF-fake'
+    )
+
+    prescription_id = patient_setup['prescription_id']
+    url = f"/api/reports/prescription/{prescription_id}"
+    # Not generated yet: the template is printed and generation is queued.
+    assert client.get(url, headers=patient_setup['headers']).status_code == 200
+    assert rendered[-1]['ai_summary'].startswith('This prescription was issued by Dr.')
+    stored = _wait_for_summary(db, prescription_id, 1, llm)
+    assert stored['text'] == 'Stored summary for Ana.'
+    assert len(stored['inputs_hash']) == 64
+
+    # Already current: regenerating is a no-op.
+    assert report_service.refresh_prescription_summary(prescription_id) == 'Stored summary for Ana.'
+    assert llm.calls == 1
+
+    client.get(url, headers=patient_setup['headers'])
+    assert rendered[-1]['ai_summary'] == 'Stored summary for Ana.'
+
+    # A summary built from different inputs is ignored and regenerated.
+    db.prescriptions.update_one({'_id': ObjectId(prescription_id)}, {'$set': {'diagnosis': 'Flu'}})
+    client.get(url, headers=patient_setup['headers'])
+    assert rendered[-1]['ai_summary'].startswith('This prescription was issued by Dr.')
+    _wait_for_summary(db, prescription_id, 2, llm)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        client.get(url, headers=patient_setup['headers'])
+        if rendered[-1]['ai_summary'] == 'Stored summary for Ana.':
+            break
+        time.sleep(0.02)
+    assert rendered[-1]['ai_summary'] == 'Stored summary for Ana.'
+    assert llm.calls == 2
+
+
+def test_summary_command_regenerates_outdated_summaries(runner, app, patient_setup, db, monkeypatch):
+    from src.services import report_service
+
+    llm = _FakeLLM()
+    monkeypatch.setattr(report_service, 'get_llm', lambda: llm)
+    prescription_id = ObjectId(patient_setup['prescription_id'])
+    db.prescriptions.update_one(
+        {'_id': prescription_id},
+        {'$set': {'ai_summary': {'text': 'Old summary.', 'inputs_hash': 'outdated'}}},
+    )
+
+    result = runner.invoke(args=['generate-prescription-summaries'])
+    assert 'Checked 1 prescription(s); 0 summary(ies) failed' in result.output
+    assert db.prescriptions.find_one({'_id': prescription_id})['ai_summary']['text'] == (
+        'Stored summary for Ana.'
+    )
+
+    runner.invoke(args=['generate-prescription-summaries'])
+    assert llm.calls == 1
+
+
+def test_history_bundle_does_not_queue_summaries(client, app, patient_setup, monkeypatch):
+    from src.routes import reports
+
+    app.config.update(REPORTS_ENABLE_AI_SUMMARY=True, REPORTS_RENDER_WORKERS=0)
+    scheduled = []
+    monkeypatch.setattr(reports, 'schedule_prescription_summary', scheduled.append)
+
+    response = client.get('/api/reports/history?format=zip', headers=patient_setup['headers'])
+    assert response.status_code == 200
+    response.get_data()
+    assert scheduled == []
+
+    client.get(
+        f"/api/reports/prescription/{patient_setup['prescription_id']}",
+        headers=patient_setup['headers'],
+    )
+    assert [str(prescription_id) for prescription_id in scheduled] == [
+        patient_setup['prescription_id']
+    ]
+
+
+def test_queued_summaries_are_capped(app, db, monkeypatch):
+    from src.services import report_service
+
+    app.config.update(REPORTS_ENABLE_AI_SUMMARY=True, REPORTS_SUMMARY_MAX_PENDING=2)
+    monkeypatch.setattr(report_service, '_summaries_pending', {'a', 'b'})
+
+    assert report_service.schedule_prescription_summary(ObjectId()) is None
@@ -132,3 +132,50 @@ def test_doctor_login_requires_doctor_profile(client, app):
     assert response.status_code == 403
     data = response.get_json()
     assert data.get('error') == 'pending_verification'
+
+
+def test_login_upgrades_outdated_password_hash(client, app, db):
+    app.config.update(PASSWORD_HASH_METHOD='pbkdf2:sha256:2000', PASSWORD_HASH_WORKERS=1)
+    user_id = db.users.insert_one({
+        'email': 'legacy@test.com',
+        'password': generate_password_hash('password123', 'pbkdf2:sha256:1000'),
+        'role': 'patient',
+    }).inserted_id
+
+    for _ in range(2):
+        response = client.post(
+            '/api/auth/login', json={'email': 'legacy@test.com', 'password': 'password123'}
+        )
+        assert response.status_code == 200
+        assert db.users.find_one({'_id': user_id})['password'].startswith('pbkdf2:sha256:2000$')
+
+    response = client.post('/api/auth/login', json={'email': 'legacy@test.com', 'password': 'nope'})
+    assert response.status_code == 401
+
+
+def test_login_is_503_when_password_hashing_is_backlogged(client, app, db, monkeypatch):
+    from concurrent.futures import Future
+    from src.utils import password_hashing
+
+    class _StalledPool:
+        def submit(self, func, *args):
+            return Future()
+
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_TIMEOUT_SECONDS=0.01)
+    monkeypatch.setattr(password_hashing, '_get_pool', lambda workers: _StalledPool())
+    db.users.insert_one({
+        'email': 'busy@test.com',
+        'password': generate_password_hash('password123'),
+        'role': 'patient',
+    })
+
+    response = client.post('/api/auth/login', json={'email': 'busy@test.com', 'password': 'password123'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+    response = client.post('/api/auth/register', json={
+        'email': 'new@test.com', 'password': 'Password123!', 'role': 'patient',
+        'firstName': 'New', 'lastName': 'User',
+    })
+    assert response.status_code == 503
+    assert db.users.find_one({'email': 'new@test.com'}) is None
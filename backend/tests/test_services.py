@@ -14,7 +14,7 @@ def test_process_message(app):
     mock_llm_response.content = ai_response_text
     
     # Patch the ChatGoogleGenerativeAI creation to return a mock
-    with patch('src.services.chatbot_service.ChatGoogleGenerativeAI') as MockLLM:
+    with patch('src.services.llm_providers.ChatGoogleGenerativeAI') as MockLLM:
         mock_instance = MockLLM.return_value
         mock_instance.invoke.return_value = mock_llm_response
         
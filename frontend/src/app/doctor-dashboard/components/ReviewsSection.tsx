@@ -12,7 +12,9 @@ const ReviewsSection = ({ className = '' }: ReviewsSectionProps) => {
   const [reviews, setReviews] = useState<Review[]>([]);
   const [average, setAverage] = useState<number>(0);
   const [count, setCount] = useState<number>(0);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(true);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
 
   useEffect(() => {
@@ -21,10 +23,12 @@ const ReviewsSection = ({ className = '' }: ReviewsSectionProps) => {
 
   const fetchReviews = async () => {
     try {
+      setError(null);
       const data = await ratingsApi.getMyReviews();
       setReviews(data.reviews);
       setAverage(data.average);
       setCount(data.count);
+      setNextCursor(data.nextCursor);
     } catch (err) {
       console.error('Failed to fetch reviews:', err);
       setError('Failed to load reviews');
@@ -33,6 +37,20 @@ const ReviewsSection = ({ className = '' }: ReviewsSectionProps) => {
     }
   };
 
+  const loadMoreReviews = async () => {
+    if (!nextCursor) return;
+    setIsLoadingMore(true);
+    try {
+      const data = await ratingsApi.getMyReviews(nextCursor);
+      setReviews((current) => [...current, ...data.reviews]);
+      setNextCursor(data.nextCursor);
+    } catch (err) {
+      console.error('Failed to fetch more reviews:', err);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const formatDate = (dateString: string) => {
     return new Date(dateString).toLocaleDateString('en-US', {
       month: 'short',
@@ -131,6 +149,18 @@ const ReviewsSection = ({ className = '' }: ReviewsSectionProps) => {
               )}
             </div>
           ))}
+          {nextCursor && (
+            <div className="pt-2">
+              <button
+                type="button"
+                onClick={loadMoreReviews}
+                disabled={isLoadingMore}
+                className="text-sm font-medium text-primary hover:text-primary/80 transition-base disabled:opacity-60 disabled:cursor-not-allowed"
+              >
+                {isLoadingMore ? 'Loading...' : 'Load more reviews'}
+              </button>
+            </div>
+          )}
         </div>
       )}
     </div>
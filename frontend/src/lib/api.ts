@@ -615,8 +615,62 @@ export const chatbotApi = {
       body: JSON.stringify({ message }),
     }),
 
-  getHistory: (): Promise<{ history: any[]; success: boolean }> =>
-    fetchApi<{ history: any[]; success: boolean }>('/chatbot/history'),
+  // Streams the reply over SSE; onToken receives text as it is generated.
+  streamMessage: async (
+    message: string,
+    onToken: (text: string) => void
+  ): Promise<{ message: string; response: string; success: boolean }> => {
+    const res = await fetch(`${API_BASE_URL}/chatbot/message/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Authorization: `Bearer ${getToken()}`,
+      },
+      body: JSON.stringify({ message }),
+    });
+    if (!res.ok || !res.body) {
+      const errorData = await res.json().catch(() => ({ error: 'Failed to send message' }));
+      throw new ApiRequestError(
+        errorData.error || `HTTP error! status: ${res.status}`,
+        res.status,
+        errorData
+      );
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const block = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+
+        let event = 'message';
+        let data = '';
+        for (const line of block.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        }
+        const payload = data ? JSON.parse(data) : {};
+        if (event === 'token') onToken(payload.text);
+        else if (event === 'done') return payload;
+        else if (event === 'error') throw new ApiRequestError(payload.error, 500, payload);
+      }
+    }
+    throw new ApiRequestError('Chatbot stream ended unexpectedly', 500, {});
+  },
+
+  getHistory: (
+    cursor?: string
+  ): Promise<{ history: any[]; nextCursor: string | null; success: boolean }> =>
+    fetchApi<{ history: any[]; nextCursor: string | null; success: boolean }>(
+      cursor ? `/chatbot/history?cursor=${encodeURIComponent(cursor)}` : '/chatbot/history'
+    ),
 
   clearHistory: (): Promise<{ message: string; success: boolean }> =>
     fetchApi<{ message: string; success: boolean }>('/chatbot/history', {
@@ -643,8 +697,12 @@ export const ratingsApi = {
   checkRating: (appointmentId: string): Promise<{ hasRated: boolean }> =>
     fetchApi<{ hasRated: boolean }>(`/ratings/check/${appointmentId}`),
 
-  getMyReviews: (): Promise<{ reviews: Review[]; average: number; count: number }> =>
-    fetchApi<{ reviews: Review[]; average: number; count: number }>('/ratings/my-reviews'),
+  getMyReviews: (
+    cursor?: string
+  ): Promise<{ reviews: Review[]; average: number; count: number; nextCursor: string | null }> =>
+    fetchApi<{ reviews: Review[]; average: number; count: number; nextCursor: string | null }>(
+      cursor ? `/ratings/my-reviews?cursor=${encodeURIComponent(cursor)}` : '/ratings/my-reviews'
+    ),
 };
 
 // Prescriptions API
@@ -721,6 +779,31 @@ export const reportsApi = {
       }
       return res.blob();
     }),
+
+  // A PDF bundle is rendered as a job: 202 with a job id, then poll until the file is ready.
+  downloadHistory: async (format: 'pdf' | 'zip' = 'pdf'): Promise<Blob> => {
+    const headers = { Authorization: `Bearer ${getToken()}` };
+    let res = await fetch(`${API_BASE_URL}/reports/history?format=${format}`, {
+      method: 'GET',
+      headers,
+    });
+    while (res.status === 202) {
+      const { jobId } = await res.json();
+      res = await fetch(`${API_BASE_URL}/reports/jobs/${jobId}?wait=25`, {
+        method: 'GET',
+        headers,
+      });
+    }
+    if (!res.ok) {
+      const errorData = await res.json().catch(() => ({ error: 'Failed to download medical history' }));
+      throw new ApiRequestError(
+        errorData.error || `HTTP error! status: ${res.status}`,
+        res.status,
+        errorData
+      );
+    }
+    return res.blob();
+  },
 };
 
 // Notifications API